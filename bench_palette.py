@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Palette Benchmarks
+Times the operations of the palette pipeline against the shipped template
+and against synthetic layouts with 10x and 100x more regions. Results can
+be written to JSON and compared with an earlier run to catch regressions.
+
+Usage:
+    python bench_palette.py
+    python bench_palette.py -o baseline.json
+    python bench_palette.py --baseline baseline.json
+    python bench_palette.py --compare baseline.json current.json
+"""
+
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from palette_import import build_label_map, extract_dominant_colors, extract_mean_colors
+from palette_layout import (
+    clear_layout_memo, compile_layout, load_palette, get_item_name, save_palette_changes,
+    CACHE_EXTENSION, layout_key
+)
+from palette_render import CANVAS_SIZE, PreviewCanvas, render_regions, table_regions
+from palette_editor import PaletteEditor
+from palette_history import EditHistory
+
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SaveCharacterPalette.json")
+
+# Result file format version
+RESULTS_VERSION = 1
+
+# Layout scales benchmarked by default (1 is the template itself)
+DEFAULT_SCALES = [1, 10, 100]
+
+# A result is a regression when it is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and also slower by at least this many seconds, to ignore timer noise
+MIN_REGRESSION_SECONDS = 0.0005
+
+
+def time_call(func, repeat: int, setup=None) -> float:
+    """Run func repeat times and return the median time in seconds"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def synthetic_layout(palette_data: List[Dict[str, Any]], scale: int) -> List[Dict[str, Any]]:
+    """Build a layout with ``scale`` copies of every item
+
+    Copies are shrunk and tiled over the canvas so that every region still
+    renders, and renamed so that they all count as separate items.
+    """
+    if scale == 1:
+        return copy.deepcopy(palette_data)
+
+    tiles = math.ceil(math.sqrt(scale))
+    step = CANVAS_SIZE // tiles
+
+    def shrink(data, dx, dy):
+        if isinstance(data, list):
+            return [shrink(item, dx, dy) for item in data]
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for key, value in data.items():
+            if key in ("Start X", "Start Y"):
+                result[key] = str(int(value) // tiles + (dx if key == "Start X" else dy))
+            elif key in ("Width", "Height"):
+                result[key] = str(max(1, int(value) // tiles))
+            else:
+                result[key] = shrink(value, dx, dy)
+        return result
+
+    layout = []
+    for copy_index in range(scale):
+        dx = (copy_index % tiles) * step
+        dy = (copy_index // tiles) * step
+        for item in palette_data:
+            name = get_item_name(item)
+            # The first copy keeps the real names so that the groups stay populated
+            new_name = name if copy_index == 0 else f"{name} {copy_index + 1}"
+            layout.append({new_name: shrink(item[name], dx, dy)})
+    return layout
+
+
+def random_colors(palette_data: List[Dict[str, Any]], seed: int = 0):
+    """Assign a random color to every region in place"""
+    rng = random.Random(seed)
+
+    def fill(data):
+        if isinstance(data, list):
+            for item in data:
+                fill(item)
+        elif isinstance(data, dict):
+            if "Color" in data:
+                data["Color"] = f"#{rng.randrange(1 << 24):06x}"
+            for value in data.values():
+                fill(value)
+
+    fill(palette_data)
+
+
+def bench_layout(path: str, repeat: int, cache_dir: str) -> Dict[str, float]:
+    """Time every pipeline operation on one palette file"""
+    results = {}
+    with open(path, 'r') as f:
+        cache_file = os.path.join(cache_dir, layout_key(f.read()) + CACHE_EXTENSION)
+
+    def cold_setup():
+        clear_layout_memo()
+        if os.path.exists(cache_file):
+            os.unlink(cache_file)
+
+    def parse_only():
+        with open(path, 'r') as f:
+            compile_layout(json.load(f))
+
+    # Loading: JSON plus tree walk, first load with a cache write, cached load
+    results['load_no_cache'] = time_call(parse_only, repeat)
+    results['load_cold'] = time_call(lambda: load_palette(path, cache_dir), repeat, cold_setup)
+    results['load'] = time_call(lambda: load_palette(path, cache_dir), repeat, clear_layout_memo)
+
+    # Building the editor's ColorEntry objects from the compiled table
+    palette_data, table = load_palette(path, cache_dir)
+    editor = SimpleNamespace(
+        palette_data=palette_data, region_table=table, color_entries={}, group_color_widgets={},
+        update_color_widgets=lambda paths: None, mark_changed=lambda paths: None,
+        status_var=SimpleNamespace(set=lambda text: None), history=EditHistory()
+    )
+    editor.commit_colors = lambda label, colors: PaletteEditor.commit_colors(editor, label, colors)
+    all_rows = [row for _, rows in table.group_rows() for row in rows]
+    results['parse_entries'] = time_call(
+        lambda: PaletteEditor.create_color_entries(editor, all_rows), repeat, editor.color_entries.clear)
+
+    # Rendering: export image, and the editor's canvas plus thumbnail
+    regions = table_regions(table)
+    results['render_full'] = time_call(lambda: render_regions(regions), repeat)
+    canvas = PreviewCanvas()
+    results['preview_full'] = time_call(lambda: canvas.render(regions), repeat)
+
+    # Recoloring the largest region that is not a whole item
+    index = max((i for i in range(len(table)) if table.parent[i] >= 0),
+                key=lambda i: table.width[i] * table.height[i])
+    colors = iter([(255, 0, 0), (0, 0, 255)] * repeat)
+    results['render_single'] = time_call(lambda: canvas.update({index: next(colors)}), repeat)
+
+    # Texture import from the rendered image, including the label map build
+    image = render_regions(regions)
+    rects = [(int(table.x[i]), int(table.y[i]), int(table.width[i]), int(table.height[i]))
+             for i in all_rows]
+    results['import'] = time_call(lambda: extract_dominant_colors(image, rects), repeat,
+                                  build_label_map.cache_clear)
+    results['import_mean'] = time_call(lambda: extract_mean_colors(image, rects), repeat)
+
+    # Group color apply through the editor's code path
+    results['group_apply'] = time_call(
+        lambda: PaletteEditor.apply_group_color(editor, "Clothing", "Color 1", "#336699"), repeat)
+
+    # Save: every color changed, written back and atomically replaced
+    save_path = os.path.join(cache_dir, "save.json")
+    changes = [(entry.node, entry.color) for entry in editor.color_entries.values()]
+
+    def save():
+        save_palette_changes(palette_data, table, changes, save_path)
+
+    results['save'] = time_call(save, repeat)
+    results['regions'] = len(table)
+    return results
+
+
+def run_benchmarks(scales: List[int] = DEFAULT_SCALES, repeat: int = 10,
+                   template: str = TEMPLATE_PATH, verbose: bool = True) -> Dict[str, Any]:
+    """Run the benchmarks on the template and synthetic layouts"""
+    with open(template, 'r') as f:
+        template_data = json.load(f)
+
+    layouts = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            name = "template" if scale == 1 else f"synthetic_{scale}x"
+            palette_data = synthetic_layout(template_data, scale)
+            random_colors(palette_data, seed=scale)
+            path = os.path.join(tmp, f"{name}.json")
+            with open(path, 'w') as f:
+                json.dump(palette_data, f, indent=2)
+
+            # Fewer repeats for the large layouts, but never fewer than 3
+            layout_repeat = max(3, repeat // scale)
+            if verbose:
+                print(f"{name} (median of {layout_repeat}):")
+            results = bench_layout(path, layout_repeat, tmp)
+            layouts[name] = results
+            if verbose:
+                print_results(results)
+                print()
+
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'layouts': layouts,
+    }
+
+
+def print_results(results: Dict[str, float]):
+    """Print the timings of one layout"""
+    print(f"  {'regions':16} {results['regions']:10d}")
+    for name, seconds in results.items():
+        if name != 'regions':
+            print(f"  {name:16} {seconds * 1000:10.2f} ms")
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD, verbose: bool = True) -> List[str]:
+    """Compare two result sets and return the regressed (layout, operation) names"""
+    regressions = []
+    for layout, results in current['layouts'].items():
+        base_results = baseline['layouts'].get(layout)
+        if base_results is None:
+            continue
+        if verbose:
+            print(f"{layout}:")
+        for name, seconds in results.items():
+            if name == 'regions' or name not in base_results:
+                continue
+            base = base_results[name]
+            ratio = seconds / base if base > 0 else float('inf')
+            regressed = ratio > 1 + threshold and seconds - base > MIN_REGRESSION_SECONDS
+            if regressed:
+                regressions.append(f"{layout}.{name}")
+            if verbose:
+                mark = "✗" if regressed else "✓"
+                print(f"  {mark} {name:16} {base * 1000:10.2f} -> {seconds * 1000:10.2f} ms ({ratio:5.2f}x)")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(description="Benchmark the palette pipeline")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="Layout scales to run (default: 1 10 100)")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Runs per operation on the template (default: 10)")
+    parser.add_argument("--baseline", help="Compare the results with this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Only compare two existing result files")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before a result is a regression (default: 0.25)")
+    return parser
+
+
+def main(argv=None):
+    """Run the benchmarks"""
+    args = build_parser().parse_args(argv)
+
+    print("=" * 60)
+    print("Palette Benchmarks")
+    print("=" * 60 + "\n")
+
+    if args.compare:
+        with open(args.compare[0], 'r') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], 'r') as f:
+            current = json.load(f)
+    else:
+        current = run_benchmarks(args.scales, args.repeat)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"Results written to {args.output}\n")
+        if not args.baseline:
+            return 0
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    regressions = compare_results(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("\n✓ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,45 +6,9 @@ Creates sample configuration and PNG files
 
 import json
 import sys
-from PIL import Image
-import colorsys
-
-
-def calculate_shade(color_hex: str, factor: float = 0.6) -> str:
-    """Calculate a darker shade of the given color"""
-    if not color_hex or color_hex == "":
-        return "#000000"
-    
-    color_hex = color_hex.lstrip('#')
-    try:
-        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-    except:
-        return "#000000"
-    
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    v = v * factor
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
-
-
-def calculate_highlight(color_hex: str, factor: float = 1.4) -> str:
-    """Calculate a lighter highlight of the given color"""
-    if not color_hex or color_hex == "":
-        return "#000000"
-    
-    color_hex = color_hex.lstrip('#')
-    try:
-        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-    except:
-        return "#000000"
-    
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    v = min(1.0, v * factor)
-    s = s * 0.8
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+from palette_cache import RenderCache, png_format, render_key
+from palette_colors import calculate_shade, calculate_highlight
+from palette_render import atlas_size, hex_to_rgb, render_regions
 
 
 def create_demo_palette():
@@ -106,15 +70,16 @@ def create_demo_palette():
     return config
 
 
-def generate_png_from_config(config, output_file='demo_texture.png'):
-    """Generate a PNG from the configuration"""
+def generate_png_from_config(config, output_file='demo_texture.png', cache=None):
+    """Generate a PNG from the configuration
+
+    Unchanged configurations are copied from the render cache (``cache``,
+    or the default one) instead of being rendered again.
+    """
     print(f"\nGenerating {output_file}...")
     
-    # Create 1024x1024 image
-    img = Image.new('RGB', (1024, 1024), color='black')
-    pixels = img.load()
-    
-    regions_filled = 0
+    # Collect colored regions in painter's order
+    regions = []
     
     # Process each item
     for item in config:
@@ -123,27 +88,18 @@ def generate_png_from_config(config, output_file='demo_texture.png'):
         
         # Process all color regions recursively
         def fill_region(data, prefix=""):
-            nonlocal regions_filled
-            
             if isinstance(data, dict):
                 # Check if this has position and color
                 has_position = all(k in data for k in ["Start X", "Start Y", "Width", "Height"])
                 
                 if has_position and "Color" in data and data.get("Color"):
-                    color_hex = data["Color"].lstrip('#')
                     try:
-                        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
+                        rgb = hex_to_rgb(data["Color"])
                         x = int(data["Start X"])
                         y = int(data["Start Y"])
                         w = int(data["Width"])
                         h = int(data["Height"])
-                        
-                        # Fill the region
-                        for py in range(y, min(y + h, 1024)):
-                            for px in range(x, min(x + w, 1024)):
-                                pixels[px, py] = (r, g, b)
-                        
-                        regions_filled += 1
+                        regions.append((x, y, w, h, rgb))
                     except:
                         pass
                 
@@ -154,9 +110,13 @@ def generate_png_from_config(config, output_file='demo_texture.png'):
         
         fill_region(item_data, item_name)
     
-    # Save the image
-    img.save(output_file, 'PNG')
-    print(f"✓ Generated {output_file} with {regions_filled} colored regions")
+    # Fill all regions onto an atlas sized to the layout (1024x1024 for the template)
+    size = atlas_size(regions)
+    cache = cache or RenderCache()
+    hit = cache.output(render_key(regions, size, png_format()), output_file,
+                       lambda path: render_regions(regions, size).save(path, 'PNG'))
+    source = " (from render cache)" if hit else ""
+    print(f"✓ Generated {output_file} with {len(regions)} colored regions{source}")
 
 
 def main():
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Palette Batch Tool
+Headless command-line renderer for character palette files. Renders many
+palette JSON files to PNG textures in parallel worker processes, using the
+same rules as the editor preview, regenerates derived Shade and Highlight
+colors across whole palette libraries, converts painted textures back
+into palette files, and keeps a directory of textures up to date as its
+palette files change. Does not need tkinter, so it can run on build agents.
+
+Usage:
+    python palette_batch.py render skins/ -o textures/ -j 8
+    python palette_batch.py render "skins/*.json"
+    python palette_batch.py render skins/ -o textures/ --no-cache
+    python palette_batch.py render skins/ -o textures/ --indexed --compress-level 9
+    python palette_batch.py watch skins/ -o textures/
+    python palette_batch.py shades skins/
+    python palette_batch.py extract textures/ -o skins/ -j 8
+    python palette_batch.py --trace trace.json render skins/
+"""
+
+import argparse
+import collections
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from PIL import Image
+
+from palette_cache import RENDER_CACHE_BYTES, RenderCache, png_format, render_key
+from palette_colors import derive_table_shades
+from palette_import import DEFAULT_TOLERANCE, DEFAULT_TRIM, IMPORT_MODES, MODE_DOMINANT, extract_region_colors
+from palette_layout import atomic_write, load_palette_file, save_palette_file, SPARSE_EXTENSION, TEMPLATE_PATH
+from palette_render import PNG_COMPRESS_LEVEL, save_atlas, table_atlas_size, table_regions
+from palette_trace import add_events, enable, enable_from_env, is_enabled, span, take_events, write_trace
+
+if TYPE_CHECKING:
+    from palette_server import RenderService
+
+
+# Seconds between scans of the watched inputs
+WATCH_INTERVAL = 0.2
+
+# Seconds a watched file must go unchanged before it is rendered
+WATCH_DEBOUNCE = 0.3
+
+
+def expand_inputs(inputs: List[str], *extensions: str) -> List[str]:
+    """Expand files, directories and glob patterns into a sorted file list"""
+    files = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for extension in extensions:
+                files.extend(glob.glob(os.path.join(pattern, f"*{extension}")))
+        elif os.path.isfile(pattern):
+            files.append(pattern)
+        else:
+            files.extend(glob.glob(pattern))
+
+    # Remove duplicates while keeping a stable order
+    return sorted(set(os.path.normpath(f) for f in files))
+
+
+def output_path_for(input_path: str, output_dir: str, extension: str) -> str:
+    """Get the output file for an input file"""
+    base = os.path.splitext(os.path.basename(input_path))[0] + extension
+    return os.path.join(output_dir or os.path.dirname(input_path), base)
+
+
+def render_file(json_path: str, png_path: str, tiled: bool = None,
+                cache: Optional[RenderCache] = None, indexed: bool = False,
+                compress_level: int = PNG_COMPRESS_LEVEL) -> Tuple[int, float, bool]:
+    """Render one palette file to a PNG at the atlas size of its layout
+
+    Large atlases are streamed band by band; ``tiled`` forces this on or off.
+    ``indexed`` saves 8-bit indexed PNGs where the colors fit, as save_atlas
+    does. With a ``cache``, palettes rendered before are copied from it instead.
+    Returns the number of regions, the elapsed time in seconds and whether
+    the cache was hit.
+    """
+    start = time.perf_counter()
+    with span("render_file", file=json_path):
+        _, table = load_palette_file(json_path)
+        regions = table_regions(table)
+        size = table_atlas_size(table)
+        def write(path):
+            save_atlas(regions, path, size, tiled, indexed, compress_level)
+
+        if cache is None:
+            write(png_path)
+            hit = False
+        else:
+            hit = cache.output(render_key(regions, size, png_format(indexed, compress_level)), png_path, write)
+    return len(regions), time.perf_counter() - start, hit
+
+
+def extract_file(png_path: str, layout_path: str, out_path: str, mode: str = MODE_DOMINANT,
+                 trim: float = DEFAULT_TRIM, tolerance: int = DEFAULT_TOLERANCE) -> Tuple[int, List[str], float]:
+    """Extract the color of every region of a texture into a palette file
+
+    Colors are picked with one of the import modes, as in the editor's
+    texture import. Textures of another size than the layout's atlas are
+    sampled at the scaled regions.
+    Regions with no usable pixels keep the layout's color. Returns the
+    number of regions, the paths of the regions with no usable color and
+    the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    with span("extract_file", file=png_path):
+        palette_data, table = load_palette_file(layout_path)
+        with Image.open(png_path) as img:
+            img = img.convert('RGB')
+        rects = list(zip(table.x.tolist(), table.y.tolist(), table.width.tolist(), table.height.tolist()))
+        colors = extract_region_colors(img, rects, mode, trim, tolerance, table_atlas_size(table))
+        missing = []
+        for row, color in enumerate(colors):
+            if color:
+                table.nodes[row]["Color"] = color
+            else:
+                missing.append(table.paths[row])
+        save_palette_file(palette_data, table, out_path)
+    return len(table), missing, time.perf_counter() - start
+
+
+class PaletteWatcher:
+    """Re-renders palette files whose contents changed since their last render
+
+    Inputs are polled, so no file system event support is needed. A changed
+    file is rendered once it has gone ``debounce`` seconds without another
+    write, and saves that leave its contents as they were are skipped.
+    Layouts stay compiled in the render service between changes, and PNGs
+    are written through a rename, so readers never see half a file.
+    """
+
+    def __init__(self, inputs: List[str], output_dir: Optional[str] = None,
+                 debounce: float = WATCH_DEBOUNCE, service: Optional['RenderService'] = None):
+        self.inputs = inputs
+        self.output_dir = output_dir
+        self.debounce = debounce
+        if service is None:
+            # Imported here so the other commands do not depend on the server module
+            from palette_server import RenderService
+            service = RenderService()
+        self.service = service
+        self.stamps: Dict[str, Tuple[int, int]] = {}  # Path -> (mtime, size) at the last scan
+        self.changed: Dict[str, float] = {}  # Path -> time of its newest change, until it is rendered
+        self.digests: Dict[str, str] = {}  # Path -> hash of the contents last rendered
+        self.rendered = 0
+        self.skipped = 0
+
+    def scan(self, now: float):
+        """Note the files that appeared or changed since the last scan"""
+        stamps = {}
+        for path in expand_inputs(self.inputs, '.json', SPARSE_EXTENSION):
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamps[path] = (info.st_mtime_ns, info.st_size)
+            if self.stamps.get(path) != stamps[path]:
+                self.changed[path] = now
+        for path in self.stamps.keys() - stamps.keys():
+            self.changed.pop(path, None)
+            self.digests.pop(path, None)
+        self.stamps = stamps
+
+    def poll(self, now: Optional[float] = None) -> List[Tuple[str, str, float, Optional[Exception]]]:
+        """Scan the inputs and render the changed files that have settled
+
+        Returns (input, output, seconds, error) for every file rendered.
+        """
+        now = time.monotonic() if now is None else now
+        self.scan(now)
+        results = []
+        for path in sorted(self.changed):
+            if now - self.changed[path] >= self.debounce:
+                del self.changed[path]
+                result = self.render(path)
+                if result is not None:
+                    results.append(result)
+        return results
+
+    def render(self, path: str) -> Optional[Tuple[str, str, float, Optional[Exception]]]:
+        """Render one file unless its contents are the ones rendered last time"""
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        digest = hashlib.sha256(payload).hexdigest()
+        if self.digests.get(path) == digest:
+            self.skipped += 1
+            return None
+
+        png_path = output_path_for(path, self.output_dir, '.png')
+        try:
+            with span("watch.render", file=path):
+                png, _ = self.service.render(payload)
+                atomic_write(png_path, png)
+        except Exception as e:
+            return path, png_path, time.perf_counter() - start, e
+        self.digests[path] = digest
+        self.rendered += 1
+        return path, png_path, time.perf_counter() - start, None
+
+
+def traced_call(func: Callable, *args) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Call a function in a worker process with tracing on
+
+    Returns the function's result and the spans recorded in the worker.
+    """
+    take_events()  # Drop spans inherited from the parent process
+    enable()
+    return func(*args), take_events()
+
+
+def run_tasks(func: Callable, tasks: List[Tuple], jobs: int, report: Callable):
+    """Run func on every task, in worker processes unless jobs is 1
+
+    ``report(task, result=..., error=...)`` is called in the calling
+    process as each task finishes, in completion order.
+    """
+    if jobs == 1:
+        for task in tasks:
+            try:
+                report(task, func(*task))
+            except Exception as e:
+                report(task, error=e)
+        return
+
+    # Worker spans are sent back with each result when tracing
+    tracing = is_enabled()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        if tracing:
+            futures = {pool.submit(traced_call, func, *task): task for task in tasks}
+        else:
+            futures = {pool.submit(func, *task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                if tracing:
+                    result, events = result
+                    add_events(events)
+                report(futures[future], result)
+            except Exception as e:
+                report(futures[future], error=e)
+
+
+def run_render(args) -> int:
+    """Render every input palette file to PNG"""
+    files = expand_inputs(args.inputs, '.json', SPARSE_EXTENSION)
+    if not files:
+        print("No palette files found")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    print(f"Rendering {len(files)} palette files with {jobs} worker(s)...")
+
+    start = time.perf_counter()
+    failures = 0
+    counts = [0, 0]  # Misses, hits
+    cache = None
+    if not args.no_cache:
+        cache = RenderCache(args.cache_dir, args.cache_size << 20, args.link)
+
+    def report(task, result=None, error=None):
+        nonlocal failures
+        json_path, png_path = task[:2]
+        if error is None:
+            regions, seconds, hit = result
+            counts[hit] += 1
+            if cache is not None and not hit:
+                # Workers store new renders; their size is counted and evicted here
+                try:
+                    cache.account(os.path.getsize(png_path))
+                except OSError:
+                    pass
+            source = "cached" if hit else f"{regions} regions"
+            print(f"  ✓ {json_path} -> {png_path} ({source}, {seconds * 1000:.1f} ms)")
+        else:
+            failures += 1
+            print(f"  ✗ {json_path}: {error}")
+
+    tiled = True if args.tiled else None
+    worker_cache = cache.worker_copy() if cache is not None else None
+    tasks = [(f, output_path_for(f, args.output_dir, '.png'), tiled, worker_cache, args.indexed, args.compress_level)
+             for f in files]
+    run_tasks(render_file, tasks, jobs, report)
+
+    elapsed = time.perf_counter() - start
+    rendered = len(files) - failures
+    print(f"\nRendered {rendered}/{len(files)} files in {elapsed:.2f} s "
+          f"({rendered / elapsed if elapsed > 0 else 0:.1f} files/s)")
+    if cache is not None:
+        # Workers count hits on their own copies of the cache
+        cache.misses, cache.hits = counts
+        print(cache.summary())
+    return 0 if failures == 0 else 1
+
+
+def run_watch(args) -> int:
+    """Render palette files again whenever their contents change"""
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    watcher = PaletteWatcher(args.inputs, args.output_dir, args.debounce)
+    watcher.service.preload(TEMPLATE_PATH)
+    print(f"Watching {', '.join(args.inputs)} (Ctrl+C to stop)")
+
+    try:
+        while True:
+            for json_path, png_path, seconds, error in watcher.poll():
+                if error is None:
+                    print(f"  ✓ {json_path} -> {png_path} ({seconds * 1000:.1f} ms)")
+                else:
+                    print(f"  ✗ {json_path}: {error}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+    print(f"\nRendered {watcher.rendered} changes, "
+          f"skipped {watcher.skipped} saves with unchanged contents")
+    return 0
+
+
+def run_shades(args) -> int:
+    """Regenerate Shade and Highlight colors from base colors in palette files"""
+    files = expand_inputs(args.inputs, '.json', SPARSE_EXTENSION)
+    if not files:
+        print("No palette files found")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Deriving shades for {len(files)} palette files...")
+    start = time.perf_counter()
+    failures = 0
+    total = 0
+
+    # Palettes are loaded a chunk at a time to bound memory; each chunk's
+    # shades are derived in one array operation
+    for chunk_start in range(0, len(files), args.chunk_size):
+        loaded = []
+        for json_path in files[chunk_start:chunk_start + args.chunk_size]:
+            try:
+                loaded.append((json_path, *load_palette_file(json_path)))
+            except Exception as e:
+                failures += 1
+                print(f"  ✗ {json_path}: {e}")
+
+        updated = derive_table_shades([table for _, _, table in loaded])
+        total += updated
+
+        for json_path, palette_data, table in loaded:
+            out_path = output_path_for(json_path, args.output_dir, os.path.splitext(json_path)[1])
+            try:
+                save_palette_file(palette_data, table, out_path)
+            except (OSError, ValueError) as e:
+                failures += 1
+                print(f"  ✗ {out_path}: {e}")
+
+    elapsed = time.perf_counter() - start
+    print(f"\nUpdated {total} shade/highlight regions in {len(files) - failures}/{len(files)} files "
+          f"in {elapsed:.2f} s")
+    return 0 if failures == 0 else 1
+
+
+def run_extract(args) -> int:
+    """Convert every input texture into a palette file"""
+    files = expand_inputs(args.inputs, '.png')
+    if not files:
+        print("No texture files found")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    print(f"Extracting palettes from {len(files)} textures with {jobs} worker(s)...")
+
+    start = time.perf_counter()
+    failures = 0
+    missing_by_file = {}
+
+    def report(task, result=None, error=None):
+        nonlocal failures
+        png_path, _, out_path = task[:3]
+        if error is None:
+            regions, missing, seconds = result
+            missing_by_file[png_path] = missing
+            print(f"  ✓ {png_path} -> {out_path} ({regions - len(missing)}/{regions} regions, "
+                  f"{seconds * 1000:.1f} ms)")
+        else:
+            failures += 1
+            print(f"  ✗ {png_path}: {error}")
+
+    extension = SPARSE_EXTENSION if args.sparse else '.json'
+    tasks = [(f, args.layout, output_path_for(f, args.output_dir, extension), args.mode, args.trim, args.tolerance)
+             for f in files]
+    run_tasks(extract_file, tasks, jobs, report)
+
+    elapsed = time.perf_counter() - start
+    extracted = len(files) - failures
+    print(f"\nExtracted {extracted}/{len(files)} textures in {elapsed:.2f} s "
+          f"({extracted / elapsed if elapsed > 0 else 0:.1f} textures/s)")
+
+    # Regions that got no color, most common first
+    counts = collections.Counter(path for missing in missing_by_file.values() for path in missing)
+    if counts:
+        files_missing = sum(1 for missing in missing_by_file.values() if missing)
+        print(f"Regions with no usable color: {sum(counts.values())} in {files_missing} file(s)")
+        for path, count in counts.most_common(args.top):
+            print(f"  {path:50} {count} file(s)")
+        if len(counts) > args.top:
+            print(f"  ... and {len(counts) - args.top} more regions")
+    else:
+        print("Every region had a usable color")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({path: missing_by_file[path] for path in sorted(missing_by_file)}, f, indent=2)
+        print(f"Missing regions per texture written to {args.report}")
+
+    return 0 if failures == 0 else 1
+
+
+def trim_fraction(text: str) -> float:
+    """Parse a --trim value, which must be at least 0 and below 0.5"""
+    value = float(text)
+    if not 0 <= value < 0.5:
+        raise argparse.ArgumentTypeError(f"must be at least 0 and below 0.5, got {text}")
+    return value
+
+
+def tolerance_width(text: str) -> int:
+    """Parse a --tolerance value, which must be at least 1"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {text}")
+    return value
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(description="Headless batch tools for character palettes")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Record timing spans and write them as a Chrome trace to FILE")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = subparsers.add_parser("render", help="Render palette JSON files to PNG textures")
+    render_parser.add_argument("inputs", nargs="+",
+                               help="Palette files (.json or .palette), directories or glob patterns")
+    render_parser.add_argument("-o", "--output-dir",
+                               help="Directory for the PNG files (default: next to each input)")
+    render_parser.add_argument("-j", "--jobs", type=int, default=0,
+                               help="Number of worker processes (default: CPU count)")
+    render_parser.add_argument("--tiled", action="store_true",
+                               help="Stream every atlas to PNG band by band (default: only 4096 and up)")
+    render_parser.add_argument("--indexed", action="store_true",
+                               help="Save 8-bit indexed PNGs when at most 256 colors show (same pixels, smaller files)")
+    render_parser.add_argument("--compress-level", type=int, choices=range(10), default=PNG_COMPRESS_LEVEL,
+                               metavar="0-9",
+                               help=f"zlib level of the PNG files, 1 fastest to 9 smallest (default: {PNG_COMPRESS_LEVEL})")
+    render_parser.add_argument("--no-cache", action="store_true",
+                               help="Render every file instead of copying unchanged ones from the render cache")
+    render_parser.add_argument("--cache-dir",
+                               help="Render cache directory (default: renders/ in the palette cache directory)")
+    render_parser.add_argument("--cache-size", type=int, default=RENDER_CACHE_BYTES >> 20, metavar="MB",
+                               help=f"Size limit of the render cache (default: {RENDER_CACHE_BYTES >> 20} MB)")
+    render_parser.add_argument("--link", action="store_true",
+                               help="Hard-link cached PNGs instead of copying them (outputs become read-only)")
+    render_parser.set_defaults(func=run_render)
+
+    watch_parser = subparsers.add_parser("watch", help="Render palette files again whenever they change")
+    watch_parser.add_argument("inputs", nargs="+",
+                              help="Palette files (.json or .palette), directories or glob patterns")
+    watch_parser.add_argument("-o", "--output-dir",
+                              help="Directory for the PNG files (default: next to each input)")
+    watch_parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                              help=f"Seconds between scans of the inputs (default: {WATCH_INTERVAL})")
+    watch_parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                              help=f"Seconds a file must go unchanged before it is rendered (default: {WATCH_DEBOUNCE})")
+    watch_parser.set_defaults(func=run_watch)
+
+    shades_parser = subparsers.add_parser(
+        "shades", help="Regenerate Shade and Highlight colors from each base color")
+    shades_parser.add_argument("inputs", nargs="+",
+                               help="Palette files (.json or .palette), directories or glob patterns")
+    shades_parser.add_argument("-o", "--output-dir",
+                               help="Directory for the updated files (default: overwrite the inputs)")
+    shades_parser.add_argument("--chunk-size", type=int, default=512,
+                               help="Palettes held in memory at once (default: 512)")
+    shades_parser.set_defaults(func=run_shades)
+
+    extract_parser = subparsers.add_parser(
+        "extract", help="Extract the color of every region of textures into palette files")
+    extract_parser.add_argument("inputs", nargs="+", help="PNG files, directories or glob patterns")
+    extract_parser.add_argument("-o", "--output-dir",
+                                help="Directory for the palette files (default: next to each texture)")
+    extract_parser.add_argument("-j", "--jobs", type=int, default=0,
+                                help="Number of worker processes (default: CPU count)")
+    extract_parser.add_argument("--layout", default=TEMPLATE_PATH,
+                                help="Palette file whose layout the textures use (default: the template)")
+    extract_parser.add_argument("--mode", choices=IMPORT_MODES, default=MODE_DOMINANT,
+                                help="How region colors are picked (default: dominant, the most common color)")
+    extract_parser.add_argument("--trim", type=trim_fraction, default=DEFAULT_TRIM,
+                                help="Fraction dropped at each end of every channel in trimmed mode (default: 0.1)")
+    extract_parser.add_argument("--tolerance", type=tolerance_width, default=DEFAULT_TOLERANCE,
+                                help="Channel bucket width in quantized mode (default: 16)")
+    extract_parser.add_argument("--sparse", action="store_true",
+                                help="Write colors-only .palette files instead of full JSON")
+    extract_parser.add_argument("--report", help="Write the regions with no usable color per texture to this JSON file")
+    extract_parser.add_argument("--top", type=int, default=10,
+                                help="Most commonly missing regions to list (default: 10)")
+    extract_parser.set_defaults(func=run_extract)
+
+    return parser
+
+
+def main(argv=None):
+    """Main entry point"""
+    args = build_parser().parse_args(argv)
+    if not args.trace:
+        enable_from_env()
+        return args.func(args)
+
+    enable()
+    with span(args.command):
+        status = args.func(args)
+    count = write_trace(args.trace)
+    print(f"Wrote {count} timing spans to {args.trace}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Palette Render Cache
+Content-addressed on-disk cache of rendered textures. An entry is keyed by
+a hash of the region geometry in render order, the region colors, the
+output size and the file format, so a palette whose colors have not
+changed since its last export is served by copying (or hard-linking) the
+cached file instead of rendering and encoding it again.
+
+The cache lives in ``renders/`` inside the palette cache directory and is
+kept under a size limit by evicting the least recently used entries.
+"""
+
+import hashlib
+import os
+import shutil
+import stat
+from typing import Any, Callable, Dict, Optional, Sequence
+import numpy as np
+
+from palette_layout import default_cache_dir
+from palette_render import PNG_COMPRESS_LEVEL, Region
+
+
+# Bump when the renderer's output changes, so older entries are not served
+RENDER_CACHE_VERSION = 1
+
+# Default size limit of the cache directory, in bytes
+RENDER_CACHE_BYTES = 512 << 20
+
+# Share of the size limit the cache is trimmed to once it is exceeded
+EVICT_TO = 0.9
+
+
+def default_render_cache_dir() -> str:
+    """Get the directory for cached renders"""
+    return os.path.join(default_cache_dir(), 'renders')
+
+
+def render_key(regions: Sequence[Region], size: int, fmt: str = 'png') -> str:
+    """Hash everything a render depends on into a cache key
+
+    The layout part is a fingerprint of the region rectangles in render
+    order, so callers that list the same layout in different orders never
+    share entries.
+    """
+    geometry = np.array([region[:4] for region in regions], dtype='<i4')
+    colors = np.array([region[4] for region in regions], dtype=np.uint8)
+    layout = hashlib.sha256(geometry.tobytes()).hexdigest()
+    digest = hashlib.sha256(f"{RENDER_CACHE_VERSION}:{fmt}:{size}:{layout}:".encode('ascii'))
+    digest.update(colors.tobytes())
+    return f"{digest.hexdigest()}.{fmt}"
+
+
+def png_format(indexed: bool = False, compress_level: int = PNG_COMPRESS_LEVEL) -> str:
+    """Name a PNG encoding for render_key, so each encoding gets its own entries"""
+    return f"{'indexed' if indexed else 'rgb'}{compress_level}.png"
+
+
+def place_file(source: str, dest: str, link: bool = False):
+    """Put a copy of source at dest, replacing dest atomically
+
+    With ``link`` the copy is a hard link when the file system allows it.
+    """
+    temp_path = f"{dest}.{os.getpid()}.tmp"
+    try:
+        try:
+            if not link:
+                raise OSError
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, dest)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def remove_entry(path: str):
+    """Delete a read-only cache entry
+
+    Windows refuses to delete read-only files, so the entry is made
+    writable again first when the plain delete fails.
+    """
+    try:
+        os.unlink(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        os.unlink(path)
+
+
+class RenderCache:
+    """Size-bounded LRU directory of rendered files keyed by render_key
+
+    Entries are stored read-only, so with ``link`` the hard-linked output
+    files cannot be edited in place and change the cached copy. Hit and
+    miss counts are kept per instance.
+
+    Instances made by worker_copy() leave size accounting and eviction to
+    the instance that made them, which is told about every stored file
+    through account().
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = RENDER_CACHE_BYTES,
+                 link: bool = False, track_size: bool = True):
+        self.directory = directory or default_render_cache_dir()
+        self.max_bytes = max_bytes
+        self.link = link
+        self.track_size = track_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: Optional[int] = None  # Bytes in the directory, counted on first store
+
+    def entry_path(self, key: str) -> str:
+        """Get the file an entry is stored in"""
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key: str, dest: str) -> bool:
+        """Copy a cached entry to dest; returns False if there is none"""
+        path = self.entry_path(key)
+        try:
+            place_file(path, dest, self.link)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return True
+
+    def store(self, key: str, source: str):
+        """Add a rendered file to the cache, evicting old entries if it grows too large"""
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        place_file(source, path, self.link)
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        if self.track_size:
+            self.account(os.path.getsize(path))
+
+    def account(self, added: int):
+        """Count bytes stored in the cache, evicting old entries if it grew too large
+
+        The directory is scanned once, on the first call; after that the
+        size is kept up to date from the calls and evictions.
+        """
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += added
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def worker_copy(self) -> 'RenderCache':
+        """Get a copy to hand to worker processes, which never scans or evicts"""
+        return RenderCache(self.directory, self.max_bytes, self.link, track_size=False)
+
+    def output(self, key: str, dest: str, write: Callable[[str], Any]) -> bool:
+        """Produce dest from the cache, or by calling write(path) and caching the result
+
+        The file is written next to dest and renamed over it, so dest never
+        holds a partial file and a linked cache entry is never overwritten.
+        Returns whether the cache was hit.
+        """
+        if self.fetch(key, dest):
+            return True
+        temp_path = f"{dest}.{os.getpid()}.render.tmp"
+        try:
+            write(temp_path)
+            os.replace(temp_path, dest)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        try:
+            self.store(key, dest)
+        except OSError:
+            pass  # The cache is only an optimization
+        return False
+
+    def evict(self, target: int):
+        """Remove the least recently used entries until the cache holds at most target bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                remove_entry(path)
+            except FileNotFoundError:
+                pass  # Evicted by another process
+            except OSError:
+                continue  # Still counted, as it still takes up space
+            total -= size
+            self.evictions += 1
+        self._size = total
+
+    def _entries(self):
+        """Yield (path, size, last use) for every entry"""
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    info = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, info.st_size, info.st_mtime
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the hit, miss and eviction counts"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def summary(self) -> str:
+        """Describe the hit rate in one line"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"Render cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
@@ -5,98 +5,92 @@ A GUI application for editing SaveCharacterPalette.json configuration files
 with live PNG preview generation.
 """
 
-import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
 from PIL import Image, ImageTk
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Tuple
-import colorsys
-from collections import Counter
+from palette_cache import RenderCache, png_format, render_key
+from palette_render import CANVAS_SIZE, PNG_COMPRESS_LEVEL, hex_to_rgb, save_atlas, table_atlas_size
+from palette_preview import PreviewScheduler
+from palette_history import EditHistory, Transaction
+from palette_trace import enable, enable_from_env, is_enabled, last_duration, span, traced, write_trace
+from palette_import import (
+    MODE_DOMINANT, MODE_MEAN, MODE_TRIMMED, MODE_QUANTIZED, extract_region_colors
+)
+from palette_colors import calculate_shade, calculate_highlight, derive_shade_colors
+from palette_layout import (
+    CLOTHING_GROUP, ATTACHMENTS_GROUP, KIND_BASE, KIND_SHADE, KIND_HIGHLIGHT,
+    compile_layout, load_palette, load_palette_file, save_palette_changes
+)
 
 
-def calculate_shade(color_hex: str, factor: float = 0.6) -> str:
-    """Calculate a darker shade of the given color"""
-    if not color_hex or color_hex == "":
-        return "#000000"
-    
-    # Convert hex to RGB
-    color_hex = color_hex.lstrip('#')
-    try:
-        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-    except:
-        return "#000000"
-    
-    # Convert to HSV
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    
-    # Reduce value (brightness) for shade
-    v = v * factor
-    
-    # Convert back to RGB
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    
-    # Convert to hex
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+# Texture import modes shown in the File menu
+IMPORT_MODE_LABELS = [
+    (MODE_DOMINANT, "Most Common Color"),
+    (MODE_QUANTIZED, "Most Common Color (Tolerant)"),
+    (MODE_MEAN, "Mean Color"),
+    (MODE_TRIMMED, "Trimmed Mean Color"),
+]
+
+# PNG compression levels shown in the File menu
+PNG_LEVEL_LABELS = [
+    (1, "Fastest"),
+    (PNG_COMPRESS_LEVEL, "Default"),
+    (9, "Smallest"),
+]
+
+# Color picker rows are placed at fixed offsets, so the rows in view can be
+# computed from the scroll position without creating or measuring widgets
+PICKER_ROW_HEIGHT = 32
+PICKER_INDENT = 20
+PICKER_OVERSCAN = 4  # Extra rows kept above and below the visible area
 
 
-def calculate_highlight(color_hex: str, factor: float = 1.4) -> str:
-    """Calculate a lighter highlight of the given color"""
-    if not color_hex or color_hex == "":
-        return "#000000"
-    
-    # Convert hex to RGB
-    color_hex = color_hex.lstrip('#')
-    try:
-        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-    except:
-        return "#000000"
-    
-    # Convert to HSV
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    
-    # Increase value (brightness) for highlight
-    v = min(1.0, v * factor)
-    # Reduce saturation slightly for better highlight effect
-    s = s * 0.8
-    
-    # Convert back to RGB
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    
-    # Convert to hex
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+def visible_row_range(view_top: int, view_bottom: int, list_top: int, row_count: int,
+                      row_height: int = PICKER_ROW_HEIGHT, overscan: int = PICKER_OVERSCAN) -> Tuple[int, int]:
+    """Get the [first, last) rows of a list that fall in the visible area
+
+    ``view_top``/``view_bottom`` and ``list_top`` are in the same scrolled
+    coordinates; ``overscan`` extra rows are included on either side.
+    """
+    first = min(row_count, max(0, (view_top - list_top) // row_height - overscan))
+    last = min(row_count, -(-(view_bottom - list_top) // row_height) + overscan)
+    return first, max(first, last)
 
 
 class ColorEntry:
     """Represents a single color entry in the palette"""
-    def __init__(self, name: str, x: int, y: int, width: int, height: int, color: str = ""):
+    def __init__(self, name: str, x: int, y: int, width: int, height: int, color: str = "",
+                 node: Dict[str, Any] = None):
         self.name = name
         self.x = x
         self.y = y
         self.width = width
         self.height = height
         self.color = color if color else "#000000"
-        self.widgets = None  # Tuple of (button, entry) widgets
+        self.node = node  # The palette_data dict this region was read from
+        self.widgets = None  # Tuple of (button, entry) widgets while a picker row shows it
+
+
+class PickerRow:
+    """A recyclable row of color picker widgets, showing one region at a time"""
+    def __init__(self, frame: ttk.Frame):
+        self.frame = frame
+        self.label = None
+        self.button = None
+        self.entry = None
+        self.path = None  # Path of the region currently shown
 
 
 class PaletteEditor:
     """Main application class for the character palette editor"""
     
     # Define color groups
-    CLOTHING_GROUP = [
-        'Torso', 'Arm Attire Left', 'Arm Attire Right', 
-        'Hand Attire Left', 'Hand Attire Right', 'Hips', 
-        'Leg Left', 'Leg Right', 'Foot Left', 'Foot Right'
-    ]
-    
-    ATTACHMENTS_GROUP = [
-        'Shoulder Attire Left', 'Shoulder Attire Right', 
-        'Elbow Attire Left', 'Elbow Attire Right', 
-        'Knee Attire Left', 'Knee Attire Right', 
-        'Hip Front Attachment', 'Hip Left Attachment', 
-        'Hip Right Attachment', 'Hip Back Attachment', 
-        'Head Attachment', 'Face Attachment', 'Back Attachment'
-    ]
+    CLOTHING_GROUP = CLOTHING_GROUP
+    ATTACHMENTS_GROUP = ATTACHMENTS_GROUP
     
     def __init__(self, root):
         self.root = root
@@ -105,12 +99,27 @@ class PaletteEditor:
         
         self.config_file = None
         self.palette_data = []
+        self.region_table = None  # Compiled RegionTable of palette_data
         self.color_entries = {}  # Maps path -> ColorEntry
         self.preview_image = None
         self.preview_photo = None
+        self.preview_scheduler = PreviewScheduler()  # Renders the preview in the background
+        self.preview_poll_pending = None  # after id of the next check for finished renders
+        self.region_index = {}  # Maps path -> region index in the preview
+        self.atlas_size = CANVAS_SIZE  # Texture size of the loaded layout
+        self.dirty_paths = set()  # Paths whose color changed since the last save
+        self.history = EditHistory()  # Undo/redo journal of color edits
+        self.render_cache = RenderCache()  # Exports of unchanged palettes are copied from here
+        self.import_mode = tk.StringVar(value=MODE_DOMINANT)  # How import_texture picks region colors
+        self.png_level = tk.IntVar(value=PNG_COMPRESS_LEVEL)  # zlib level of exported PNGs
+        self.save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="palette-save")
+        self.pending_saves = []  # (future, filename, paths, palette_data) of saves in progress
+        self.save_poll_pending = None  # after id of the next check for finished saves
         self.group_frames = {}  # Maps group name -> frame widget
         self.group_expanded = {}  # Maps group name -> bool
         self.group_color_widgets = {}  # Maps (group_name, color_id) -> (button, entry)
+        self.visible_rows_pending = None  # after_idle id of a scheduled picker row update
+        self.picker_row_width = None  # Measured width of a picker row
         
         self.setup_ui()
         
@@ -128,11 +137,30 @@ class PaletteEditor:
         file_menu.add_command(label="Save As...", command=self.save_config_as)
         file_menu.add_separator()
         file_menu.add_command(label="Import Texture PNG...", command=self.import_texture)
+        mode_menu = tk.Menu(file_menu, tearoff=0)
+        file_menu.add_cascade(label="Import Mode", menu=mode_menu)
+        for mode, label in IMPORT_MODE_LABELS:
+            mode_menu.add_radiobutton(label=label, value=mode, variable=self.import_mode)
         file_menu.add_separator()
         file_menu.add_command(label="Export PNG...", command=self.export_png)
+        file_menu.add_command(label="Export Indexed PNG...", command=lambda: self.export_png(indexed=True))
+        level_menu = tk.Menu(file_menu, tearoff=0)
+        file_menu.add_cascade(label="PNG Compression", menu=level_menu)
+        for level, label in PNG_LEVEL_LABELS:
+            level_menu.add_radiobutton(label=label, value=level, variable=self.png_level)
+        if is_enabled():
+            file_menu.add_command(label="Save Timing Trace...", command=self.save_trace)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+        self.root.bind_all("<Control-z>", lambda e: self.undo())
+        self.root.bind_all("<Control-y>", lambda e: self.redo())
+        self.root.bind_all("<Control-Shift-Z>", lambda e: self.redo())
+        
         # Main container
         main_container = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
         main_container.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -145,6 +173,7 @@ class PaletteEditor:
         
         # Scrollable frame for color pickers
         canvas = tk.Canvas(left_frame)
+        self.picker_canvas = canvas
         scrollbar = ttk.Scrollbar(left_frame, orient="vertical", command=canvas.yview)
         self.scrollable_frame = ttk.Frame(canvas)
         
@@ -154,7 +183,14 @@ class PaletteEditor:
         )
         
         canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        
+        # Picker rows are created only for the visible part of the list
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            self.schedule_visible_rows()
+        
+        canvas.configure(yscrollcommand=on_scroll)
+        canvas.bind("<Configure>", lambda e: self.schedule_visible_rows())
         
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -163,7 +199,9 @@ class PaletteEditor:
         right_frame = ttk.Frame(main_container)
         main_container.add(right_frame, weight=1)
         
-        ttk.Label(right_frame, text="Preview (1024x1024)", font=('Arial', 12, 'bold')).pack(pady=5)
+        self.preview_label = ttk.Label(right_frame, text=f"Preview ({CANVAS_SIZE}x{CANVAS_SIZE})",
+                                       font=('Arial', 12, 'bold'))
+        self.preview_label.pack(pady=5)
         
         # Preview canvas
         self.preview_canvas = tk.Canvas(right_frame, width=600, height=600, bg='white')
@@ -182,11 +220,11 @@ class PaletteEditor:
         """Create a new configuration from template"""
         template_path = os.path.join(os.path.dirname(__file__), "SaveCharacterPalette.json")
         if os.path.exists(template_path):
-            with open(template_path, 'r') as f:
-                self.palette_data = json.load(f)
-            self.config_file = None
-            self.load_palette_data()
-            self.status_var.set("New configuration created from template")
+            with span("editor.open", file=template_path):
+                self.palette_data, self.region_table = load_palette(template_path)
+                self.config_file = None
+                self.load_palette_data()
+            self.status_var.set(self.timing_status("New configuration created from template"))
         else:
             messagebox.showerror("Error", "Template file SaveCharacterPalette.json not found")
     
@@ -194,15 +232,16 @@ class PaletteEditor:
         """Open an existing configuration file"""
         filename = filedialog.askopenfilename(
             title="Open Configuration",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Palette files", "*.json *.palette"), ("JSON files", "*.json"),
+                       ("Colors-only palettes", "*.palette"), ("All files", "*.*")]
         )
         if filename:
             try:
-                with open(filename, 'r') as f:
-                    self.palette_data = json.load(f)
-                self.config_file = filename
-                self.load_palette_data()
-                self.status_var.set(f"Loaded: {os.path.basename(filename)}")
+                with span("editor.open", file=filename):
+                    self.palette_data, self.region_table = load_palette_file(filename)
+                    self.config_file = filename
+                    self.load_palette_data()
+                self.status_var.set(self.timing_status(f"Loaded: {os.path.basename(filename)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load file: {str(e)}")
     
@@ -218,45 +257,124 @@ class PaletteEditor:
         filename = filedialog.asksaveasfilename(
             title="Save Configuration As",
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Colors-only palettes", "*.palette"), ("All files", "*.*")]
         )
         if filename:
             self.save_to_file(filename)
             self.config_file = filename
     
     def save_to_file(self, filename):
-        """Save the configuration data to a file"""
-        try:
-            # Update palette_data with current color values
-            self.update_palette_data_from_entries()
-            
-            with open(filename, 'w') as f:
-                json.dump(self.palette_data, f, indent=2)
-            self.status_var.set(f"Saved: {os.path.basename(filename)}")
-            messagebox.showinfo("Success", "Configuration saved successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save file: {str(e)}")
-    
-    def update_palette_data_from_entries(self):
-        """Update the palette data structure with values from color entries"""
-        for path, entry in self.color_entries.items():
-            parts = path.split('.')
-            current = self.palette_data
-            
-            # Navigate to the right position in the nested structure
-            for i, part in enumerate(parts[:-1]):
-                if part.isdigit():
-                    current = current[int(part)]
-                else:
-                    current = current[part]
+        """Save the configuration data to a file in the background"""
+        # Snapshot the colors changed since the last save; the save worker
+        # writes them into palette_data, serializes it and replaces the file
+        paths = self.dirty_paths
+        changes = [(self.color_entries[path].node, self.color_entries[path].color) for path in paths]
+        self.dirty_paths = set()
+        
+        future = self.save_executor.submit(
+            save_palette_changes, self.palette_data, self.region_table, changes, filename)
+        self.pending_saves.append((future, filename, paths, self.palette_data))
+        self.status_var.set(f"Saving {os.path.basename(filename)}...")
+        self.schedule_save_poll()
+    
+    def schedule_save_poll(self):
+        """Check for finished saves shortly"""
+        if self.save_poll_pending is None:
+            self.save_poll_pending = self.root.after(50, self.poll_saves)
+    
+    def poll_saves(self):
+        """Report finished saves in the status bar and keep polling while any are running"""
+        self.save_poll_pending = None
+        
+        running = []
+        for future, filename, paths, palette_data in self.pending_saves:
+            if not future.done():
+                running.append((future, filename, paths, palette_data))
+                continue
             
-            # Update the color value
-            last_part = parts[-1]
-            if last_part.isdigit():
-                current[int(last_part)]["Color"] = entry.color
+            error = future.exception()
+            if error is None:
+                self.status_var.set(f"Saved: {os.path.basename(filename)} ({len(paths)} changed regions)")
             else:
-                current[last_part]["Color"] = entry.color
+                # Keep the changes for the next save unless another file was loaded since
+                if palette_data is self.palette_data:
+                    self.dirty_paths.update(paths)
+                messagebox.showerror("Error", f"Failed to save file: {str(error)}")
+        
+        self.pending_saves = running
+        if running:
+            self.schedule_save_poll()
+    
+    def commit_colors(self, label: str, colors: Dict[str, str]):
+        """Set the colors of regions by path as one undoable edit"""
+        rows = self.region_table.path_index()
+        self.history.record(label, [
+            (rows[path], self.color_entries[path].color, color) for path, color in colors.items()
+        ])
+        for path, color in colors.items():
+            self.color_entries[path].color = color
+        
+        paths = list(colors)
+        self.update_color_widgets(paths)
+        self.mark_changed(paths)
+    
+    def undo(self):
+        """Revert the newest color edit"""
+        transaction = self.history.undo()
+        if transaction is None:
+            self.status_var.set("Nothing to undo")
+            return
+        self.apply_transaction(transaction)
+        self.status_var.set(f"Undo: {transaction.label}")
+    
+    def redo(self):
+        """Repeat the newest undone color edit"""
+        transaction = self.history.redo()
+        if transaction is None:
+            self.status_var.set("Nothing to redo")
+            return
+        self.apply_transaction(transaction)
+        self.status_var.set(f"Redo: {transaction.label}")
+    
+    def apply_transaction(self, transaction: Transaction):
+        """Set the new colors of a history transaction, repainting only its regions"""
+        paths = [self.region_table.paths[row] for row in transaction.regions]
+        for path, color in zip(paths, transaction.new):
+            self.color_entries[path].color = color
+        self.update_color_widgets(paths)
+        self.mark_changed(paths)
+    
+    def timing_status(self, message: str) -> str:
+        """Add the newest preview render and load times to a status message while tracing"""
+        if not is_enabled():
+            return message
+        timings = []
+        for label, name in (("render", "preview.render"), ("load", "editor.open")):
+            seconds = last_duration(name)
+            if seconds is not None:
+                timings.append(f"{label} {seconds * 1000:.1f} ms")
+        return f"{message} ({', '.join(timings)})" if timings else message
+    
+    def save_trace(self):
+        """Write the recorded timing spans to a Chrome trace file"""
+        filename = filedialog.asksaveasfilename(
+            title="Save Timing Trace",
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")]
+        )
+        if filename:
+            try:
+                count = write_trace(filename)
+                self.status_var.set(f"Saved {count} timing spans to {os.path.basename(filename)}")
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to save trace: {str(e)}")
+    
+    def mark_changed(self, paths: List[str]):
+        """Record edited regions for the next save and repaint them in the preview"""
+        self.dirty_paths.update(paths)
+        self.refresh_preview(paths)
     
+    @traced("editor.load_palette_data")
     def load_palette_data(self):
         """Load the palette data and create color picker widgets"""
         # Clear existing widgets
@@ -265,26 +383,34 @@ class PaletteEditor:
         
         self.color_entries.clear()
         self.group_frames.clear()
+        self.history.clear()
         self.group_expanded = {}
         
-        # Create grouped sections
-        self.create_group_section("Clothing", self.CLOTHING_GROUP)
-        self.create_group_section("Attachments", self.ATTACHMENTS_GROUP)
+        if self.region_table is None:
+            self.region_table = compile_layout(self.palette_data)
         
-        # Create section for all other items
-        other_items = []
-        for item in self.palette_data:
-            item_name = list(item.keys())[0]
-            if item_name not in self.CLOTHING_GROUP and item_name not in self.ATTACHMENTS_GROUP:
-                other_items.append(item_name)
+        # The atlas is sized to hold every region of the layout
+        self.atlas_size = table_atlas_size(self.region_table)
+        self.preview_label.configure(text=f"Preview ({self.atlas_size}x{self.atlas_size})")
         
-        if other_items:
-            self.create_other_items_section(other_items)
+        # Create grouped sections, then a section for all other items.
+        # Color entries exist for every region; picker widgets are only
+        # created for rows that are scrolled into view in an expanded group.
+        for group_name, rows in self.region_table.group_rows():
+            self.create_color_entries(rows)
+            if group_name != 'Other':
+                self.create_group_section(group_name, rows)
+            elif rows:
+                self.create_other_items_section(rows)
+        
+        # Unset colors are shown and saved as black, so they start out unsaved
+        self.dirty_paths = {path for path, entry in self.color_entries.items() if entry.node["Color"] != entry.color}
         
         # Update preview
         self.update_preview()
     
-    def create_group_section(self, group_name: str, item_names: List[str]):
+    @traced("editor.create_section")
+    def create_group_section(self, group_name: str, rows: List[int]):
         """Create a collapsible section for a group"""
         # Main frame for the group
         group_container = ttk.Frame(self.scrollable_frame, relief=tk.RIDGE, borderwidth=2)
@@ -347,34 +473,88 @@ class PaletteEditor:
         content_frame = ttk.Frame(group_container)
         self.group_frames[group_name] = {
             'expand_var': expand_var,
+            'container': group_container,
             'content_frame': content_frame,
-            'header_frame': header_frame
+            'header_frame': header_frame,
+            'rows': rows,
+            'visible': {},  # Maps list position -> PickerRow
+            'pool': []  # Unused PickerRows
         }
-        
-        # Add items to the group
-        for item_name in item_names:
-            # Find the item in palette_data
-            for idx, item in enumerate(self.palette_data):
-                if list(item.keys())[0] == item_name:
-                    self.parse_palette_structure(
-                        item, 
-                        str(idx), 
-                        content_frame,
-                        level=0,
-                        group_name=group_name
-                    )
-                    break
     
     def toggle_group(self, group_name: str, expand_var: tk.StringVar):
         """Toggle expansion/collapse of a group"""
         self.group_expanded[group_name] = not self.group_expanded[group_name]
         
+        section = self.group_frames[group_name]
         if self.group_expanded[group_name]:
             expand_var.set("▼")
-            self.group_frames[group_name]['content_frame'].pack(fill=tk.BOTH, expand=True)
+            self.size_content_frame(section)
+            section['content_frame'].pack(fill=tk.BOTH, expand=True)
         else:
             expand_var.set("▶")
-            self.group_frames[group_name]['content_frame'].pack_forget()
+            section['content_frame'].pack_forget()
+            for position in list(section['visible']):
+                self.release_picker_row(section, position)
+        
+        self.schedule_visible_rows()
+    
+    def size_content_frame(self, section: Dict[str, Any]):
+        """Size a section's content frame to hold all of its rows"""
+        content_frame = section['content_frame']
+        if self.picker_row_width is None:
+            # Measure one row; every row has the same fixed-width widgets
+            row = self.create_picker_row(content_frame)
+            row.frame.update_idletasks()
+            self.picker_row_width = row.frame.winfo_reqwidth()
+            section['pool'].append(row)
+        
+        levels = self.region_table.level[section['rows']]
+        max_level = int(levels.max()) if len(levels) else 0
+        content_frame.configure(
+            width=self.picker_row_width + max_level * PICKER_INDENT + 5,
+            height=len(section['rows']) * PICKER_ROW_HEIGHT
+        )
+    
+    def schedule_visible_rows(self):
+        """Update the visible picker rows once the current events are handled"""
+        if self.visible_rows_pending is None:
+            self.visible_rows_pending = self.root.after_idle(self.update_visible_rows)
+    
+    @traced("editor.update_visible_rows")
+    def update_visible_rows(self):
+        """Bind picker rows to the regions in view and recycle the rest"""
+        self.visible_rows_pending = None
+        canvas = self.picker_canvas
+        view_top = int(canvas.canvasy(0))
+        view_bottom = view_top + canvas.winfo_height()
+        
+        for group_name, section in self.group_frames.items():
+            if not self.group_expanded.get(group_name):
+                continue
+            
+            list_top = section['container'].winfo_y() + section['content_frame'].winfo_y()
+            first, last = visible_row_range(view_top, view_bottom, list_top, len(section['rows']))
+            
+            for position in list(section['visible']):
+                if not first <= position < last:
+                    self.release_picker_row(section, position)
+            
+            for position in range(first, last):
+                if position not in section['visible']:
+                    if section['pool']:
+                        row = section['pool'].pop()
+                    else:
+                        row = self.create_picker_row(section['content_frame'])
+                    self.bind_picker_row(row, section['rows'][position], position)
+                    section['visible'][position] = row
+    
+    def release_picker_row(self, section: Dict[str, Any], position: int):
+        """Detach a picker row from its region and return it to the pool"""
+        row = section['visible'].pop(position)
+        self.color_entries[row.path].widgets = None
+        row.path = None
+        row.frame.place_forget()
+        section['pool'].append(row)
     
     def update_color_widgets(self, paths: List[str]):
         """Update UI widgets for given paths"""
@@ -399,12 +579,7 @@ class PaletteEditor:
     
     def apply_group_color(self, group_name: str, color_id: str, hex_color: str):
         """Apply a color to all items in a group and update UI"""
-        # Get the item names for the group
-        if group_name == "Clothing":
-            item_names = self.CLOTHING_GROUP
-        elif group_name == "Attachments":
-            item_names = self.ATTACHMENTS_GROUP
-        else:
+        if group_name not in ("Clothing", "Attachments"):
             return
         
         # Update group-level color widget
@@ -414,29 +589,21 @@ class PaletteEditor:
             entry.delete(0, tk.END)
             entry.insert(0, hex_color)
         
-        # Apply the color to all matching items
-        updated_widgets = []
-        for path, entry in self.color_entries.items():
-            # Check if this entry belongs to an item in the group and matches the color ID
-            for item_name in item_names:
-                if item_name in path and color_id in path:
-                    # Check if this is the base color (not Shade or Highlight)
-                    if not ("Shade" in path or "Highlight" in path):
-                        entry.color = hex_color
-                        updated_widgets.append(path)
-                    # Auto-calculate shade and highlight
-                    elif "Shade" in path:
-                        entry.color = calculate_shade(hex_color)
-                        updated_widgets.append(path)
-                    elif "Highlight" in path:
-                        entry.color = calculate_highlight(hex_color)
-                        updated_widgets.append(path)
-                    break
-        
-        # Update UI widgets for all affected entries
-        self.update_color_widgets(updated_widgets)
+        # Look up the base, Shade and Highlight rows of this color in the group's items
+        rows_by_kind = self.region_table.color_index().get((group_name, color_id))
+        if rows_by_kind is None:
+            return
         
-        self.update_preview()
+        # Auto-calculate shade and highlight once for the whole group
+        (shade,), (highlight,) = derive_shade_colors([hex_color])
+        kind_colors = {KIND_BASE: hex_color, KIND_SHADE: shade, KIND_HIGHLIGHT: highlight}
+        colors = {}
+        for kind, rows in enumerate(rows_by_kind):
+            for row in rows:
+                colors[self.region_table.paths[row]] = kind_colors[kind]
+        
+        # The whole group is a single undo step
+        self.commit_colors(f"{group_name} {color_id}", colors)
         self.status_var.set(f"Applied {color_id} ({hex_color}) to all items in {group_name}")
     
     def update_group_color_from_entry(self, group_name: str, color_id: str, entry: ttk.Entry, button: tk.Button):
@@ -456,7 +623,8 @@ class PaletteEditor:
             entry.delete(0, tk.END)
             entry.insert(0, "#000000")
     
-    def create_other_items_section(self, item_names: List[str]):
+    @traced("editor.create_section")
+    def create_other_items_section(self, rows: List[int]):
         """Create a section for non-grouped items"""
         # Main frame for other items
         other_container = ttk.Frame(self.scrollable_frame, relief=tk.RIDGE, borderwidth=2)
@@ -484,102 +652,75 @@ class PaletteEditor:
         content_frame = ttk.Frame(other_container)
         self.group_frames['Other'] = {
             'expand_var': expand_var,
+            'container': other_container,
             'content_frame': content_frame,
-            'header_frame': header_frame
+            'header_frame': header_frame,
+            'rows': rows,
+            'visible': {},  # Maps list position -> PickerRow
+            'pool': []  # Unused PickerRows
         }
-        
-        # Add items to the section
-        for item_name in item_names:
-            # Find the item in palette_data
-            for idx, item in enumerate(self.palette_data):
-                if list(item.keys())[0] == item_name:
-                    self.parse_palette_structure(
-                        item, 
-                        str(idx), 
-                        content_frame,
-                        level=0,
-                        group_name='Other'
-                    )
-                    break
-    
-    def parse_palette_structure(self, data: Any, path: str, parent_frame: ttk.Frame, level: int = 0, group_name: str = None):
-        """Recursively parse the palette structure and create widgets"""
-        if isinstance(data, list):
-            for i, item in enumerate(data):
-                new_path = f"{path}.{i}" if path else str(i)
-                self.parse_palette_structure(item, new_path, parent_frame, level, group_name)
-        
-        elif isinstance(data, dict):
-            # Check if this dict has position and color info
-            has_position = all(k in data for k in ["Start X", "Start Y", "Width", "Height"])
-            
-            if has_position:
-                # This is a color region
-                region_name = path.split('.')[-1] if '.' in path else path
-                
-                # Get the region name from the parent key
-                parts = path.split('.')
-                if len(parts) >= 2:
-                    # Get actual region name from data structure
-                    region_name = self.get_region_name_from_path(parts)
-                
-                # Create a color entry if it has a Color field
-                if "Color" in data:
-                    x = int(data["Start X"])
-                    y = int(data["Start Y"])
-                    w = int(data["Width"])
-                    h = int(data["Height"])
-                    color = data.get("Color", "#000000")
-                    if not color:
-                        color = "#000000"
-                    
-                    entry = ColorEntry(region_name, x, y, w, h, color)
-                    self.color_entries[path] = entry
-                    
-                    # Create UI widget
-                    self.create_color_picker_widget(parent_frame, region_name, path, color, level)
+    
+    @traced("editor.create_color_entries")
+    def create_color_entries(self, rows: List[int]):
+        """Create color entries for rows of the region table"""
+        table = self.region_table
+        xs, ys = table.x.tolist(), table.y.tolist()
+        widths, heights = table.width.tolist(), table.height.tolist()
+        
+        for row in rows:
+            node = table.nodes[row]
+            color = node.get("Color", "#000000")
+            if not color:
+                color = "#000000"
             
-            # Recurse into nested structures
-            for key, value in data.items():
-                if key not in ["Start X", "Start Y", "Width", "Height", "Color"]:
-                    new_path = f"{path}.{key}" if path else key
-                    self.parse_palette_structure(value, new_path, parent_frame, level + 1, group_name)
-    
-    def get_region_name_from_path(self, parts: List[str]) -> str:
-        """Get human-readable region name from path parts"""
-        # Filter out numeric indices and get meaningful names
-        names = [p for p in parts if not p.isdigit()]
-        return " - ".join(names) if names else "Unknown"
-    
-    def create_color_picker_widget(self, parent: ttk.Frame, name: str, path: str, color: str, level: int):
-        """Create a color picker widget for a region"""
-        frame = ttk.Frame(parent)
-        frame.pack(fill=tk.X, padx=(level * 20, 5), pady=2)
+            entry = ColorEntry(table.names[row], xs[row], ys[row], widths[row], heights[row], color, node)
+            self.color_entries[table.paths[row]] = entry
+    
+    def create_picker_row(self, parent: ttk.Frame) -> PickerRow:
+        """Create an unbound color picker row"""
+        row = PickerRow(ttk.Frame(parent))
         
         # Label
-        label = ttk.Label(frame, text=name, width=40, anchor=tk.W)
-        label.pack(side=tk.LEFT, padx=5)
+        row.label = ttk.Label(row.frame, width=40, anchor=tk.W)
+        row.label.pack(side=tk.LEFT, padx=5)
         
         # Color display button
-        color_btn = tk.Button(
-            frame,
-            bg=color,
+        row.button = tk.Button(
+            row.frame,
             width=10,
-            command=lambda: self.choose_color(path, color_btn)
+            command=lambda: self.choose_color(row.path, row.button)
         )
-        color_btn.pack(side=tk.LEFT, padx=5)
+        row.button.pack(side=tk.LEFT, padx=5)
         
         # Color code entry
-        color_entry = ttk.Entry(frame, width=10)
-        color_entry.insert(0, color)
-        color_entry.pack(side=tk.LEFT, padx=5)
+        row.entry = ttk.Entry(row.frame, width=10)
+        row.entry.pack(side=tk.LEFT, padx=5)
         
-        # Bind entry changes
-        color_entry.bind('<Return>', lambda e: self.update_color_from_entry(path, color_entry, color_btn))
-        color_entry.bind('<FocusOut>', lambda e: self.update_color_from_entry(path, color_entry, color_btn))
+        # Bind entry changes to whichever region the row shows at the time
+        def on_entry_change(event):
+            if row.path is not None:
+                self.update_color_from_entry(row.path, row.entry, row.button)
+        
+        row.entry.bind('<Return>', on_entry_change)
+        row.entry.bind('<FocusOut>', on_entry_change)
+        return row
+    
+    def bind_picker_row(self, row: PickerRow, table_row: int, position: int):
+        """Show a region in a picker row at the given list position"""
+        path = self.region_table.paths[table_row]
+        entry = self.color_entries[path]
+        
+        row.path = path
+        row.label.configure(text=entry.name)
+        row.button.configure(bg=entry.color)
+        row.entry.delete(0, tk.END)
+        row.entry.insert(0, entry.color)
+        
+        level = int(self.region_table.level[table_row])
+        row.frame.place(x=level * PICKER_INDENT, y=position * PICKER_ROW_HEIGHT + 2)
         
         # Store references in the color entry
-        self.color_entries[path].widgets = (color_btn, color_entry)
+        entry.widgets = (row.button, row.entry)
     
     def choose_color(self, path: str, button: tk.Button):
         """Open color chooser dialog"""
@@ -587,37 +728,26 @@ class PaletteEditor:
         color = colorchooser.askcolor(title="Choose color", initialcolor=current_color)
         
         if color[1]:  # color[1] is the hex value
-            self.color_entries[path].color = color[1]
             button.configure(bg=color[1])
+            self.commit_colors(self.color_entries[path].name, self.region_colors(path, color[1]))
+    
+    def region_colors(self, path: str, color: str) -> Dict[str, str]:
+        """Get the new colors by path for setting one region to a color"""
+        colors = {path: color}
+        
+        # Auto-calculate shade and highlight if this is a base color (Color 1-5)
+        if any(f"Color {i}" in path for i in range(1, 6)):
+            # Find and update corresponding Shade and Highlight
+            shade_path = f"{path}.Shade"
+            highlight_path = f"{path}.Highlight"
             
-            # Update the hex entry field
-            if self.color_entries[path].widgets:
-                _, text_entry = self.color_entries[path].widgets
-                text_entry.delete(0, tk.END)
-                text_entry.insert(0, color[1])
-            
-            # Auto-calculate shade and highlight if this is a base color (Color 1-5)
-            if any(f"Color {i}" in path for i in range(1, 6)):
-                # Find and update corresponding Shade and Highlight
-                base_path = path
-                shade_path = f"{base_path}.Shade"
-                highlight_path = f"{base_path}.Highlight"
-                
-                updated_paths = []
-                if shade_path in self.color_entries:
-                    shade_color = calculate_shade(color[1])
-                    self.color_entries[shade_path].color = shade_color
-                    updated_paths.append(shade_path)
-                
-                if highlight_path in self.color_entries:
-                    highlight_color = calculate_highlight(color[1])
-                    self.color_entries[highlight_path].color = highlight_color
-                    updated_paths.append(highlight_path)
-                
-                # Update widgets for shade and highlight
-                self.update_color_widgets(updated_paths)
+            if shade_path in self.color_entries:
+                colors[shade_path] = calculate_shade(color)
             
-            self.update_preview()
+            if highlight_path in self.color_entries:
+                colors[highlight_path] = calculate_highlight(color)
+        
+        return colors
     
     def update_color_from_entry(self, path: str, entry: ttk.Entry, button: tk.Button):
         """Update color from manual entry"""
@@ -630,71 +760,83 @@ class PaletteEditor:
         try:
             # Try to use the color
             button.configure(bg=color_value)
-            self.color_entries[path].color = color_value
-            
-            # Auto-calculate shade and highlight if this is a base color (Color 1-5)
-            if any(f"Color {i}" in path for i in range(1, 6)):
-                # Find and update corresponding Shade and Highlight
-                base_path = path
-                shade_path = f"{base_path}.Shade"
-                highlight_path = f"{base_path}.Highlight"
-                
-                updated_paths = []
-                if shade_path in self.color_entries:
-                    shade_color = calculate_shade(color_value)
-                    self.color_entries[shade_path].color = shade_color
-                    updated_paths.append(shade_path)
-                
-                if highlight_path in self.color_entries:
-                    highlight_color = calculate_highlight(color_value)
-                    self.color_entries[highlight_path].color = highlight_color
-                    updated_paths.append(highlight_path)
-                
-                # Update widgets for shade and highlight
-                self.update_color_widgets(updated_paths)
-            
-            self.update_preview()
+            if color_value != self.color_entries[path].color:
+                self.commit_colors(self.color_entries[path].name, self.region_colors(path, color_value))
         except tk.TclError:
             messagebox.showerror("Error", f"Invalid color value: {color_value}")
             entry.delete(0, tk.END)
             entry.insert(0, self.color_entries[path].color)
     
+    def preview_regions(self) -> Tuple[List[Tuple[int, int, int, int, Tuple[int, int, int]]], Dict[str, int]]:
+        """Get the regions in render order and the index of each path among them"""
+        regions = []
+        region_index = {}
+        for path, entry in self.color_entries.items():
+            region_index[path] = len(regions)
+            regions.append((entry.x, entry.y, entry.width, entry.height, hex_to_rgb(entry.color)))
+        return regions, region_index
+    
+    @traced("editor.update_preview")
     def update_preview(self):
         """Generate and display the PNG preview"""
         try:
-            # Create 1024x1024 image
-            img = Image.new('RGB', (1024, 1024), color='black')
-            pixels = img.load()
+            # Fill regions with colors onto an atlas_size x atlas_size image
+            regions, region_index = self.preview_regions()
             
-            # Fill regions with colors
-            for path, entry in self.color_entries.items():
-                # Convert hex to RGB
-                color_hex = entry.color.lstrip('#')
-                r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-                
-                # Fill the region
-                for y in range(entry.y, min(entry.y + entry.height, 1024)):
-                    for x in range(entry.x, min(entry.x + entry.width, 1024)):
-                        pixels[x, y] = (r, g, b)
-            
-            self.preview_image = img
-            
-            # Scale down for display (max 600x600)
-            display_img = img.copy()
-            display_img.thumbnail((600, 600), Image.Resampling.LANCZOS)
-            
-            self.preview_photo = ImageTk.PhotoImage(display_img)
-            
-            # Update canvas
-            self.preview_canvas.delete("all")
-            self.preview_canvas.create_image(300, 300, image=self.preview_photo, anchor=tk.CENTER)
-            
-            self.status_var.set("Preview updated")
+            # Render the full canvas and its display thumbnail in the background
+            self.preview_scheduler.render(regions, self.atlas_size)
+            self.region_index = region_index
+            self.schedule_preview_poll()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate preview: {str(e)}")
+    
+    def refresh_preview(self, paths: List[str]):
+        """Repaint only the preview regions of the given paths"""
+        if any(path not in self.region_index for path in paths):
+            self.update_preview()
+            return
+        
+        try:
+            # Snapshot the new colors; the render happens on the next frame
+            changes = {
+                self.region_index[path]: hex_to_rgb(self.color_entries[path].color)
+                for path in paths
+            }
+            self.preview_scheduler.update(changes)
+            self.schedule_preview_poll()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate preview: {str(e)}")
     
+    def schedule_preview_poll(self):
+        """Check for finished preview renders on the next frame"""
+        if self.preview_poll_pending is None:
+            self.preview_poll_pending = self.root.after(16, self.poll_preview)
+    
+    def poll_preview(self):
+        """Display finished preview renders and keep polling while any are pending"""
+        self.preview_poll_pending = None
+        
+        for result in self.preview_scheduler.results():
+            if result.error is not None:
+                messagebox.showerror("Error", f"Failed to generate preview: {str(result.error)}")
+            elif result.image is not None:
+                self.preview_photo = ImageTk.PhotoImage(result.image)
+                
+                # Update canvas
+                self.preview_canvas.delete("all")
+                self.preview_canvas.create_image(300, 300, image=self.preview_photo, anchor=tk.CENTER)
+            elif self.preview_photo is not None:
+                # Patch only the changed areas of the displayed thumbnail
+                for box, image in result.patches:
+                    patch = ImageTk.PhotoImage(image)
+                    self.root.tk.call(str(self.preview_photo), 'copy', str(patch), '-to', box[0], box[1])
+            self.status_var.set(self.timing_status("Preview updated"))
+        
+        if self.preview_scheduler.busy:
+            self.schedule_preview_poll()
+    
     def import_texture(self):
-        """Import an existing texture PNG and extract dominant colors per region"""
+        """Import an existing texture PNG and extract a color per region"""
         if not self.palette_data:
             messagebox.showerror("Error", "Please load or create a configuration first")
             return
@@ -711,74 +853,94 @@ class PaletteEditor:
             # Load the image
             img = Image.open(filename)
             
-            # Verify it's 1024x1024
-            if img.size != (1024, 1024):
-                messagebox.showwarning("Warning", 
-                    f"Image size is {img.size[0]}x{img.size[1]}. Expected 1024x1024. Results may be inaccurate.")
-            
-            # Convert to RGB if needed
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            pixels = img.load()
-            updated_paths = []
-            
-            # Process each region
-            for path, entry in self.color_entries.items():
-                # Extract colors from this region
-                region_colors = []
-                for y in range(entry.y, min(entry.y + entry.height, img.size[1])):
-                    for x in range(entry.x, min(entry.x + entry.width, img.size[0])):
-                        color = pixels[x, y]
-                        # Convert to hex
-                        hex_color = f"#{color[0]:02x}{color[1]:02x}{color[2]:02x}"
-                        # Exclude black and white
-                        if hex_color not in ["#000000", "#ffffff"]:
-                            region_colors.append(hex_color)
+            with span("editor.import_texture", file=filename):
+                # Convert to RGB if needed
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
                 
-                # Find the dominant color
-                if region_colors:
-                    # Count color occurrences
-                    color_counter = Counter(region_colors)
-                    dominant_color = color_counter.most_common(1)[0][0]
-                    
-                    # Update the entry
-                    entry.color = dominant_color
-                    updated_paths.append(path)
-            
-            # Update all UI widgets
-            self.update_color_widgets(updated_paths)
-            self.update_preview()
+                # Find the color of every region from its non-black, non-white pixels;
+                # textures of another size are sampled at the scaled regions
+                rects = [(entry.x, entry.y, entry.width, entry.height) for entry in self.color_entries.values()]
+                region_colors = extract_region_colors(img, rects, self.import_mode.get(),
+                                                      atlas_size=self.atlas_size)
+                
+                colors = {
+                    path: region_color
+                    for path, region_color in zip(self.color_entries, region_colors)
+                    if region_color
+                }
+                
+                # The whole import is a single undo step
+                self.commit_colors(f"Import {os.path.basename(filename)}", colors)
             
-            self.status_var.set(f"Imported colors from {os.path.basename(filename)}")
+            self.status_var.set(f"Imported colors from {os.path.basename(filename)} "
+                                f"({img.size[0]}x{img.size[1]})")
             messagebox.showinfo("Success", 
-                f"Successfully extracted dominant colors from texture.\n{len(updated_paths)} regions updated.")
+                f"Successfully extracted region colors from texture.\n{len(colors)} regions updated.")
         
         except Exception as e:
             messagebox.showerror("Error", f"Failed to import texture: {str(e)}")
     
-    def export_png(self):
-        """Export the current palette as a PNG file"""
-        if not self.preview_image:
-            self.update_preview()
+    def export_png(self, indexed: bool = False):
+        """Export the current palette as a PNG file
+
+        An indexed export is an 8-bit palette PNG with the same pixels,
+        unless more colors show than a palette PNG holds.
+        """
+        if not self.color_entries:
+            return
         
-        if self.preview_image:
-            filename = filedialog.asksaveasfilename(
-                title="Export PNG",
-                defaultextension=".png",
-                filetypes=[("PNG files", "*.png"), ("All files", "*.*")]
-            )
-            if filename:
-                try:
-                    self.preview_image.save(filename, 'PNG')
-                    self.status_var.set(f"Exported: {os.path.basename(filename)}")
-                    messagebox.showinfo("Success", "PNG exported successfully")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to export PNG: {str(e)}")
+        filename = filedialog.asksaveasfilename(
+            title="Export Indexed PNG" if indexed else "Export PNG",
+            defaultextension=".png",
+            filetypes=[("PNG files", "*.png"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        regions, _ = self.preview_regions()
+        level = self.png_level.get()
+        saved_rgb = False
+        
+        def write(path):
+            nonlocal saved_rgb
+            if indexed:
+                saved_rgb = not save_atlas(regions, path, self.atlas_size, indexed=True, compress_level=level)
+                return
+            if not self.region_index:
+                self.update_preview()
+            # The export reads the full-size canvas, so let pending renders finish
+            self.preview_scheduler.wait()
+            self.preview_image = self.preview_scheduler.renderer.image
+            self.preview_image.save(path, 'PNG', compress_level=level)
+        
+        try:
+            with span("editor.export_png"):
+                key = render_key(regions, self.atlas_size, png_format(indexed, level))
+                hit = self.render_cache.output(key, filename, write)
+            if hit:
+                note = " (from render cache)"
+            elif saved_rgb:
+                note = " (too many colors for indexed, saved as RGB)"
+            else:
+                note = ""
+            self.status_var.set(f"Exported: {os.path.basename(filename)}{note}")
+            messagebox.showinfo("Success", "PNG exported successfully")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export PNG: {str(e)}")
 
 
-def main():
+def main(argv=None):
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Character palette editor")
+    parser.add_argument("--trace", nargs="?", const="", metavar="FILE",
+                        help="Record timing spans, and write them as a Chrome trace to FILE on exit")
+    args = parser.parse_args(argv)
+    if args.trace is not None:
+        enable(args.trace or None)
+    else:
+        enable_from_env()
+    
     root = tk.Tk()
     app = PaletteEditor(root)
     
@@ -786,10 +948,10 @@ def main():
     template_path = os.path.join(os.path.dirname(__file__), "SaveCharacterPalette.json")
     if os.path.exists(template_path):
         try:
-            with open(template_path, 'r') as f:
-                app.palette_data = json.load(f)
-            app.load_palette_data()
-            app.status_var.set("Loaded default template")
+            with span("editor.open", file=template_path):
+                app.palette_data, app.region_table = load_palette(template_path)
+                app.load_palette_data()
+            app.status_var.set(app.timing_status("Loaded default template"))
         except:
             pass
     
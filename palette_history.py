@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Palette Edit History
+Undo and redo for color edits, kept as a journal of deltas. Each entry
+records only the regions an edit changed, as (region row, old color, new
+color), so memory grows with the number of changed regions rather than
+with the history length times the layout size. Does not import tkinter.
+"""
+
+from array import array
+from collections import namedtuple
+from typing import Iterable, List, Optional, Tuple
+
+
+# Default number of transactions kept for undo
+HISTORY_LIMIT = 500
+
+# One undoable edit
+#   label:   description shown in the status bar
+#   regions: region table rows changed by the edit
+#   old:     color of each region before the edit
+#   new:     color of each region after the edit
+Transaction = namedtuple('Transaction', ['label', 'regions', 'old', 'new'])
+
+
+class EditHistory:
+    """Undo and redo stacks of color edit transactions
+
+    ``record`` takes the (row, old color, new color) changes of one edit;
+    ``undo`` and ``redo`` return the transaction to apply, whose ``new``
+    colors are the ones to set.
+    """
+
+    def __init__(self, limit: int = HISTORY_LIMIT):
+        self.limit = limit
+        self._undo: List[Transaction] = []
+        self._redo: List[Transaction] = []
+
+    def record(self, label: str, changes: Iterable[Tuple[int, str, str]]) -> bool:
+        """Record one edit as a transaction and clear the redo stack
+
+        Changes that keep a region's color are dropped; an edit that
+        changes nothing is not recorded. Returns whether it was recorded.
+        """
+        regions, old, new = array('i'), [], []
+        for row, old_color, new_color in changes:
+            if old_color != new_color:
+                regions.append(row)
+                old.append(old_color)
+                new.append(new_color)
+        if not regions:
+            return False
+
+        self._undo.append(Transaction(label, regions, old, new))
+        if len(self._undo) > self.limit:
+            del self._undo[0]
+        self._redo.clear()
+        return True
+
+    def undo(self) -> Optional[Transaction]:
+        """Take the newest edit and return its inverse, or None if there is nothing to undo"""
+        if not self._undo:
+            return None
+        transaction = self._undo.pop()
+        self._redo.append(transaction)
+        return transaction._replace(old=transaction.new, new=transaction.old)
+
+    def redo(self) -> Optional[Transaction]:
+        """Take the newest undone edit and return it, or None if there is nothing to redo"""
+        if not self._redo:
+            return None
+        transaction = self._redo.pop()
+        self._undo.append(transaction)
+        return transaction
+
+    def clear(self):
+        """Forget every edit"""
+        self._undo.clear()
+        self._redo.clear()
+
+    @property
+    def can_undo(self) -> bool:
+        """Whether there is an edit to undo"""
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        """Whether there is an undone edit to redo"""
+        return bool(self._redo)
+
+    @property
+    def cells(self) -> int:
+        """Number of region changes held by both stacks"""
+        return sum(len(t.regions) for t in self._undo) + sum(len(t.regions) for t in self._redo)
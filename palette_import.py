@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Palette Texture Import
+Extracts the color of every palette region from a texture in a single
+vectorized pass over the image.
+
+The layout's region rectangles are split along all of their edges into
+elementary cells, each covered by a fixed set of regions. A label map
+assigns every pixel to its cell, so the image is counted once per
+(cell, color) pair and each region's counts are summed from its cells,
+even where regions are nested inside each other.
+
+Besides the most common exact color, regions can take their mean color,
+computed from summed-area tables in constant time per region, a trimmed
+mean that ignores outlying pixels, or the most common color after
+grouping similar colors, for textures with compression noise or dithering.
+"""
+
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+
+from palette_trace import traced
+
+
+# Packed RGB values excluded from color extraction
+EXCLUDED_COLORS = (0x000000, 0xffffff)
+
+# Extraction modes, by name
+MODE_DOMINANT = "dominant"    # Most common exact color
+MODE_MEAN = "mean"            # Mean color
+MODE_TRIMMED = "trimmed"      # Mean of each channel without its extremes
+MODE_QUANTIZED = "quantized"  # Most common color, grouping colors within a tolerance
+IMPORT_MODES = [MODE_DOMINANT, MODE_MEAN, MODE_TRIMMED, MODE_QUANTIZED]
+
+# Fraction of pixels dropped at each end of every channel by the trimmed mean
+DEFAULT_TRIM = 0.1
+
+# Width of the per-channel buckets that the quantized mode groups colors into
+DEFAULT_TOLERANCE = 16
+
+# Images with more pixels than this are processed in bands of rows, which
+# bounds the per-pixel working arrays of every mode
+BAND_PIXELS = 1 << 20
+
+# A region rectangle: (x, y, width, height)
+Rect = Tuple[int, int, int, int]
+
+
+class LabelMap:
+    """Elementary-cell decomposition of a layout for one image size"""
+
+    def __init__(self, rects: Sequence[Rect], width: int, height: int):
+        self.width = width
+        self.height = height
+
+        # Clip every rectangle to the image, as the per-pixel scan did
+        clipped = np.array(
+            [(min(max(x, 0), width), min(max(y, 0), height),
+              min(max(x + w, 0), width), min(max(y + h, 0), height))
+             for x, y, w, h in rects],
+            dtype=np.int64
+        ).reshape(-1, 4)
+
+        # Cell boundaries along each axis
+        xs = np.unique(np.concatenate(([0, width], clipped[:, 0], clipped[:, 2])))
+        ys = np.unique(np.concatenate(([0, height], clipped[:, 1], clipped[:, 3])))
+        self.columns = len(xs) - 1
+        self.rows = len(ys) - 1
+
+        # Per-pixel cell label
+        col_cells = np.searchsorted(xs, np.arange(width), side='right') - 1
+        row_cells = np.searchsorted(ys, np.arange(height), side='right') - 1
+        self.labels = (row_cells[:, None] * self.columns + col_cells[None, :]).ravel()
+
+        # Each region covers a block of cells: (col0, row0, col1, row1)
+        self.blocks = np.stack([
+            np.searchsorted(xs, clipped[:, 0]),
+            np.searchsorted(ys, clipped[:, 1]),
+            np.searchsorted(xs, clipped[:, 2]),
+            np.searchsorted(ys, clipped[:, 3]),
+        ], axis=1)
+
+    def region_cells(self, index: int) -> np.ndarray:
+        """Return the cell labels covered by a region"""
+        col0, row0, col1, row1 = self.blocks[index]
+        return np.add.outer(np.arange(row0, row1) * self.columns, np.arange(col0, col1)).ravel()
+
+
+@lru_cache(maxsize=8)
+def build_label_map(rects: Tuple[Rect, ...], width: int, height: int) -> LabelMap:
+    """Build (or reuse) the label map of a layout for an image size"""
+    return LabelMap(rects, width, height)
+
+
+def pack_rgb(pixels: np.ndarray) -> np.ndarray:
+    """Pack an (..., 3) uint8 array into 0xRRGGBB integers"""
+    pixels = pixels.astype(np.int64)
+    return (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+
+
+def format_color(rgb: Sequence[int]) -> str:
+    """Format an (r, g, b) triple as '#rrggbb'"""
+    return f"#{int(rgb[0]):02x}{int(rgb[1]):02x}{int(rgb[2]):02x}"
+
+
+def rounded_mean(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Divide integer sums by positive counts, rounding halves up"""
+    return (2 * sums + counts) // (2 * counts)
+
+
+def clip_rects(rects: Sequence[Rect], width: int, height: int) -> np.ndarray:
+    """Clip rectangles to an image as (x0, y0, x1, y1) rows"""
+    return np.array(
+        [(min(max(x, 0), width), min(max(y, 0), height),
+          min(max(x + w, 0), width), min(max(y + h, 0), height))
+         for x, y, w, h in rects],
+        dtype=np.int64
+    ).reshape(-1, 4)
+
+
+def scale_rects(rects: Sequence[Rect], atlas_size: int, width: int, height: int) -> List[Rect]:
+    """Map rectangles from an atlas_size x atlas_size layout onto a width x height image
+
+    Edges are scaled and rounded down, so rectangles that share an edge in
+    the layout still share one in the image; a rectangle never shrinks to
+    nothing.
+    """
+    scaled = []
+    for x, y, w, h in rects:
+        x0, y0 = x * width // atlas_size, y * height // atlas_size
+        x1, y1 = (x + w) * width // atlas_size, (y + h) * height // atlas_size
+        if w > 0:
+            x1 = max(x1, x0 + 1)
+        if h > 0:
+            y1 = max(y1, y0 + 1)
+        scaled.append((x0, y0, x1 - x0, y1 - y0))
+    return scaled
+
+
+def texture_bands(img: Image.Image, band_pixels: Optional[int] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (top row, pixel array) bands of an RGB image, top to bottom
+
+    Images up to band_pixels (default BAND_PIXELS) are yielded whole.
+    """
+    width, height = img.size
+    rows = max(1, (band_pixels or BAND_PIXELS) // max(width, 1))
+    if rows >= height:
+        yield 0, np.asarray(img)
+        return
+    for top in range(0, height, rows):
+        yield top, np.asarray(img.crop((0, top, width, min(top + rows, height))))
+
+
+def shift_rects(rects: Sequence[Rect], top: int) -> List[Rect]:
+    """Move rectangles into the coordinates of a band starting at row top"""
+    if top == 0:
+        return list(rects)
+    return [(x, y - top, w, h) for x, y, w, h in rects]
+
+
+def check_import_options(trim: float, tolerance: int):
+    """Raise ValueError for a trim or tolerance the import modes cannot use
+
+    ``trim`` must drop less than half of each channel, and ``tolerance``
+    is a bucket width of at least one channel step.
+    """
+    if not 0 <= trim < 0.5:
+        raise ValueError(f"Trim must be at least 0 and below 0.5, got {trim}")
+    if tolerance < 1:
+        raise ValueError(f"Tolerance must be at least 1, got {tolerance}")
+
+
+@traced("extract_region_colors")
+def extract_region_colors(img: Image.Image, rects: Sequence[Rect], mode: str = MODE_DOMINANT,
+                          trim: float = DEFAULT_TRIM, tolerance: int = DEFAULT_TOLERANCE,
+                          atlas_size: int = 0) -> List[Optional[str]]:
+    """Find the color of each region with one of the IMPORT_MODES
+
+    ``rects`` are in the coordinates of an atlas_size x atlas_size layout;
+    when the image has another size, each rectangle is mapped onto the
+    image and its pixels are sampled there, without resampling the image.
+    Black and white pixels are ignored in every mode. Returns one '#rrggbb'
+    string per rectangle, or None for regions with no usable pixels.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    check_import_options(trim, tolerance)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if atlas_size and img.size != (atlas_size, atlas_size):
+        rects = scale_rects(rects, atlas_size, *img.size)
+
+    if mode == MODE_DOMINANT:
+        return extract_dominant_colors(img, rects)
+    if mode == MODE_MEAN:
+        return extract_mean_colors(img, rects)
+    if mode == MODE_TRIMMED:
+        return extract_trimmed_colors(img, rects, trim)
+    return extract_dominant_colors(img, rects, tolerance)
+
+
+def extract_mean_colors(img: Image.Image, rects: Sequence[Rect]) -> List[Optional[str]]:
+    """Find the mean non-black, non-white color of each region
+
+    Builds one summed-area table per channel (and one for the pixel count),
+    after which each region's sums take four lookups however large it is.
+    Large images are summed band by band.
+    """
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    width = img.width
+    sums = np.zeros((len(rects), 4), dtype=np.int64)
+
+    for top, pixels in texture_bands(img):
+        height = pixels.shape[0]
+        usable = ~np.isin(pack_rgb(pixels), EXCLUDED_COLORS)
+        x0, y0, x1, y1 = clip_rects(shift_rects(rects, top), width, height).T
+
+        # One table at a time keeps memory at a single (height+1, width+1)
+        # array, of 32-bit sums when a whole channel cannot overflow them
+        dtype = np.int32 if 255 * width * height < 2 ** 31 else np.int64
+        table = np.zeros((height + 1, width + 1), dtype=dtype)
+        for channel in range(4):
+            values = usable if channel == 3 else np.where(usable, pixels[..., channel], 0)
+            np.cumsum(values, axis=0, dtype=dtype, out=table[1:, 1:])
+            np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+            sums[:, channel] += table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+
+    counts = sums[:, 3]
+    means = rounded_mean(sums[:, :3], np.maximum(counts, 1)[:, None])
+    return [format_color(mean) if count else None for mean, count in zip(means.tolist(), counts.tolist())]
+
+
+def extract_trimmed_colors(img: Image.Image, rects: Sequence[Rect], trim: float = DEFAULT_TRIM) -> List[Optional[str]]:
+    """Find the trimmed mean non-black, non-white color of each region
+
+    Each channel drops the ``trim`` fraction of its lowest and highest
+    values before averaging, so stray pixels do not pull the color. The
+    means are taken from per-region channel histograms, which add up
+    across bands of large images.
+    """
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    width = img.width
+    histograms = np.zeros((len(rects), 3, 256), dtype=np.int64)
+
+    for top, pixels in texture_bands(img):
+        usable = ~np.isin(pack_rgb(pixels), EXCLUDED_COLORS)
+        for index, (x0, y0, x1, y1) in enumerate(
+                clip_rects(shift_rects(rects, top), width, pixels.shape[0]).tolist()):
+            if x1 <= x0 or y1 <= y0:
+                continue
+            block = pixels[y0:y1, x0:x1][usable[y0:y1, x0:x1]]
+            for channel in range(3):
+                histograms[index, channel] += np.bincount(block[:, channel], minlength=256)
+
+    # Keep the values ranked [cut, count - cut) in each channel
+    counts = histograms[:, 0].sum(axis=1)
+    cuts = np.minimum((counts * trim).astype(np.int64), (counts - 1) // 2)
+    ranks_end = np.cumsum(histograms, axis=2)
+    ranks_start = ranks_end - histograms
+    kept = (np.minimum(ranks_end, (counts - cuts)[:, None, None])
+            - np.maximum(ranks_start, cuts[:, None, None])).clip(min=0)
+    sums = (kept * np.arange(256)).sum(axis=2)
+    means = rounded_mean(sums, np.maximum(counts - 2 * cuts, 1)[:, None])
+    return [format_color(mean) if count else None for mean, count in zip(means.tolist(), counts.tolist())]
+
+
+def merge_color_counts(colors: np.ndarray, totals: np.ndarray, firsts: np.ndarray,
+                       sums: Optional[np.ndarray]) -> Tuple[np.ndarray, ...]:
+    """Combine the counts of colors listed more than once"""
+    colors, merged = np.unique(colors, return_inverse=True)
+    merged_totals = np.bincount(merged, weights=totals).astype(np.int64)
+    merged_firsts = np.full(len(colors), np.iinfo(np.int64).max)
+    np.minimum.at(merged_firsts, merged, firsts)
+    if sums is not None:
+        sums = np.stack([np.bincount(merged, weights=sums[:, c], minlength=len(colors))
+                         for c in range(3)], axis=1).astype(np.int64)
+    return colors, merged_totals, merged_firsts, sums
+
+
+def extract_dominant_colors(img: Image.Image, rects: Sequence[Rect], tolerance: int = 1) -> List[Optional[str]]:
+    """Find the most common non-black, non-white color of each region
+
+    Returns one '#rrggbb' string per rectangle, or None for regions with no
+    usable pixels. Ties go to the color seen first in row-major order, the
+    same as counting the region's pixels with collections.Counter.
+
+    With a ``tolerance`` above 1, colors whose channels fall in the same
+    tolerance-wide buckets count as one, and a region gets the mean of its
+    pixels in the most common bucket. Large images are counted band by
+    band, and each region's counts merged at the end.
+    """
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    width = img.width
+
+    # (colors, totals, first positions, channel sums) of each region, per band
+    tables: List[List[Tuple[np.ndarray, ...]]] = [[] for _ in rects]
+    for top, pixels in texture_bands(img):
+        if pixels.shape[0] == img.height:
+            label_map = build_label_map(tuple(tuple(rect) for rect in rects), width, img.height)
+        else:
+            # Band label maps are only used once, so they are not cached
+            label_map = LabelMap(shift_rects(rects, top), width, pixels.shape[0])
+
+        # One pass: count every (cell, color) pair and remember where it first appears
+        packed = pack_rgb(pixels).ravel()
+        usable = ~np.isin(packed, EXCLUDED_COLORS)
+        positions = np.flatnonzero(usable)
+        colors = packed[positions]
+        if tolerance > 1:
+            colors = pack_rgb(pixels.reshape(-1, 3)[positions] // tolerance)
+        keys = (label_map.labels[positions] << 24) | colors
+        keys, first_index, inverse, counts = np.unique(keys, return_index=True, return_inverse=True,
+                                                       return_counts=True)
+        first_seen = positions[first_index] + top * width
+        key_cells = keys >> 24
+        key_colors = keys & 0xffffff
+
+        # Channel sums of the pixels behind each (cell, bucket) pair
+        key_sums = None
+        if tolerance > 1:
+            channels = pixels.reshape(-1, 3)[positions]
+            key_sums = np.stack([np.bincount(inverse, weights=channels[:, c], minlength=len(keys))
+                                 for c in range(3)], axis=1).astype(np.int64)
+
+        # Rows of the (cell, color) table belonging to each cell
+        cell_starts = np.searchsorted(key_cells, np.arange(label_map.columns * label_map.rows + 1))
+
+        for index in range(len(rects)):
+            cells = label_map.region_cells(index)
+            if len(cells) == 0:
+                continue
+            rows = np.concatenate([np.arange(cell_starts[c], cell_starts[c + 1]) for c in cells])
+            if len(rows) == 0:
+                continue
+            table = (key_colors[rows], counts[rows], first_seen[rows],
+                     None if key_sums is None else key_sums[rows])
+            if len(cells) > 1:
+                # Merge the counts of colors that appear in several cells
+                table = merge_color_counts(*table)
+            tables[index].append(table)
+
+    results = []
+    for region_tables in tables:
+        if not region_tables:
+            results.append(None)
+            continue
+        if len(region_tables) == 1:
+            colors, totals, firsts, sums = region_tables[0]
+        else:
+            colors, totals, firsts, sums = merge_color_counts(
+                *(None if parts[0] is None else np.concatenate(parts) for parts in zip(*region_tables)))
+
+        # Highest count wins, earliest first occurrence breaks ties
+        best = np.lexsort((firsts, -totals))[0]
+        if sums is None:
+            results.append(f"#{int(colors[best]):06x}")
+        else:
+            results.append(format_color(rounded_mean(sums[best], totals[best])))
+
+    return results
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+Palette Layout
+Headless helpers for walking the SaveCharacterPalette.json structure.
+These follow the same rules as the palette editor so that GUI and
+command-line tools see the same regions in the same order.
+
+A layout is compiled once into a flat RegionTable (one array per column)
+and cached on disk as a binary file keyed by a hash of the layout, so later
+loads only need json.loads and never walk the tree in Python.
+
+Palettes can also be saved as sparse colors-only files that store just the
+set colors and the fingerprint of their layout; the layout itself is kept
+once in a shared layout store.
+"""
+
+import collections
+import copy
+import hashlib
+import json
+import os
+import re
+import stat
+import struct
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+from palette_trace import traced
+
+
+# Define color groups
+CLOTHING_GROUP = [
+    'Torso', 'Arm Attire Left', 'Arm Attire Right',
+    'Hand Attire Left', 'Hand Attire Right', 'Hips',
+    'Leg Left', 'Leg Right', 'Foot Left', 'Foot Right'
+]
+
+ATTACHMENTS_GROUP = [
+    'Shoulder Attire Left', 'Shoulder Attire Right',
+    'Elbow Attire Left', 'Elbow Attire Right',
+    'Knee Attire Left', 'Knee Attire Right',
+    'Hip Front Attachment', 'Hip Left Attachment',
+    'Hip Right Attachment', 'Hip Back Attachment',
+    'Head Attachment', 'Face Attachment', 'Back Attachment'
+]
+
+# Editor sections, in display order
+GROUP_NAMES = ["Clothing", "Attachments", "Other"]
+
+# Keys that describe a region rather than nested structure
+POSITION_KEYS = ["Start X", "Start Y", "Width", "Height"]
+REGION_KEYS = POSITION_KEYS + ["Color"]
+
+
+def get_item_name(item: Dict[str, Any]) -> str:
+    """Get the name of a top-level palette item"""
+    return list(item.keys())[0]
+
+
+def find_item_indices(palette_data: List[Dict[str, Any]], item_names: List[str]) -> Iterator[int]:
+    """Yield the index of the first palette item with each of the given names"""
+    first_index = {}
+    for idx, item in enumerate(palette_data):
+        first_index.setdefault(get_item_name(item), idx)
+
+    for item_name in item_names:
+        if item_name in first_index:
+            yield first_index[item_name]
+
+
+def get_item_groups(palette_data: List[Dict[str, Any]]) -> List[Tuple[str, List[str]]]:
+    """Get (group name, item names) for each section, in editor order"""
+    other_items = []
+    for item in palette_data:
+        item_name = get_item_name(item)
+        if item_name not in CLOTHING_GROUP and item_name not in ATTACHMENTS_GROUP:
+            other_items.append(item_name)
+
+    return list(zip(GROUP_NAMES, [CLOTHING_GROUP, ATTACHMENTS_GROUP, other_items]))
+
+
+def get_region_name_from_path(parts: List[str]) -> str:
+    """Get human-readable region name from path parts"""
+    # Filter out numeric indices and get meaningful names
+    names = [p for p in parts if not p.isdigit()]
+    return " - ".join(names) if names else "Unknown"
+
+
+def iter_color_regions(data: Any, path: str = "", level: int = 0) -> Iterator[Tuple[str, str, int, Dict[str, Any]]]:
+    """Recursively walk the palette structure
+
+    Yields (path, region name, nesting level, node) for every dict that has
+    a position and a Color field, parents before their children.
+    """
+    if isinstance(data, list):
+        for i, item in enumerate(data):
+            new_path = f"{path}.{i}" if path else str(i)
+            yield from iter_color_regions(item, new_path, level)
+
+    elif isinstance(data, dict):
+        # Check if this dict has position and color info
+        if all(k in data for k in POSITION_KEYS) and "Color" in data:
+            parts = path.split('.')
+            region_name = get_region_name_from_path(parts) if len(parts) >= 2 else path
+            yield path, region_name, level, data
+
+        # Recurse into nested structures
+        for key, value in data.items():
+            if key not in REGION_KEYS:
+                new_path = f"{path}.{key}" if path else key
+                yield from iter_color_regions(value, new_path, level + 1)
+
+
+# Region kinds
+KIND_BASE = 0
+KIND_SHADE = 1
+KIND_HIGHLIGHT = 2
+KIND_NAMES = {"Shade": KIND_SHADE, "Highlight": KIND_HIGHLIGHT}
+
+# Packed color values that are not an RGB color
+UNSET_COLOR = -1    # Empty "Color" field
+INVALID_COLOR = -2  # Color string that is not a #rrggbb hex code
+
+# Binary layout cache format
+CACHE_MAGIC = b'PLTB'
+CACHE_VERSION = 1
+CACHE_EXTENSION = '.layout'
+
+# Array columns stored in the binary cache, in file order
+LAYOUT_COLUMNS = [
+    ('item', np.int32), ('group', np.int8), ('level', np.int16),
+    ('x', np.int32), ('y', np.int32), ('width', np.int32), ('height', np.int32),
+    ('parent', np.int32), ('kind', np.int8), ('node_slot', np.int32),
+]
+
+# Sparse colors-only palette files
+SPARSE_FORMAT = "palette-colors"
+SPARSE_VERSION = 1
+SPARSE_EXTENSION = '.palette'
+
+# Layout that sparse files fall back to when the layout store has no copy
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SaveCharacterPalette.json")
+
+# Matches a "Color" string value, for hashing the layout without the colors
+COLOR_VALUE_RE = re.compile(r'("Color"\s*:\s*)"(?:[^"\\]|\\.)*"')
+
+# Layouts already compiled or loaded by this process, keyed by layout key and
+# kept in least recently used order; long-running processes such as the
+# render server can see any number of layouts and formattings of them
+LAYOUT_MEMO_ENTRIES = 16
+_layout_memo: 'collections.OrderedDict[str, RegionTable]' = collections.OrderedDict()
+
+
+def pack_color(color_hex: str) -> int:
+    """Pack a hex color string into a 0xRRGGBB integer
+
+    Returns UNSET_COLOR for an empty string and INVALID_COLOR for anything
+    the renderer cannot parse.
+    """
+    if not color_hex:
+        return UNSET_COLOR
+    color_hex = color_hex.lstrip('#')
+    try:
+        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
+    except (ValueError, TypeError, AttributeError):
+        return INVALID_COLOR
+    return (r << 16) | (g << 8) | b
+
+
+class RegionTable:
+    """Flat struct-of-arrays table of the color regions of a palette
+
+    Row i describes the i-th region in editor order. Layout columns are
+    numpy arrays (plus the ``paths`` and ``names`` lists) and are shared
+    between palettes with the same layout. ``color`` holds the packed RGB
+    value of each region and ``nodes`` the dict each row was read from.
+    """
+
+    def __init__(self, fingerprint: str, paths: List[str], names: List[str],
+                 columns: Dict[str, np.ndarray], node_count: int):
+        self.fingerprint = fingerprint
+        self.paths = paths
+        self.names = names
+        self.node_count = node_count
+        self.item = columns['item']
+        self.group = columns['group']
+        self.level = columns['level']
+        self.x = columns['x']
+        self.y = columns['y']
+        self.width = columns['width']
+        self.height = columns['height']
+        self.parent = columns['parent']
+        self.kind = columns['kind']
+        self.node_slot = columns['node_slot']
+        self.color = np.full(len(paths), UNSET_COLOR, dtype=np.int32)
+        self.nodes: Optional[List[Dict[str, Any]]] = None
+        # Built on first use; shared by every copy made with with_nodes()
+        self._color_index: Dict[Tuple[str, str], List[List[int]]] = {}
+        self._path_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Get the layout columns by name"""
+        return {name: getattr(self, name) for name, _ in LAYOUT_COLUMNS}
+
+    def with_nodes(self, nodes: List[Dict[str, Any]]) -> 'RegionTable':
+        """Return a copy of the layout bound to one palette's region nodes
+
+        ``nodes`` lists every dict with a "Color" key in the order json
+        finishes decoding them; each row picks its node by ``node_slot``.
+        """
+        table = copy.copy(self)
+        table.nodes = [nodes[slot] for slot in self.node_slot]
+        table.color = np.array([pack_color(node["Color"]) for node in table.nodes], dtype=np.int32)
+        return table
+
+    def group_rows(self) -> List[Tuple[str, List[int]]]:
+        """Get (group name, row indices) for each editor section"""
+        return [(name, np.flatnonzero(self.group == i).tolist()) for i, name in enumerate(GROUP_NAMES)]
+
+    def color_index(self) -> Dict[Tuple[str, str], List[List[int]]]:
+        """Map (group name, color id) to the rows of that color in every item
+
+        Each value lists row indices by kind, so ``index[key][KIND_SHADE]``
+        holds the Shade rows of e.g. ("Clothing", "Color 1") across all the
+        group's items. Matching is on exact path components, so "Color 1"
+        never picks up "Color 10".
+        """
+        if not self._color_index:
+            for row, path in enumerate(self.paths):
+                parts = path.split('.')
+                if len(parts) < 3:
+                    continue
+                key = (GROUP_NAMES[self.group[row]], parts[2])
+                rows = self._color_index.setdefault(key, [[] for _ in range(len(KIND_NAMES) + 1)])
+                rows[self.kind[row]].append(row)
+        return self._color_index
+
+    def path_index(self) -> Dict[str, int]:
+        """Map each region path to its row"""
+        if not self._path_index:
+            self._path_index.update((path, row) for row, path in enumerate(self.paths))
+        return self._path_index
+
+
+def clear_layout_memo():
+    """Forget the layouts compiled or loaded by this process"""
+    _layout_memo.clear()
+
+
+def remember_layout(key: str, layout: 'RegionTable'):
+    """Add a layout to the memo, forgetting the least recently used beyond LAYOUT_MEMO_ENTRIES"""
+    _layout_memo[key] = layout
+    _layout_memo.move_to_end(key)
+    while len(_layout_memo) > LAYOUT_MEMO_ENTRIES:
+        _layout_memo.popitem(last=False)
+
+
+def layout_key(text: str) -> str:
+    """Hash a palette file's text with all color values blanked out"""
+    blanked = COLOR_VALUE_RE.sub(r'\1""', text)
+    return hashlib.sha256(blanked.encode('utf-8')).hexdigest()
+
+
+@traced("compile_layout")
+def compile_layout(palette_data: List[Dict[str, Any]]) -> RegionTable:
+    """Walk a palette structure once and compile it into a RegionTable
+
+    The returned table is bound to the nodes of ``palette_data``.
+    """
+    rows = {}  # Maps path -> row index
+    paths, names, nodes = [], [], []
+    columns = {name: [] for name, _ in LAYOUT_COLUMNS}
+
+    for group_index, (_, item_names) in enumerate(get_item_groups(palette_data)):
+        for idx in find_item_indices(palette_data, item_names):
+            for path, region_name, level, node in iter_color_regions(palette_data[idx], str(idx)):
+                if path in rows:
+                    continue
+                rows[path] = len(paths)
+
+                # The parent is the nearest enclosing region
+                parent_path = path.rsplit('.', 1)[0]
+                while parent_path not in rows and '.' in parent_path:
+                    parent_path = parent_path.rsplit('.', 1)[0]
+
+                paths.append(path)
+                names.append(region_name)
+                nodes.append(node)
+                columns['item'].append(idx)
+                columns['group'].append(group_index)
+                columns['level'].append(level)
+                columns['x'].append(int(node["Start X"]))
+                columns['y'].append(int(node["Start Y"]))
+                columns['width'].append(int(node["Width"]))
+                columns['height'].append(int(node["Height"]))
+                columns['parent'].append(rows.get(parent_path, -1))
+                columns['kind'].append(KIND_NAMES.get(path.rsplit('.', 1)[-1], KIND_BASE))
+
+    # Every dict with a "Color" key, in the order json.loads finishes them
+    # (children before parents), so later loads can find nodes without a walk
+    color_nodes = []
+
+    def collect(data):
+        if isinstance(data, list):
+            for item in data:
+                collect(item)
+        elif isinstance(data, dict):
+            for value in data.values():
+                collect(value)
+            if "Color" in data:
+                color_nodes.append(data)
+
+    collect(palette_data)
+    slot_of = {id(node): slot for slot, node in enumerate(color_nodes)}
+    columns['node_slot'] = [slot_of[id(node)] for node in nodes]
+
+    arrays = {name: np.array(columns[name], dtype=dtype) for name, dtype in LAYOUT_COLUMNS}
+    fingerprint = layout_fingerprint(paths, arrays)
+    table = RegionTable(fingerprint, paths, names, arrays, len(color_nodes))
+    return table.with_nodes(color_nodes)
+
+
+def layout_fingerprint(paths: List[str], columns: Dict[str, np.ndarray]) -> str:
+    """Hash the structure of a layout (paths and geometry, not colors)"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(paths).encode('utf-8'))
+    for name in ('x', 'y', 'width', 'height', 'parent', 'kind'):
+        digest.update(columns[name].astype('<i4').tobytes())
+    return digest.hexdigest()
+
+
+def default_cache_dir() -> str:
+    """Get the directory for binary layout caches"""
+    return os.environ.get('PALETTE_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'palette_editor')
+
+
+# Process umask, read once at import: os.umask can only be read by setting
+# it, which would race with files created on other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def file_mode(path: str) -> int:
+    """Get the permission bits a rewrite of path should keep
+
+    An existing file keeps its own mode; a new one gets the mode a plain
+    open() would give it under the current umask.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write(path: str, data: bytes):
+    """Write a file through a temporary file and a rename, so readers never see half of it
+
+    The data is flushed to disk before the rename, and the file keeps the
+    permissions of the file it replaces.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    mode = file_mode(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_layout_cache(table: RegionTable, path: str):
+    """Write the layout columns of a table to a binary cache file"""
+    header = json.dumps({
+        'fingerprint': table.fingerprint,
+        'paths': table.paths,
+        'names': table.names,
+        'node_count': table.node_count,
+    }).encode('utf-8')
+
+    parts = [struct.pack('<4sHI', CACHE_MAGIC, CACHE_VERSION, len(header)), header]
+    for name, dtype in LAYOUT_COLUMNS:
+        parts.append(getattr(table, name).astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+    atomic_write(path, b''.join(parts))
+
+
+def read_layout_cache(path: str) -> RegionTable:
+    """Read a binary layout cache file written by write_layout_cache"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, header_len = struct.unpack_from('<4sHI', data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        raise ValueError(f"Unsupported layout cache: {path}")
+    offset = struct.calcsize('<4sHI')
+    header = json.loads(data[offset:offset + header_len].decode('utf-8'))
+    offset += header_len
+
+    count = len(header['paths'])
+    columns = {}
+    for name, dtype in LAYOUT_COLUMNS:
+        column = np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder('<'), count=count, offset=offset)
+        columns[name] = column.astype(dtype)
+        offset += column.nbytes
+
+    return RegionTable(header['fingerprint'], header['paths'], header['names'],
+                       columns, header['node_count'])
+
+
+@traced("load_palette")
+def load_palette(filename: str, cache_dir: Optional[str] = None,
+                 use_cache: bool = True) -> Tuple[List[Dict[str, Any]], RegionTable]:
+    """Load a palette file and its compiled region table
+
+    When the layout has been compiled before (in this process or into the
+    binary cache), the file is only decoded by json.loads and the region
+    nodes are collected while decoding; the tree is not walked.
+    """
+    with open(filename, 'r') as f:
+        text = f.read()
+    return parse_palette(text, cache_dir, use_cache)
+
+
+def parse_palette(text: str, cache_dir: Optional[str] = None,
+                  use_cache: bool = True) -> Tuple[List[Dict[str, Any]], RegionTable]:
+    """Decode palette JSON text and get its compiled region table, as load_palette does"""
+    if not use_cache:
+        palette_data = json.loads(text)
+        return palette_data, compile_layout(palette_data)
+
+    key = layout_key(text)
+    cache_path = os.path.join(cache_dir or default_cache_dir(), key + CACHE_EXTENSION)
+
+    layout = _layout_memo.get(key)
+    if layout is None and os.path.exists(cache_path):
+        try:
+            layout = read_layout_cache(cache_path)
+        except (OSError, ValueError, KeyError, struct.error):
+            layout = None
+
+    if layout is not None:
+        color_nodes = []
+
+        def collect(obj):
+            if "Color" in obj:
+                color_nodes.append(obj)
+            return obj
+
+        palette_data = json.loads(text, object_hook=collect)
+        if len(color_nodes) == layout.node_count:
+            remember_layout(key, layout)
+            return palette_data, layout.with_nodes(color_nodes)
+
+    # Cold path: walk the tree once and cache the compiled layout
+    palette_data = json.loads(text)
+    table = compile_layout(palette_data)
+    remember_layout(key, table)
+    try:
+        write_layout_cache(table, cache_path)
+    except OSError:
+        pass  # The cache is only an optimization
+    return palette_data, table
+
+
+def layout_store_dir(cache_dir: Optional[str] = None) -> str:
+    """Get the directory that holds one layout file per fingerprint"""
+    return os.path.join(cache_dir or default_cache_dir(), 'layouts')
+
+
+def store_layout(palette_data: List[Dict[str, Any]], table: RegionTable,
+                 cache_dir: Optional[str] = None) -> str:
+    """Keep a colorless copy of a palette's layout in the layout store
+
+    Returns the path of the stored layout file.
+    """
+    path = os.path.join(layout_store_dir(cache_dir), table.fingerprint + '.json')
+    if not os.path.exists(path):
+        text = COLOR_VALUE_RE.sub(r'\1""', json.dumps(palette_data, indent=2))
+        atomic_write(path, text.encode('utf-8'))
+    return path
+
+
+def find_layout(fingerprint: str, cache_dir: Optional[str] = None,
+                search_paths: Tuple[str, ...] = (TEMPLATE_PATH,)) -> str:
+    """Find a layout file with the given fingerprint
+
+    Looks in the layout store first, then at each file in ``search_paths``.
+    """
+    path = os.path.join(layout_store_dir(cache_dir), fingerprint + '.json')
+    if os.path.exists(path):
+        return path
+
+    for path in search_paths:
+        if os.path.exists(path) and load_palette(path, cache_dir)[1].fingerprint == fingerprint:
+            return path
+
+    raise ValueError(f"No layout found for fingerprint {fingerprint[:12]}")
+
+
+def write_sparse_palette(palette_data: List[Dict[str, Any]], table: RegionTable, path: str,
+                         cache_dir: Optional[str] = None):
+    """Save only the set colors of a palette, keyed to its layout fingerprint
+
+    Colors are read from the table's nodes, so edits written back into
+    ``palette_data`` are included. The layout is added to the layout store.
+    """
+    store_layout(palette_data, table, cache_dir)
+
+    colors = np.array([pack_color(node["Color"]) for node in table.nodes], dtype=np.int32)
+    if (colors == INVALID_COLOR).any():
+        row = int(np.flatnonzero(colors == INVALID_COLOR)[0])
+        raise ValueError(f"Invalid color for region {table.paths[row]}")
+    rows = np.flatnonzero(colors >= 0)
+
+    data = {
+        'format': SPARSE_FORMAT,
+        'version': SPARSE_VERSION,
+        'layout': table.fingerprint,
+        'rows': rows.tolist(),
+        'colors': colors[rows].tolist(),
+    }
+    atomic_write(path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+@traced("read_sparse_palette")
+def read_sparse_palette(path: str, cache_dir: Optional[str] = None,
+                        search_paths: Tuple[str, ...] = (TEMPLATE_PATH,)) -> Tuple[List[Dict[str, Any]], RegionTable]:
+    """Load a sparse colors-only palette onto its layout
+
+    Returns the full palette data and its region table, like load_palette.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('format') != SPARSE_FORMAT or data.get('version') != SPARSE_VERSION:
+        raise ValueError(f"Not a sparse palette file: {path}")
+
+    palette_data, table = load_palette(find_layout(data['layout'], cache_dir, search_paths), cache_dir)
+    if table.fingerprint != data['layout']:
+        raise ValueError(f"Layout does not match the palette: {path}")
+
+    rows, colors = data['rows'], data['colors']
+    if len(rows) != len(colors) or any(not 0 <= row < len(table) for row in rows):
+        raise ValueError(f"Corrupt sparse palette file: {path}")
+    for row, color in zip(rows, colors):
+        table.nodes[row]["Color"] = f"#{color:06x}"
+    table.color[rows] = colors
+    return palette_data, table
+
+
+def load_palette_file(filename: str, cache_dir: Optional[str] = None) -> Tuple[List[Dict[str, Any]], RegionTable]:
+    """Load a full JSON palette or a sparse colors-only palette by its extension"""
+    if filename.endswith(SPARSE_EXTENSION):
+        return read_sparse_palette(filename, cache_dir)
+    return load_palette(filename, cache_dir)
+
+
+@traced("save_palette")
+def save_palette_file(palette_data: List[Dict[str, Any]], table: RegionTable, filename: str,
+                      cache_dir: Optional[str] = None):
+    """Save a palette as sparse colors-only or full JSON by its extension
+
+    The file is replaced atomically, so a failed save leaves the old one intact.
+    """
+    if filename.endswith(SPARSE_EXTENSION):
+        write_sparse_palette(palette_data, table, filename, cache_dir)
+    else:
+        atomic_write(filename, json.dumps(palette_data, indent=2).encode('utf-8'))
+
+
+def save_palette_changes(palette_data: List[Dict[str, Any]], table: RegionTable,
+                         changes: List[Tuple[Dict[str, Any], str]], filename: str,
+                         cache_dir: Optional[str] = None):
+    """Write changed colors into their region nodes, then save the palette
+
+    ``changes`` lists (node, color) pairs. Meant to run on a save worker
+    thread, which then is the only code that modifies the nodes.
+    """
+    for node, color in changes:
+        node["Color"] = color
+    save_palette_file(palette_data, table, filename, cache_dir)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Palette Preview Scheduler
+Renders the editor preview on a background thread. Edits made on the UI
+thread are merged into one pending job, rendered at most once per frame
+against a snapshot of the colors, and handed back as finished images that
+the UI thread only has to display. Does not import tkinter.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from palette_render import CANVAS_SIZE, PreviewCanvas, Region
+from palette_trace import span
+
+
+# Default minimum time between two renders, in seconds
+FRAME_INTERVAL = 1 / 60
+
+# A finished render, ready to be displayed
+#   generation: the newest request included in this result
+#   image:      the whole display image, or None for a partial result
+#   patches:    [(box, image)] display patches for a partial result
+#   error:      the exception raised by the render, if any
+PreviewResult = namedtuple('PreviewResult', ['generation', 'image', 'patches', 'error'])
+
+
+class PreviewScheduler:
+    """Coalesce preview edits and render them on a worker thread
+
+    ``render`` and ``update`` only record the request and return; the
+    worker renders into its own PreviewCanvas, so the canvas must not be
+    touched from other threads except after ``wait``.
+    """
+
+    def __init__(self, renderer: Optional[PreviewCanvas] = None, frame_interval: float = FRAME_INTERVAL):
+        self.renderer = renderer or PreviewCanvas()
+        self.frame_interval = frame_interval
+        self.generation = 0  # Generation of the newest request
+        self.completed = 0  # Generation of the newest finished render
+        self.renders = 0  # Number of renders actually performed
+
+        self._lock = threading.Condition()
+        self._full: Optional[List[Region]] = None  # Pending full render
+        self._size = CANVAS_SIZE  # Canvas size of the pending full render
+        self._changes: Dict[int, Tuple[int, int, int]] = {}  # Pending recolors
+        self._results: List[PreviewResult] = []
+        self._last_render = 0.0
+        self._thread = None
+
+    def render(self, regions: Iterable[Region], size: int = CANVAS_SIZE) -> int:
+        """Request a full render on a size x size canvas; supersedes every pending request"""
+        with self._lock:
+            self._full = list(regions)
+            self._size = size
+            self._changes = {}
+            return self._submit()
+
+    def update(self, changes: Dict[int, Tuple[int, int, int]]) -> int:
+        """Request recolors by region index, merged with pending ones"""
+        with self._lock:
+            self._changes.update(changes)
+            return self._submit()
+
+    @property
+    def busy(self) -> bool:
+        """Whether some request has not been handed back yet"""
+        with self._lock:
+            return self.completed < self.generation or bool(self._results)
+
+    def results(self) -> List[PreviewResult]:
+        """Take the finished renders, oldest first
+
+        Results before the newest full image are stale and are dropped.
+        """
+        with self._lock:
+            results, self._results = self._results, []
+        for i in range(len(results) - 1, -1, -1):
+            if results[i].image is not None:
+                return results[i:]
+        return results
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every request has been rendered"""
+        with self._lock:
+            return self._lock.wait_for(lambda: self.completed >= self.generation, timeout)
+
+    def _submit(self) -> int:
+        """Record a new request and wake the worker (lock held)"""
+        self.generation += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="preview-render", daemon=True)
+            self._thread.start()
+        self._lock.notify_all()
+        return self.generation
+
+    def _run(self):
+        """Worker loop: wait for requests and render them one frame at a time"""
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self.completed < self.generation)
+
+            # Let a burst of edits collect into one render per frame
+            delay = self._last_render + self.frame_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._lock:
+                generation = self.generation
+                full, changes, size = self._full, self._changes, self._size
+                self._full, self._changes = None, {}
+
+            self._last_render = time.perf_counter()
+            if full is not None:
+                self.renderer.size = size
+            with span("preview.render", full=full is not None, changes=len(changes)):
+                result = self._render(generation, full, changes)
+
+            with self._lock:
+                self.renders += 1
+                self.completed = generation
+                self._results.append(result)
+                self._lock.notify_all()
+
+    def _render(self, generation: int, full: Optional[List[Region]],
+                changes: Dict[int, Tuple[int, int, int]]) -> PreviewResult:
+        """Render one snapshot and copy out what the display needs"""
+        renderer = self.renderer
+        try:
+            if full is not None or renderer.image is None:
+                renderer.render(full if full is not None else renderer.regions)
+                if changes:
+                    renderer.update(changes)
+                return PreviewResult(generation, renderer.display_image.copy(), [], None)
+
+            boxes = renderer.update(changes)
+            patches = [(box, renderer.display_image.crop(box)) for box in boxes]
+            return PreviewResult(generation, None, patches, None)
+        except Exception as e:
+            return PreviewResult(generation, None, [], e)
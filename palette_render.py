@@ -0,0 +1,663 @@
+#!/usr/bin/env python3
+"""
+Palette Render Engine
+Shared rectangle-fill renderer used by the palette editor GUI and the
+headless scripts. Regions are filled with native PIL rectangle fills
+instead of per-pixel loops.
+
+Large atlases (4096 and up) can be rendered band by band and streamed to
+a PNG file, so memory use does not grow with the square of the size.
+
+Overlapping regions are resolved once per layout into the rectangles each
+region actually shows, so a render paints every pixel exactly once
+instead of painting parents and then their children over them.
+
+Layouts whose region edges all fall on a common grid (32 pixels for the
+shipped template) are filled one pixel per grid cell, and the export and
+preview images are scaled up from that with exact nearest-neighbor
+resampling.
+
+Renders that show at most 256 colors can also be written as 8-bit
+indexed PNGs, whose color table is taken straight from the region colors.
+"""
+
+import math
+import struct
+import zlib
+from fractions import Fraction
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image
+
+from palette_layout import RegionTable, compile_layout, INVALID_COLOR
+from palette_trace import span, traced
+
+
+# Size of the generated character texture, and the smallest atlas size
+CANVAS_SIZE = 1024
+
+# Atlases this large or larger are rendered in bands instead of in one piece
+TILED_MIN_SIZE = 4096
+
+# Approximate memory for one band of a tiled render, in bytes
+BAND_BYTES = 8 << 20
+
+# Default zlib level for PNG files; 1 is fastest, 9 smallest
+PNG_COMPRESS_LEVEL = 6
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Most colors an indexed PNG can hold
+PALETTE_COLORS = 256
+
+# Maximum size of the on-screen preview thumbnail
+PREVIEW_SIZE = 600
+
+# Cells of the ownership grid resolved at a time when compositing a layout;
+# grids up to this size are also kept to render from
+OWNER_CELLS = 1 << 22
+
+# Filter support of LANCZOS resampling, in destination pixels
+LANCZOS_SUPPORT = 3
+
+# A region to fill: (x, y, width, height, (r, g, b))
+Region = Tuple[int, int, int, int, Tuple[int, int, int]]
+
+
+def hex_to_rgb(color_hex: str) -> Tuple[int, int, int]:
+    """Convert a hex color string (#rrggbb) to an RGB tuple"""
+    color_hex = color_hex.lstrip('#')
+    return tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
+
+
+def color_array(regions: Sequence[Region]) -> np.ndarray:
+    """Get the region colors as uint8 rows, plus a last row for the black of uncovered pixels"""
+    colors = np.zeros((len(regions) + 1, 3), dtype=np.uint8)
+    if regions:
+        colors[:-1] = [region[4] for region in regions]
+    return colors
+
+
+def fill_regions(img: Image.Image, regions: Iterable[Region]) -> Image.Image:
+    """Fill rectangular regions onto an image in painter's order
+
+    Regions are clipped to the image bounds, matching the behavior of the
+    original per-pixel loops.
+    """
+    img_width, img_height = img.size
+    for x, y, width, height, rgb in regions:
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, img_width)
+        y1 = min(y + height, img_height)
+        if x1 > x0 and y1 > y0:
+            img.paste(rgb, (x0, y0, x1, y1))
+    return img
+
+
+class Composite:
+    """Visible rectangles of a layout, resolved once from its region overlaps
+
+    Every region owns the parts of its rectangle that no later region
+    paints over. ``rects`` holds those parts as (x0, y0, x1, y1) rows,
+    clipped to the canvas and grouped by the owning region in ``owners``;
+    they never overlap, and together cover every pixel a painter's-order
+    render would paint.
+
+    When it is small enough, the grid of cells the layout's edges cut the
+    canvas into is kept too: ``cells`` holds the owner of every cell (-1
+    for none), between the column edges ``xs`` and row edges ``ys``.
+    """
+
+    def __init__(self, rects: np.ndarray, owners: np.ndarray, count: int,
+                 xs: np.ndarray, ys: np.ndarray, cells: Optional[np.ndarray] = None):
+        order = np.argsort(owners, kind='stable')
+        self.rects = rects[order]
+        self.owners = owners[order]
+        self.starts = np.searchsorted(self.owners, np.arange(count + 1))
+        self.size = (int(xs[-1]), int(ys[-1]))
+        self.xs = xs
+        self.ys = ys
+        self.cells = cells
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def region_rects(self, index: int) -> List[Tuple[int, int, int, int]]:
+        """Get the visible rectangles of one region"""
+        return self.rects[self.starts[index]:self.starts[index + 1]].tolist()
+
+    def visible_regions(self, regions: Sequence[Region]) -> List[Region]:
+        """Turn the visible rectangles into regions colored like their owners"""
+        return [(x0, y0, x1 - x0, y1 - y0, regions[owner][4])
+                for (x0, y0, x1, y1), owner in zip(self.rects.tolist(), self.owners.tolist())]
+
+    def render(self, regions: Sequence[Region]) -> Image.Image:
+        """Render the regions onto a new black canvas, setting each pixel once"""
+        if self.cells is None:
+            return fill_regions(Image.new('RGB', self.size, color='black'), self.visible_regions(regions))
+        # The extra last color is the black of cells no region covers
+        pixels = np.repeat(color_array(regions)[self.cells], np.diff(self.ys), axis=0)
+        return Image.fromarray(np.repeat(pixels, np.diff(self.xs), axis=1), 'RGB')
+
+    def palette(self, regions: Sequence[Region]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Build the color table of an indexed render from the colors that show
+
+        Returns the table as (r, g, b) rows and the index of every region's
+        color in it, plus a last index for uncovered pixels; or None when
+        more than PALETTE_COLORS distinct colors show.
+        """
+        colors = color_array(regions)
+        shown = np.zeros(len(colors), dtype=bool)
+        shown[self.owners] = True
+        area = ((self.rects[:, 2] - self.rects[:, 0]) * (self.rects[:, 3] - self.rects[:, 1])).sum()
+        shown[-1] = area < self.size[0] * self.size[1]
+
+        packed = (colors[:, 0].astype(np.int32) << 16) | (colors[:, 1].astype(np.int32) << 8) | colors[:, 2]
+        table, inverse = np.unique(packed[shown], return_inverse=True)
+        if len(table) > PALETTE_COLORS:
+            return None
+        index = np.zeros(len(colors), dtype=np.uint8)
+        index[shown] = inverse.reshape(-1)
+        return np.stack([table >> 16, (table >> 8) & 0xff, table & 0xff], axis=1).astype(np.uint8), index
+
+    def render_indexed(self, regions: Sequence[Region],
+                       palette: Tuple[np.ndarray, np.ndarray]) -> Image.Image:
+        """Render the regions onto a new indexed canvas with a table from palette()"""
+        table, index = palette
+        if self.cells is None:
+            img = Image.new('P', self.size, int(index[-1]))
+            for (x0, y0, x1, y1), owner in zip(self.rects.tolist(), self.owners.tolist()):
+                img.paste(int(index[owner]), (x0, y0, x1, y1))
+        else:
+            pixels = np.repeat(index[self.cells], np.diff(self.ys), axis=0)
+            img = Image.fromarray(np.repeat(pixels, np.diff(self.xs), axis=1), 'P')
+        img.putpalette(table.tobytes())
+        return img
+
+
+@lru_cache(maxsize=8)
+def resolve_layout(geometry: Tuple[Tuple[int, int, int, int], ...], size: int) -> Composite:
+    """Resolve which region shows at every pixel of a size x size canvas
+
+    ``geometry`` holds the (x, y, width, height) of each region in
+    painter's order. The canvas is cut into cells along every region edge,
+    each cell is given to the last region covering it, and runs of cells
+    with the same owner are merged back into rectangles.
+    """
+    boxes = np.array(
+        [(min(max(x, 0), size), min(max(y, 0), size),
+          min(max(x + w, 0), size), min(max(y + h, 0), size))
+         for x, y, w, h in geometry],
+        dtype=np.int64
+    ).reshape(-1, 4)
+    shown = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+    xs = np.unique(np.concatenate(([0, size], boxes[shown][:, 0], boxes[shown][:, 2])))
+    ys = np.unique(np.concatenate(([0, size], boxes[shown][:, 1], boxes[shown][:, 3])))
+    c0, c1 = np.searchsorted(xs, boxes[:, 0]), np.searchsorted(xs, boxes[:, 2])
+    r0, r1 = np.searchsorted(ys, boxes[:, 1]), np.searchsorted(ys, boxes[:, 3])
+    columns, rows = len(xs) - 1, len(ys) - 1
+
+    # Horizontal runs of cells with one owner, a strip of cell rows at a time
+    runs = []
+    strip = max(1, OWNER_CELLS // columns)
+    for top in range(0, rows, strip):
+        bottom = min(top + strip, rows)
+        grid = np.full((bottom - top, columns), -1, dtype=np.int32)
+        for index in np.flatnonzero(shown & (r0 < bottom) & (r1 > top)).tolist():
+            grid[max(r0[index] - top, 0):r1[index] - top, c0[index]:c1[index]] = index
+        starts = np.ones(grid.shape, dtype=bool)
+        starts[:, 1:] = grid[:, 1:] != grid[:, :-1]
+        run_rows, run_starts = np.nonzero(starts)
+        run_ends = np.append(run_starts[1:], columns)
+        run_ends[np.append(run_rows[1:] != run_rows[:-1], True)] = columns
+        run_owners = grid[run_rows, run_starts]
+        painted = run_owners >= 0
+        runs.append(np.stack([run_rows[painted] + top, run_starts[painted],
+                              run_ends[painted], run_owners[painted]], axis=1))
+
+    # Stack runs spanning the same columns in consecutive rows
+    runs = np.concatenate(runs) if runs else np.zeros((0, 4), dtype=np.int64)
+    row, start, end, owner = runs[np.lexsort((runs[:, 0], runs[:, 3], runs[:, 2], runs[:, 1]))].T
+    new = np.ones(len(row), dtype=bool)
+    new[1:] = ((start[1:] != start[:-1]) | (end[1:] != end[:-1]) |
+               (owner[1:] != owner[:-1]) | (row[1:] != row[:-1] + 1))
+    first = np.flatnonzero(new)
+    last = np.empty_like(first)
+    last[:-1] = first[1:] - 1
+    last[-1:] = len(row) - 1
+    rects = np.stack([xs[start[first]], ys[row[first]], xs[end[first]], ys[row[last] + 1]], axis=1)
+    # A grid resolved in one strip is kept to render from
+    return Composite(rects, owner[first], len(geometry), xs, ys, grid if rows <= strip else None)
+
+
+def composite_regions(regions: Sequence[Region], size: int) -> Composite:
+    """Get the resolved visible rectangles of a list of regions"""
+    return resolve_layout(tuple(region[:4] for region in regions), size)
+
+
+def layout_grid(regions: Iterable[Region], size: int) -> int:
+    """Get the largest grid cell size that the canvas size and every region edge fall on
+
+    Returns 1 when the layout is not aligned to any coarser grid.
+    """
+    values = [size]
+    for x, y, width, height, _ in regions:
+        values += (x, y, width, height)
+    return math.gcd(*values)
+
+
+def grid_regions(regions: Iterable[Region], cell: int) -> List[Region]:
+    """Scale grid-aligned regions down to one pixel per grid cell"""
+    return [(x // cell, y // cell, width // cell, height // cell, rgb)
+            for x, y, width, height, rgb in regions]
+
+
+def render_regions(regions: Iterable[Region], size: int = CANVAS_SIZE) -> Image.Image:
+    """Render regions onto a new black RGB canvas
+
+    Every pixel is set once from the region that shows there, which gives
+    the same image as painting every region in order. Grid-aligned layouts
+    are filled on a canvas of one pixel per grid cell and scaled up with
+    nearest-neighbor resampling, which is exact for an integer factor.
+    """
+    regions = list(regions)
+    cell = layout_grid(regions, size)
+    if cell > 1:
+        cells = size // cell
+        regions = grid_regions(regions, cell)
+        img = composite_regions(regions, cells).render(regions)
+        return img.resize((size, size), Image.Resampling.NEAREST)
+    return composite_regions(regions, size).render(regions)
+
+
+def atlas_size_for_extent(extent: int) -> int:
+    """Get the smallest power-of-two atlas size, at least CANVAS_SIZE, that holds extent pixels"""
+    size = CANVAS_SIZE
+    while size < extent:
+        size *= 2
+    return size
+
+
+def atlas_size(regions: Iterable[Region]) -> int:
+    """Get the atlas size a list of regions needs"""
+    return atlas_size_for_extent(max((max(x + w, y + h) for x, y, w, h, _ in regions), default=0))
+
+
+def table_atlas_size(table: RegionTable) -> int:
+    """Get the atlas size a compiled layout needs"""
+    if not len(table):
+        return CANVAS_SIZE
+    return atlas_size_for_extent(int(max((table.x + table.width).max(), (table.y + table.height).max())))
+
+
+def iter_bands(regions: Sequence[Region], size: int, band_height: int) -> Iterator[Tuple[int, Image.Image]]:
+    """Render a size x size canvas as horizontal bands, top to bottom
+
+    Yields (top row, band image) pairs. Each band is painted from only the
+    visible rectangles that overlap it, so stacking the bands gives the
+    same image as render_regions. Grid-aligned layouts are rendered at one
+    pixel per cell once, and each band is scaled up from it.
+    """
+    cell = layout_grid(regions, size)
+    if cell > 1:
+        cells = render_regions(grid_regions(regions, cell), size // cell)
+        band_height = max(cell, band_height // cell * cell)
+        for top in range(0, size, band_height):
+            height = min(band_height, size - top)
+            band = cells.crop((0, top // cell, cells.width, (top + height) // cell))
+            yield top, band.resize((size, height), Image.Resampling.NEAREST)
+        return
+
+    band_count = -(-size // band_height)
+    band_regions: List[List[Region]] = [[] for _ in range(band_count)]
+    for region in composite_regions(regions, size).visible_regions(regions):
+        x, y, width, height, _ = region
+        y0, y1 = max(y, 0), min(y + height, size)
+        if y1 > y0 and width > 0:
+            for band in range(y0 // band_height, (y1 - 1) // band_height + 1):
+                band_regions[band].append(region)
+
+    for band in range(band_count):
+        top = band * band_height
+        height = min(band_height, size - top)
+        img = Image.new('RGB', (size, height), color='black')
+        fill_regions(img, [(x, y - top, w, h, rgb) for x, y, w, h, rgb in band_regions[band]])
+        yield top, img
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    """Encode one PNG chunk"""
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """Get the Adler-32 of two joined byte strings from their own checksums"""
+    base = 65521
+    rem = length2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1 + (adler1 >> 16) + (adler2 >> 16) + base - rem) % base
+    sum1 = (sum1 + (adler2 & 0xffff) + base - 1) % base
+    return sum1 | (sum2 << 16)
+
+
+@lru_cache(maxsize=256)
+def _repeat_rows(row_bytes: int, count: int, compress_level: int) -> Tuple[bytes, int]:
+    """Deflate ``count`` rows that repeat the row above, as a self-contained block run
+
+    Returns the raw deflate data and the Adler-32 of the filtered rows.
+    """
+    rows = np.zeros((count, row_bytes + 1), dtype=np.uint8)
+    rows[:, 0] = 2  # "Up" filter: no difference from the row above
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    return compressor.compress(rows) + compressor.flush(zlib.Z_FULL_FLUSH), zlib.adler32(rows)
+
+
+def encode_composite_png(composite: Composite, regions: Sequence[Region],
+                         compress_level: int = PNG_COMPRESS_LEVEL,
+                         palette: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> bytes:
+    """Encode the render of a composite as a PNG without building the image
+
+    Pixel rows only change at the composite's row edges, so each run of
+    equal rows is one "Up"-filtered row followed by rows of zeros. The
+    zero rows of each run length are deflated once and reused, so the cost
+    follows the number of row edges rather than the image height. Needs a
+    composite that kept its cell grid.
+
+    The PNG is RGB, or 8-bit indexed with a ``palette`` from
+    Composite.palette().
+    """
+    width, height = composite.size
+    if palette is None:
+        pixels, channels = color_array(regions), 3
+    else:
+        pixels, channels = palette[1], 1
+    row_bytes = width * channels
+    rows = np.repeat(pixels[composite.cells], np.diff(composite.xs), axis=1).reshape(len(composite.ys) - 1, -1)
+    filtered = np.empty((len(rows), row_bytes + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[:, 1:] = rows
+    filtered[1:, 1:] -= rows[:-1]
+
+    # A full flush after every row keeps each block run self-contained, so
+    # the shared runs of zero rows can be spliced in between
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    parts = [b'\x78\x9c']
+    adler = 1
+    for row, count in zip(filtered, np.diff(composite.ys).tolist()):
+        parts.append(compressor.compress(row) + compressor.flush(zlib.Z_FULL_FLUSH))
+        adler = zlib.adler32(row, adler)
+        if count > 1:
+            data, repeat_adler = _repeat_rows(row_bytes, count - 1, compress_level)
+            parts.append(data)
+            adler = _adler32_combine(adler, repeat_adler, (count - 1) * (row_bytes + 1))
+    parts.append(compressor.flush())
+    parts.append(struct.pack('>I', adler))
+
+    if palette is None:
+        header = [_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))]
+    else:
+        header = [_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+                  _png_chunk(b'PLTE', palette[0].tobytes())]
+    return b''.join([
+        PNG_SIGNATURE,
+        *header,
+        _png_chunk(b'IDAT', b''.join(parts)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def write_png_tiled(regions: Sequence[Region], size: int, path: str,
+                    band_bytes: int = BAND_BYTES, compress_level: int = PNG_COMPRESS_LEVEL):
+    """Render regions band by band and stream them into an RGB PNG file
+
+    Only one band (about ``band_bytes``) is held in memory at a time. Rows
+    use the PNG "Up" filter, which suits stacked rectangles well.
+    """
+    band_height = max(1, band_bytes // (size * 3))
+    compressor = zlib.compressobj(compress_level)
+    previous = np.zeros(size * 3, dtype=np.uint8)
+
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        f.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)))
+
+        for _, band in iter_bands(regions, size, band_height):
+            rows = np.asarray(band).reshape(band.height, size * 3)
+            filtered = np.empty((band.height, size * 3 + 1), dtype=np.uint8)
+            filtered[:, 0] = 2  # "Up" filter: difference from the row above
+            filtered[:, 1:] = rows
+            filtered[1:, 1:] -= rows[:-1]
+            filtered[0, 1:] -= previous
+            previous = rows[-1].copy()
+
+            data = compressor.compress(memoryview(filtered))
+            if data:
+                f.write(_png_chunk(b'IDAT', data))
+
+        f.write(_png_chunk(b'IDAT', compressor.flush()))
+        f.write(_png_chunk(b'IEND', b''))
+
+
+@traced("save_atlas")
+def save_atlas(regions: Sequence[Region], path: str, size: int = 0, tiled: bool = None,
+               indexed: bool = False, compress_level: int = PNG_COMPRESS_LEVEL) -> bool:
+    """Render regions and save them as a PNG atlas
+
+    ``size`` defaults to the size the regions need. Atlases of
+    TILED_MIN_SIZE and up are streamed band by band unless ``tiled`` says
+    otherwise; smaller ones are rendered whole and saved by PIL.
+
+    With ``indexed`` the atlas is saved as an 8-bit indexed PNG if at most
+    PALETTE_COLORS colors show, and as RGB otherwise. Returns whether it
+    was saved indexed.
+    """
+    size = size or atlas_size(regions)
+    if indexed:
+        composite = composite_regions(regions, size)
+        palette = composite.palette(regions)
+        if palette is not None:
+            if composite.cells is not None:
+                with open(path, 'wb') as f:
+                    f.write(encode_composite_png(composite, regions, compress_level, palette))
+            else:
+                composite.render_indexed(regions, palette).save(path, 'PNG', compress_level=compress_level)
+            return True
+
+    if tiled is None:
+        tiled = size >= TILED_MIN_SIZE
+    if tiled:
+        write_png_tiled(regions, size, path, compress_level=compress_level)
+    else:
+        render_regions(regions, size).save(path, 'PNG', compress_level=compress_level)
+    return False
+
+
+def table_regions(table: RegionTable, colors: Optional[np.ndarray] = None) -> List[Region]:
+    """Collect the regions of a compiled table with the same rules as the editor preview
+
+    Every region with a Color field is included in editor order, and empty
+    colors are painted black. ``colors`` replaces the table's packed colors.
+    """
+    colors = table.color if colors is None else colors
+    regions = []
+    for row, (x, y, width, height, color) in enumerate(zip(
+            table.x.tolist(), table.y.tolist(), table.width.tolist(),
+            table.height.tolist(), colors.tolist())):
+        if color == INVALID_COLOR:
+            raise ValueError(f"Invalid color for region {table.paths[row]}")
+        color = max(color, 0)
+        regions.append((x, y, width, height, (color >> 16, (color >> 8) & 0xff, color & 0xff)))
+    return regions
+
+
+def palette_regions(palette_data: List[Dict[str, Any]]) -> List[Region]:
+    """Collect the regions of an in-memory palette with the same rules as the editor preview"""
+    return table_regions(compile_layout(palette_data))
+
+
+def render_palette(palette_data: List[Dict[str, Any]], size: int = CANVAS_SIZE) -> Image.Image:
+    """Render a palette configuration the same way the editor preview does"""
+    return render_regions(palette_regions(palette_data), size)
+
+
+class PreviewCanvas:
+    """Persistent full-resolution canvas with an incrementally patched thumbnail
+
+    After an initial full render, color changes repaint only the visible
+    rectangles of the changed regions and resample only the matching tiles
+    of the thumbnail.
+
+    Grid-aligned layouts are painted on a canvas of one pixel per grid cell.
+    The full image and, when the grid fits in the display size, the
+    thumbnail are exact nearest-neighbor enlargements of it; the thumbnail
+    then uses the largest whole number of pixels per cell.
+    """
+
+    def __init__(self, size: int = CANVAS_SIZE, display_size: int = PREVIEW_SIZE):
+        self.size = size
+        self.display_size = display_size
+        self.regions: List[Region] = []
+        self.composite = None  # Visible rectangles of the regions, at one pixel per cell
+        self.image = None
+        self.display_image = None
+        self.tiles = None  # ((source, display) tile size along x, along y)
+        self.cell = 1  # Grid cell size of the layout, 1 if it is not grid-aligned
+        self.cell_regions: List[Region] = []  # Regions at one pixel per cell
+        self.cells_image = None  # Canvas at one pixel per cell
+        self.display_scale = 0  # Thumbnail pixels per cell, 0 if the thumbnail is resampled
+
+    def render(self, regions: Iterable[Region]):
+        """Render all regions from scratch and rebuild the thumbnail"""
+        self.regions = list(regions)
+        self.cell = layout_grid(self.regions, self.size)
+        with span("preview.fill", regions=len(self.regions), cell=self.cell):
+            if self.cell > 1:
+                cells = self.size // self.cell
+                self.cell_regions = grid_regions(self.regions, self.cell)
+                self.composite = composite_regions(self.cell_regions, cells)
+                self.cells_image = self.composite.render(self.cell_regions)
+                self.image = self.cells_image.resize((self.size, self.size), Image.Resampling.NEAREST)
+                self.display_scale = self.display_size // cells
+            else:
+                self.cell_regions = []
+                self.cells_image = None
+                self.composite = composite_regions(self.regions, self.size)
+                self.image = self.composite.render(self.regions)
+                self.display_scale = 0
+
+        with span("preview.thumbnail"):
+            if self.display_scale:
+                side = self.cells_image.width * self.display_scale
+                self.display_image = self.cells_image.resize((side, side), Image.Resampling.NEAREST)
+                self.tiles = None
+                return
+
+            # Scale down for display (max display_size x display_size)
+            self.display_image = self.image.copy()
+            self.display_image.thumbnail((self.display_size, self.display_size), Image.Resampling.LANCZOS)
+            self.tiles = self._resample_tiles()
+
+    def update(self, changes: Dict[int, Tuple[int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        """Recolor regions by index and repaint only the affected areas
+
+        Returns the thumbnail boxes that were modified.
+        """
+        dirty = []
+        for index, rgb in changes.items():
+            self.regions[index] = self.regions[index][:4] + (rgb,)
+            if self.cell > 1:
+                # Repaint the visible cells, then enlarge them into the full image
+                self.cell_regions[index] = self.cell_regions[index][:4] + (rgb,)
+                for cell_rect in map(tuple, self.composite.region_rects(index)):
+                    self.cells_image.paste(rgb, cell_rect)
+                    rect = tuple(v * self.cell for v in cell_rect)
+                    self.image.paste(rgb, rect)
+                    dirty.append(rect)
+            else:
+                for rect in map(tuple, self.composite.region_rects(index)):
+                    self.image.paste(rgb, rect)
+                    dirty.append(rect)
+
+        return self._update_display(dirty)
+
+    def _enlarge_cells(self, cell_rect: Tuple[int, int, int, int], scale: int) -> Image.Image:
+        """Scale a rectangle of the cell canvas up by a whole factor"""
+        x0, y0, x1, y1 = cell_rect
+        return self.cells_image.crop(cell_rect).resize(((x1 - x0) * scale, (y1 - y0) * scale),
+                                                       Image.Resampling.NEAREST)
+
+    def _resample_tiles(self):
+        """Find the tile grid on which a partial resample matches the full one
+
+        Resampling a source box whose edges fall on multiples of the reduced
+        source/display ratio gives exactly the same pixels as resampling the
+        whole image. Returns None when the thumbnail has to be rebuilt whole.
+        """
+        display_width, display_height = self.display_image.size
+        if (display_width, display_height) == self.image.size:
+            return ((1, 1), (1, 1))
+        # thumbnail() reduces large images in integer steps before resampling
+        if self.size / display_width >= 4 or self.size / display_height >= 4:
+            return None
+        ratio_x = Fraction(self.size, display_width)
+        ratio_y = Fraction(self.size, display_height)
+        return ((ratio_x.numerator, ratio_x.denominator),
+                (ratio_y.numerator, ratio_y.denominator))
+
+    def _update_display(self, dirty: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        """Resample the thumbnail tiles touched by dirty source rectangles"""
+        if not dirty:
+            return []
+
+        if self.display_scale:
+            boxes = []
+            for rect in dirty:
+                cell_rect = tuple(v // self.cell for v in rect)
+                box = tuple(v * self.display_scale for v in cell_rect)
+                self.display_image.paste(self._enlarge_cells(cell_rect, self.display_scale), box[:2])
+                boxes.append(box)
+            return boxes
+
+        if self.tiles is None:
+            self.display_image = self.image.copy()
+            self.display_image.thumbnail((self.display_size, self.display_size), Image.Resampling.LANCZOS)
+            return [(0, 0) + self.display_image.size]
+
+        (src_w, dst_w), (src_h, dst_h) = self.tiles
+        if (src_w, dst_w, src_h, dst_h) == (1, 1, 1, 1):
+            for rect in dirty:
+                self.display_image.paste(self.image.crop(rect), rect[:2])
+            return dirty
+
+        # Expand by the filter support so every display pixel reading the
+        # dirty pixels is recomputed, then snap to the tile grid
+        margin_x = LANCZOS_SUPPORT * src_w // dst_w + 1
+        margin_y = LANCZOS_SUPPORT * src_h // dst_h + 1
+        tiles = set()
+        for x0, y0, x1, y1 in dirty:
+            tx0 = max(x0 - margin_x, 0) // src_w
+            ty0 = max(y0 - margin_y, 0) // src_h
+            tx1 = -(-min(x1 + margin_x, self.size) // src_w)
+            ty1 = -(-min(y1 + margin_y, self.size) // src_h)
+            tiles.update((tx, ty) for ty in range(ty0, ty1) for tx in range(tx0, tx1))
+
+        # Resample runs of adjacent tiles along each row together
+        boxes = []
+        for ty, tx in sorted((ty, tx) for tx, ty in tiles):
+            if boxes and boxes[-1][1] == ty and boxes[-1][2] == tx:
+                boxes[-1][2] = tx + 1
+            else:
+                boxes.append([tx, ty, tx + 1, ty + 1])
+
+        display_boxes = []
+        for tx0, ty0, tx1, ty1 in boxes:
+            box = (tx0 * dst_w, ty0 * dst_h, tx1 * dst_w, ty1 * dst_h)
+            patch = self.image.resize(
+                (box[2] - box[0], box[3] - box[1]),
+                Image.Resampling.LANCZOS,
+                box=(tx0 * src_w, ty0 * src_h, tx1 * src_w, ty1 * src_h)
+            )
+            self.display_image.paste(patch, box[:2])
+            display_boxes.append(box)
+        return display_boxes
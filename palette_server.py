@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Palette Render Server
+Long-running local render service for asset pipelines and tool scripts.
+Layouts stay compiled in memory between requests, and rendered PNGs are
+kept in an LRU cache keyed by a hash of the layout and color assignment,
+so repeated palettes are answered without rendering at all. Uses only the
+standard library on top of the render engine, and does not need tkinter.
+
+Usage:
+    python palette_server.py                            # http://127.0.0.1:8765
+    python palette_server.py --socket /tmp/palette.sock
+    curl --data-binary @skin.json http://127.0.0.1:8765/render -o skin.png
+
+POST /render takes a palette JSON file or a colors-only .palette document
+as the request body and returns the texture as image/png. GET /stats
+returns the cache counters as JSON.
+"""
+
+import argparse
+import collections
+import hashlib
+import http.client
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+from palette_layout import (
+    RegionTable, find_layout, load_palette, parse_palette, INVALID_COLOR, SPARSE_FORMAT, SPARSE_VERSION,
+    TEMPLATE_PATH
+)
+from palette_render import composite_regions, encode_composite_png, render_regions, table_atlas_size, table_regions
+from palette_trace import span
+
+
+# Default address of the TCP listener
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Rendered PNGs kept in the response cache
+CACHE_ENTRIES = 256
+
+# Largest request body accepted, in bytes
+MAX_BODY = 16 << 20
+
+
+class RenderService:
+    """Renders palette payloads to PNG bytes
+
+    Layouts are compiled once and kept by fingerprint; rendered PNGs are
+    kept in an LRU cache keyed by the layout and its packed colors. Safe to
+    call from several threads.
+    """
+
+    def __init__(self, cache_entries: int = CACHE_ENTRIES, cache_dir: Optional[str] = None,
+                 search_paths: Tuple[str, ...] = (TEMPLATE_PATH,)):
+        self.cache_entries = cache_entries
+        self.cache_dir = cache_dir
+        self.search_paths = search_paths
+        self.layouts: Dict[str, RegionTable] = {}  # Fingerprint -> table with the layout file's colors
+        self.cache: 'collections.OrderedDict[str, bytes]' = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def layout(self, fingerprint: str) -> RegionTable:
+        """Get a compiled layout by fingerprint, loading it on first use"""
+        table = self.layouts.get(fingerprint)
+        if table is None:
+            path = find_layout(fingerprint, self.cache_dir, self.search_paths)
+            table = load_palette(path, self.cache_dir)[1]
+            if table.fingerprint != fingerprint:
+                raise ValueError(f"Layout does not match fingerprint {fingerprint[:12]}")
+            self.layouts[fingerprint] = table
+        return table
+
+    def preload(self, path: str):
+        """Compile a layout ahead of the first request that uses it"""
+        table = load_palette(path, self.cache_dir)[1]
+        self.layouts.setdefault(table.fingerprint, table)
+        composite_regions(table_regions(table), table_atlas_size(table))
+
+    def parse(self, payload: bytes) -> Tuple[RegionTable, np.ndarray]:
+        """Read a palette JSON or colors-only payload into its layout and packed colors"""
+        try:
+            return self._parse(payload.decode('utf-8'))
+        except (KeyError, TypeError, AttributeError, IndexError) as e:
+            raise ValueError(f"Malformed palette: {e!r}") from e
+
+    def _parse(self, text: str) -> Tuple[RegionTable, np.ndarray]:
+        """Parse a decoded payload"""
+        if not text.lstrip().startswith('{'):
+            _, table = parse_palette(text, self.cache_dir)
+            return table, table.color
+
+        data = json.loads(text)
+        if data.get('format') != SPARSE_FORMAT or data.get('version') != SPARSE_VERSION:
+            raise ValueError("Not a palette or colors-only palette document")
+        table = self.layout(data.get('layout', ''))
+        rows, colors = data.get('rows', []), data.get('colors', [])
+        if len(rows) != len(colors) or any(not 0 <= row < len(table) for row in rows) \
+                or any(not 0 <= color <= 0xffffff for color in colors):
+            raise ValueError("Corrupt colors-only palette")
+        packed = table.color.copy()
+        packed[rows] = colors
+        return table, packed
+
+    def render(self, payload: bytes) -> Tuple[bytes, bool]:
+        """Render a payload to PNG bytes
+
+        Returns the PNG and whether it came from the cache. Raises
+        ValueError for payloads that are not valid palettes.
+        """
+        table, colors = self.parse(payload)
+        if (colors == INVALID_COLOR).any():
+            row = int(np.flatnonzero(colors == INVALID_COLOR)[0])
+            raise ValueError(f"Invalid color for region {table.paths[row]}")
+        key = hashlib.sha256(table.fingerprint.encode('ascii') + colors.astype('<i4').tobytes()).hexdigest()
+
+        with self.lock:
+            png = self.cache.get(key)
+            if png is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return png, True
+            self.misses += 1
+
+        with span("server.render", regions=len(table)):
+            png = render_png(table, colors)
+
+        with self.lock:
+            self.cache[key] = png
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return png, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the cache counters"""
+        with self.lock:
+            return {
+                'hits': self.hits, 'misses': self.misses, 'entries': len(self.cache),
+                'bytes': sum(len(png) for png in self.cache.values()), 'layouts': len(self.layouts),
+            }
+
+
+def render_png(table: RegionTable, colors: np.ndarray) -> bytes:
+    """Render a layout with the given packed colors to PNG bytes at its atlas size"""
+    regions = table_regions(table, colors)
+    size = table_atlas_size(table)
+    composite = composite_regions(regions, size)
+    if composite.cells is not None:
+        return encode_composite_png(composite, regions)
+    # Layouts too fine for a kept cell grid go through a full render
+    buffer = io.BytesIO()
+    render_regions(regions, size).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a RenderService"""
+
+    server_version = "PaletteRender/1"
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+
+    def setup(self):
+        """Turn off Nagle's algorithm on TCP connections, so responses are not held back"""
+        self.disable_nagle_algorithm = self.request.family in (socket.AF_INET, socket.AF_INET6)
+        super().setup()
+
+    def do_POST(self):
+        """Render the palette in the request body"""
+        if self.path.split('?')[0] != '/render':
+            self.send_error(404)
+            return
+        if 'Content-Length' not in self.headers:
+            self.send_error(411)
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, "Bad Content-Length")
+            return
+        if length > MAX_BODY:
+            self.send_error(413)
+            return
+        body = self.rfile.read(length)
+
+        try:
+            png, hit = self.server.service.render(body)
+        except ValueError as e:
+            self.send_error(400, str(e).splitlines()[0] if str(e) else None)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(png)))
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        self.end_headers()
+        self.wfile.write(png)
+
+    def do_GET(self):
+        """Report the cache counters"""
+        if self.path.split('?')[0] != '/stats':
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.service.stats()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        """Name the client in log lines; Unix socket clients have no address"""
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        """Log requests only when the server is verbose"""
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class TCPRenderServer(ThreadingHTTPServer):
+    """Render service listening on a TCP port"""
+
+    daemon_threads = True
+
+    def __init__(self, service: RenderService, address: Tuple[str, int], verbose: bool = False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, RenderHandler)
+
+
+# Unix domain sockets are missing on some platforms, such as Windows
+HAVE_UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+if HAVE_UNIX_SOCKETS:
+    class UnixRenderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """Render service listening on a Unix domain socket"""
+
+        daemon_threads = True
+
+        def __init__(self, service: RenderService, path: str, verbose: bool = False):
+            self.service = service
+            self.verbose = verbose
+            if os.path.exists(path):
+                os.unlink(path)  # Left over from a server that did not shut down cleanly
+            super().__init__(path, RenderHandler)
+
+        def server_close(self):
+            """Close the socket and remove its file"""
+            super().server_close()
+            if os.path.exists(self.server_address):
+                os.unlink(self.server_address)
+
+    class UnixHTTPConnection(http.client.HTTPConnection):
+        """HTTP client connection over a Unix domain socket"""
+
+        def __init__(self, path: str, timeout: float = 30):
+            super().__init__("localhost", timeout=timeout)
+            self.path = path
+
+        def connect(self):
+            """Connect to the socket file instead of a TCP address"""
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.path)
+
+
+def request_render(connection: http.client.HTTPConnection, payload: bytes) -> bytes:
+    """Send a palette payload to a render server and return the PNG bytes
+
+    ``connection`` can be reused for many requests. Raises ValueError with
+    the server's message when the render is refused.
+    """
+    connection.request('POST', '/render', body=payload, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    data = response.read()
+    if response.status != 200:
+        raise ValueError(f"Render failed: {response.status} {response.reason}")
+    return data
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(description="Local render service for character palettes")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", metavar="PATH", help="Listen on a Unix domain socket instead of TCP")
+    parser.add_argument("--cache", type=int, default=CACHE_ENTRIES,
+                        help=f"Rendered PNGs kept in memory (default: {CACHE_ENTRIES})")
+    parser.add_argument("--layout", action="append", default=[],
+                        help="Palette file whose layout is compiled at startup (default: the template)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    return parser
+
+
+def main(argv=None):
+    """Main entry point"""
+    args = build_parser().parse_args(argv)
+    if args.socket and not HAVE_UNIX_SOCKETS:
+        print("Error: Unix domain sockets are not supported on this platform; use --host and --port instead")
+        return 1
+    service = RenderService(args.cache)
+    for path in args.layout or [TEMPLATE_PATH]:
+        service.preload(path)
+
+    if args.socket:
+        server = UnixRenderServer(service, args.socket, args.verbose)
+        where = args.socket
+    else:
+        server = TCPRenderServer(service, (args.host, args.port), args.verbose)
+        host, port = server.server_address[:2]
+        where = f"http://{host}:{port}"
+    print(f"Rendering palettes at {where} (Ctrl+C to stop)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Palette Timing Trace
+Lightweight timing spans around the hot paths of the editor and batch
+tools. Tracing is off unless the PALETTE_TRACE environment variable or a
+--trace flag turns it on; spans then cost one flag check. Recorded spans
+can be written as a Chrome trace JSON file (chrome://tracing, Perfetto)
+to attach to performance reports.
+
+    PALETTE_TRACE=1            record spans, show timings in the status bar
+    PALETTE_TRACE=trace.json   also write the trace to trace.json on exit
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+# Environment variable that enables tracing
+TRACE_ENV = "PALETTE_TRACE"
+
+# Oldest spans are dropped beyond this many
+MAX_EVENTS = 200000
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """Collects timing spans as Chrome trace "complete" events"""
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled = False
+        self.path: Optional[str] = None  # Trace file written on exit
+        self.events = deque(maxlen=max_events)
+        self.last: Dict[str, float] = {}  # Span name -> duration of its newest run, in seconds
+
+    def record(self, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]):
+        """Add a finished span"""
+        event = {
+            'name': name, 'ph': 'X', 'ts': start_ns / 1000, 'dur': (end_ns - start_ns) / 1000,
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+        self.last[name] = (end_ns - start_ns) / 1e9
+
+
+class Span:
+    """Context manager timing one run of a named span"""
+
+    def __init__(self, tracer: Tracer, name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+_tracer = Tracer()
+
+
+def span(name: str, **args):
+    """Time a block as a named span; ``args`` are shown with the span in the trace viewer"""
+    if not _tracer.enabled:
+        return _NULL_SPAN
+    return Span(_tracer, name, args)
+
+
+def traced(name: str):
+    """Decorator that times every call of a function as a named span"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            with Span(_tracer, name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def is_enabled() -> bool:
+    """Whether spans are being recorded"""
+    return _tracer.enabled
+
+
+def enable(path: Optional[str] = None):
+    """Start recording spans, and write them to ``path`` on exit if given"""
+    _tracer.enabled = True
+    if path and _tracer.path is None:
+        atexit.register(_write_on_exit)
+    _tracer.path = path or _tracer.path
+
+
+def disable():
+    """Stop recording spans and forget the recorded ones"""
+    _tracer.enabled = False
+    _tracer.path = None
+    _tracer.events.clear()
+    _tracer.last.clear()
+
+
+def enable_from_env() -> bool:
+    """Enable tracing if the PALETTE_TRACE environment variable asks for it
+
+    "1" only records spans; any other value is also the trace file path.
+    Returns whether tracing is enabled.
+    """
+    value = os.environ.get(TRACE_ENV, "")
+    if value and value != "0":
+        enable(None if value == "1" else value)
+    return _tracer.enabled
+
+
+def last_duration(name: str) -> Optional[float]:
+    """Get the duration of the newest run of a span in seconds, or None if it never ran"""
+    return _tracer.last.get(name)
+
+
+def take_events() -> List[Dict[str, Any]]:
+    """Remove and return the recorded events, e.g. to send them from a worker process"""
+    events = list(_tracer.events)
+    _tracer.events.clear()
+    return events
+
+
+def add_events(events: List[Dict[str, Any]]):
+    """Add events recorded elsewhere, such as in a worker process"""
+    _tracer.events.extend(events)
+
+
+def write_trace(path: str) -> int:
+    """Write the recorded spans as a Chrome trace JSON file and return the number of events"""
+    events = list(_tracer.events)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
+
+
+def _write_on_exit():
+    """Write the trace file requested by enable()"""
+    if _tracer.enabled and _tracer.path:
+        write_trace(_tracer.path)
@@ -30,7 +30,7 @@ if %errorlevel% neq 0 (
 
 REM Launch the application
 echo Launching Character Palette Editor...
-python "%SCRIPT_DIR%palette_editor.py"
+python "%SCRIPT_DIR%palette_editor.py" %*
 
 REM Deactivate virtual environment
 call deactivate
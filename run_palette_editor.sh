@@ -28,7 +28,7 @@ fi
 
 # Launch the application
 echo "Launching Character Palette Editor..."
-python "$SCRIPT_DIR/palette_editor.py"
+python "$SCRIPT_DIR/palette_editor.py" "$@"
 
 # Deactivate virtual environment
 deactivate
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the benchmark suite
+Checks the synthetic layouts, the result file and the regression check.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import bench_palette
+from palette_layout import compile_layout
+
+
+def test_synthetic_layout():
+    """Test that synthetic layouts scale the number of regions"""
+    print("Testing synthetic layouts...")
+
+    with open('SaveCharacterPalette.json', 'r') as f:
+        template = json.load(f)
+    base = len(compile_layout(template))
+
+    for scale in [1, 4, 10]:
+        table = compile_layout(bench_palette.synthetic_layout(template, scale))
+        print(f"  {scale}x: {len(table)} regions")
+        assert len(table) == base * scale, f"Expected {base * scale} regions at {scale}x"
+        assert (table.x + table.width <= 1024).all() and (table.y + table.height <= 1024).all(), \
+            "Synthetic regions should stay on the canvas"
+
+    print("✓ Synthetic layouts scale correctly\n")
+
+
+def test_run_and_compare():
+    """Test a short run, its JSON output and the compare mode"""
+    print("Testing benchmark run and compare...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        output = os.path.join(tmp, "bench.json")
+        try:
+            result = bench_palette.main(["--scales", "1", "--repeat", "1", "-o", output])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+        assert result == 0
+
+        with open(output, 'r') as f:
+            results = json.load(f)
+        template = results['layouts']['template']
+        for name in ['load', 'parse_entries', 'render_full', 'render_single', 'import', 'group_apply', 'save']:
+            assert template[name] > 0, f"Missing timing for {name}"
+
+        # Identical results never regress
+        assert bench_palette.compare_results(results, results, verbose=False) == []
+
+        # A slower run is flagged, a faster one is not
+        slower = json.loads(json.dumps(results))
+        slower['layouts']['template']['import'] = template['import'] * 2 + 0.01
+        slower['layouts']['template']['save'] = template['save'] / 2
+        assert bench_palette.compare_results(results, slower, verbose=False) == ['template.import']
+
+        slower_path = os.path.join(tmp, "slower.json")
+        with open(slower_path, 'w') as f:
+            json.dump(slower, f)
+        assert bench_palette.main(["--compare", output, slower_path]) == 1
+        assert bench_palette.main(["--compare", output, output]) == 0
+
+    print("✓ Benchmark run and compare working correctly\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Benchmarks - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_synthetic_layout()
+        test_run_and_compare()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
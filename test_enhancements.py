@@ -7,59 +7,7 @@ import json
 import sys
 from PIL import Image
 from collections import Counter
-import colorsys
-
-
-def calculate_shade(color_hex: str, factor: float = 0.6) -> str:
-    """Calculate a darker shade of the given color"""
-    if not color_hex or color_hex == "":
-        return "#000000"
-    
-    # Convert hex to RGB
-    color_hex = color_hex.lstrip('#')
-    try:
-        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-    except:
-        return "#000000"
-    
-    # Convert to HSV
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    
-    # Reduce value (brightness) for shade
-    v = v * factor
-    
-    # Convert back to RGB
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    
-    # Convert to hex
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
-
-
-def calculate_highlight(color_hex: str, factor: float = 1.4) -> str:
-    """Calculate a lighter highlight of the given color"""
-    if not color_hex or color_hex == "":
-        return "#000000"
-    
-    # Convert hex to RGB
-    color_hex = color_hex.lstrip('#')
-    try:
-        r, g, b = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-    except:
-        return "#000000"
-    
-    # Convert to HSV
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    
-    # Increase value (brightness) for highlight
-    v = min(1.0, v * factor)
-    # Reduce saturation slightly for better highlight effect
-    s = s * 0.8
-    
-    # Convert back to RGB
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    
-    # Convert to hex
-    return f"#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}"
+from palette_colors import calculate_shade, calculate_highlight
 
 
 def test_color_calculations():
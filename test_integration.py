@@ -118,6 +118,166 @@ def test_file_operations():
     return True
 
 
+def test_color_write_back():
+    """Test that edited colors are written back into the saved palette"""
+    print("Testing color write-back:")
+    
+    # Import after path is set
+    import tempfile
+    from palette_editor import ColorEntry
+    from palette_layout import load_palette, save_palette_changes
+    
+    palette_data, table = load_palette("SaveCharacterPalette.json", use_cache=False)
+    color_entries = {}
+    for row, path in enumerate(table.paths):
+        color_entries[path] = ColorEntry(
+            table.names[row], int(table.x[row]), int(table.y[row]),
+            int(table.width[row]), int(table.height[row]),
+            table.nodes[row]["Color"], table.nodes[row]
+        )
+    
+    # Unset colors start out unsaved, as in the editor, then two are edited
+    dirty = {path for path, entry in color_entries.items() if entry.node["Color"] != entry.color}
+    color_entries["0.Torso.Color 1"].color = "#ff0000"
+    color_entries["0.Torso.Color 1.Shade"].color = "#990000"
+    dirty.update(["0.Torso.Color 1", "0.Torso.Color 1.Shade"])
+    changes = [(color_entries[path].node, color_entries[path].color) for path in dirty]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "skin.json")
+        save_palette_changes(palette_data, table, changes, filename, cache_dir=tmp)
+        saved, _ = load_palette(filename, use_cache=False)
+    
+    torso = saved[0]["Torso"]
+    assert torso["Color 1"]["Color"] == "#ff0000", "Base color not written back"
+    assert torso["Color 1"]["Shade"]["Color"] == "#990000", "Shade color not written back"
+    assert torso["Color 2"]["Color"] == "#000000", "Unset colors should be saved as black"
+    print(f"  ✓ {len(changes)} changed entries written back through their nodes")
+    
+    print()
+    return True
+
+
+def test_group_color_apply():
+    """Test that a group color reaches exactly the matching regions"""
+    print("Testing group color apply:")
+    
+    # Import after path is set
+    from types import SimpleNamespace
+    from palette_editor import ColorEntry, PaletteEditor, calculate_shade, calculate_highlight
+    from palette_history import EditHistory
+    from palette_layout import load_palette
+    
+    palette_data, table = load_palette("SaveCharacterPalette.json", use_cache=False)
+    color_entries = {
+        path: ColorEntry(table.names[row], 0, 0, 0, 0, "", table.nodes[row])
+        for row, path in enumerate(table.paths)
+    }
+    refreshed = []
+    editor = SimpleNamespace(
+        region_table=table, color_entries=color_entries, group_color_widgets={},
+        update_color_widgets=lambda paths: None, mark_changed=refreshed.extend,
+        status_var=SimpleNamespace(set=lambda text: None), history=EditHistory()
+    )
+    editor.commit_colors = lambda label, colors: PaletteEditor.commit_colors(editor, label, colors)
+    editor.apply_transaction = lambda transaction: PaletteEditor.apply_transaction(editor, transaction)
+    PaletteEditor.apply_group_color(editor, "Clothing", "Color 1", "#4080c0")
+    
+    assert color_entries["0.Torso.Color 1"].color == "#4080c0"
+    assert color_entries["0.Torso.Color 1.Shade"].color == calculate_shade("#4080c0")
+    assert color_entries["0.Torso.Color 1.Highlight"].color == calculate_highlight("#4080c0")
+    changed = {path for path, entry in color_entries.items() if entry.color != "#000000"}
+    assert changed == set(refreshed), "Preview refresh does not match the changed regions"
+    for path in changed:
+        parts = path.split('.')
+        assert parts[2] == "Color 1", f"{path} should not change"
+        assert table.group[table.paths.index(path)] == 0, f"{path} is not a clothing region"
+    print(f"  ✓ Clothing Color 1 applied to {len(changed)} regions")
+    
+    # The group apply is one undo step that restores exactly the changed regions
+    refreshed.clear()
+    PaletteEditor.undo(editor)
+    assert all(entry.color == "#000000" for entry in color_entries.values()), "Undo left changed regions"
+    assert set(refreshed) == changed, "Undo should repaint only the changed regions"
+    assert not editor.history.can_undo
+    PaletteEditor.redo(editor)
+    assert {path for path, entry in color_entries.items() if entry.color != "#000000"} == changed
+    assert editor.history.cells == len(changed)
+    print("  ✓ Group apply undone and redone as a single transaction")
+    
+    print()
+    return True
+
+
+def test_background_save():
+    """Test that saves write only changed colors, off the calling thread"""
+    print("Testing background save:")
+    
+    # Import after path is set
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+    from palette_editor import ColorEntry, PaletteEditor
+    from palette_layout import load_palette
+    
+    palette_data, table = load_palette("SaveCharacterPalette.json", use_cache=False)
+    color_entries = {
+        path: ColorEntry(table.names[row], 0, 0, 0, 0, table.nodes[row]["Color"], table.nodes[row])
+        for row, path in enumerate(table.paths)
+    }
+    status = []
+    editor = SimpleNamespace(
+        palette_data=palette_data, region_table=table, color_entries=color_entries,
+        dirty_paths={"0.Torso.Color 1"}, pending_saves=[],
+        save_executor=ThreadPoolExecutor(max_workers=1),
+        schedule_save_poll=lambda: None, status_var=SimpleNamespace(set=status.append)
+    )
+    color_entries["0.Torso.Color 1"].color = "#ff0000"
+    color_entries["0.Torso.Color 2"].color = "#00ff00"  # Not marked as changed
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "skin.json")
+        PaletteEditor.save_to_file(editor, path)
+        assert editor.dirty_paths == set(), "Changes should be handed to the save"
+        
+        editor.pending_saves[0][0].result(timeout=10)
+        PaletteEditor.poll_saves(editor)
+        assert editor.pending_saves == []
+        assert status[-1] == "Saved: skin.json (1 changed regions)", status[-1]
+        
+        with open(path, 'r') as f:
+            saved = json.load(f)
+        assert saved[0]["Torso"]["Color 1"]["Color"] == "#ff0000"
+        assert saved[0]["Torso"]["Color 2"]["Color"] == "", "Unchanged regions should not be written back"
+        assert os.listdir(tmp) == ["skin.json"], "Temporary files were left behind"
+    
+    editor.save_executor.shutdown()
+    print("  ✓ Changed colors saved on the save worker")
+    
+    print()
+    return True
+
+
+def test_visible_row_range():
+    """Test which picker rows are created for a scroll position"""
+    print("Testing visible picker rows:")
+    
+    # Import after path is set
+    from palette_editor import visible_row_range
+    
+    # 100 rows of 30 px starting 50 px down, viewed through a 300 px window
+    assert visible_row_range(0, 300, 50, 100, row_height=30, overscan=0) == (0, 9)
+    assert visible_row_range(500, 800, 50, 100, row_height=30, overscan=0) == (15, 25)
+    assert visible_row_range(500, 800, 50, 100, row_height=30, overscan=2) == (13, 27)
+    # List scrolled out of view above or below
+    assert visible_row_range(5000, 5300, 50, 100, row_height=30, overscan=2) == (100, 100)
+    assert visible_row_range(0, 300, 1000, 100, row_height=30, overscan=0) == (0, 0)
+    print("  ✓ Only rows in view are created")
+    
+    print()
+    return True
+
+
 def main():
     """Main test runner"""
     print("=" * 60)
@@ -135,6 +295,22 @@ def main():
     if not test_file_operations():
         success = False
     
+    # Run write-back tests
+    if not test_color_write_back():
+        success = False
+    
+    # Run group color tests
+    if not test_group_color_apply():
+        success = False
+    
+    # Run save tests
+    if not test_background_save():
+        success = False
+    
+    # Run picker list tests
+    if not test_visible_row_range():
+        success = False
+    
     # Summary
     print("=" * 60)
     if success:
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Test script for the headless batch renderer
+Validates region ordering and the render command without requiring a GUI.
+"""
+
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from PIL import Image
+
+import palette_batch
+import palette_cache
+import palette_trace
+from palette_colors import calculate_shade, calculate_highlight
+from palette_import import extract_dominant_colors, extract_region_colors
+from palette_layout import CLOTHING_GROUP, ATTACHMENTS_GROUP, compile_layout, load_palette, save_palette_file
+from palette_render import palette_regions, render_palette, render_regions
+
+
+def editor_region_paths(palette_data):
+    """Reference: region paths in the order the editor's color_entries holds them"""
+    paths = []
+
+    def parse(data, path):
+        if isinstance(data, list):
+            for i, item in enumerate(data):
+                parse(item, f"{path}.{i}" if path else str(i))
+        elif isinstance(data, dict):
+            if all(k in data for k in ["Start X", "Start Y", "Width", "Height"]) and "Color" in data:
+                if path not in paths:
+                    paths.append(path)
+            for key, value in data.items():
+                if key not in ["Start X", "Start Y", "Width", "Height", "Color"]:
+                    parse(value, f"{path}.{key}" if path else key)
+
+    names = [list(item.keys())[0] for item in palette_data]
+    other = [n for n in names if n not in CLOTHING_GROUP and n not in ATTACHMENTS_GROUP]
+    for item_names in (CLOTHING_GROUP, ATTACHMENTS_GROUP, other):
+        for item_name in item_names:
+            if item_name in names:
+                idx = names.index(item_name)
+                parse(palette_data[idx], str(idx))
+    return paths
+
+
+def random_palette(seed):
+    """Load the template and assign random colors to most regions"""
+    with open('SaveCharacterPalette.json', 'r') as f:
+        palette_data = json.load(f)
+
+    rng = random.Random(seed)
+
+    def fill(data):
+        if isinstance(data, list):
+            for item in data:
+                fill(item)
+        elif isinstance(data, dict):
+            if "Color" in data and rng.random() < 0.7:
+                data["Color"] = f"#{rng.randrange(1 << 24):06x}"
+            for value in data.values():
+                fill(value)
+
+    fill(palette_data)
+    return palette_data
+
+
+def scale_palette(palette_data, scale):
+    """Scale every region position and size of a palette"""
+    if isinstance(palette_data, list):
+        return [scale_palette(item, scale) for item in palette_data]
+    if isinstance(palette_data, dict):
+        return {key: str(int(value) * scale) if key in ["Start X", "Start Y", "Width", "Height"]
+                else scale_palette(value, scale) for key, value in palette_data.items()}
+    return palette_data
+
+
+def test_region_order():
+    """Test that headless region order matches the editor's"""
+    print("Testing region order...")
+
+    palette_data = random_palette(1)
+    expected = editor_region_paths(palette_data)
+
+    nodes = {}
+
+    def index_nodes(data, path):
+        if isinstance(data, list):
+            for i, item in enumerate(data):
+                index_nodes(item, f"{path}.{i}" if path else str(i))
+        elif isinstance(data, dict):
+            nodes[path] = data
+            for key, value in data.items():
+                index_nodes(value, f"{path}.{key}" if path else key)
+
+    index_nodes(palette_data, "")
+    expected_regions = [
+        (int(nodes[p]["Start X"]), int(nodes[p]["Start Y"]),
+         int(nodes[p]["Width"]), int(nodes[p]["Height"]))
+        for p in expected
+    ]
+    actual_regions = [region[:4] for region in palette_regions(palette_data)]
+
+    print(f"  {len(actual_regions)} regions")
+    assert actual_regions == expected_regions, "Region order differs from the editor"
+
+    print("✓ Region order matches the editor\n")
+
+
+def test_render_command():
+    """Test the render command on a directory of palette files"""
+    print("Testing render command...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the layout cache out of the user's cache directory
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        input_dir = os.path.join(tmp, "skins")
+        output_dir = os.path.join(tmp, "textures")
+        os.makedirs(input_dir)
+
+        palettes = {}
+        for i in range(4):
+            palettes[f"skin{i}"] = random_palette(i)
+            with open(os.path.join(input_dir, f"skin{i}.json"), 'w') as f:
+                json.dump(palettes[f"skin{i}"], f)
+
+        # Colors-only files are rendered onto their stored layout
+        palettes["sparse"] = palettes["skin0"]
+        save_palette_file(palettes["sparse"], compile_layout(palettes["sparse"]),
+                          os.path.join(input_dir, "sparse.palette"))
+
+        trace_path = os.path.join(tmp, "trace.json")
+        try:
+            result = palette_batch.main(["--trace", trace_path, "render", input_dir, "-o", output_dir, "-j", "2"])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+            palette_trace.disable()
+        assert result == 0, "Render command failed"
+
+        # Spans recorded in the worker processes end up in the trace
+        with open(trace_path, 'r') as f:
+            events = json.load(f)['traceEvents']
+        rendered = [e for e in events if e['name'] == "render_file"]
+        assert len(rendered) == len(palettes), "Every file should have a render_file span"
+        assert all(e['pid'] != os.getpid() for e in rendered), "Renders should run in worker processes"
+        assert [e['name'] for e in events if e['pid'] == os.getpid()] == ["render"]
+
+        for name, palette_data in palettes.items():
+            with Image.open(os.path.join(output_dir, f"{name}.png")) as img:
+                assert img.tobytes() == render_palette(palette_data).tobytes(), \
+                    f"{name}.png differs from the editor render"
+
+        # Unchanged palettes are copied from the render cache on the next run
+        os.remove(os.path.join(output_dir, "skin1.png"))
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                result = palette_batch.main(["render", input_dir, "-o", output_dir])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+        assert result == 0, "Cached render failed"
+        assert f"{len(palettes)} hits, 0 misses" in output.getvalue(), "Every file should come from the cache"
+        for name, palette_data in palettes.items():
+            with Image.open(os.path.join(output_dir, f"{name}.png")) as img:
+                assert img.tobytes() == render_palette(palette_data).tobytes(), \
+                    f"Cached {name}.png differs from the editor render"
+
+        # Indexed files are cached apart from RGB ones and decode to the same pixels
+        indexed_dir = os.path.join(tmp, "indexed")
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                result = palette_batch.main(["render", input_dir, "-o", indexed_dir, "--indexed",
+                                             "--compress-level", "9", "-j", "1"])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+        assert result == 0, "Indexed render failed"
+        assert f"1 hits, {len(palettes) - 1} misses" in output.getvalue(), \
+            "Only the repeated palette should hit the cache"
+        for name, palette_data in palettes.items():
+            with Image.open(os.path.join(indexed_dir, f"{name}.png")) as img:
+                assert img.convert('RGB').tobytes() == render_palette(palette_data).tobytes(), \
+                    f"Indexed {name}.png differs from the editor render"
+
+        # A layout drawn on a 4096 atlas is rendered at that size, in bands
+        large = scale_palette(random_palette(9), 4)
+        with open(os.path.join(input_dir, "large.json"), 'w') as f:
+            json.dump(large, f)
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        try:
+            result = palette_batch.main(["render", os.path.join(input_dir, "large.json"), "-o", output_dir])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+        assert result == 0, "Large atlas render failed"
+        with Image.open(os.path.join(output_dir, "large.png")) as img:
+            assert img.size == (4096, 4096), f"Expected a 4096x4096 atlas, got {img.size}"
+            assert img.tobytes() == render_regions(palette_regions(large), 4096).tobytes(), \
+                "large.png differs from a full render"
+
+    print("✓ Render command working correctly\n")
+
+
+def test_render_cache_scans():
+    """Test that a parallel render scans the cache directory once and keeps it in bounds"""
+    print("Testing render cache accounting...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "skins")
+        os.makedirs(input_dir)
+        for i in range(6):
+            with open(os.path.join(input_dir, f"skin{i}.json"), 'w') as f:
+                json.dump(random_palette(20 + i), f)
+
+        # Scans are logged to a file, so scans in forked workers count too
+        scan_log = os.path.join(tmp, "scans.log")
+        real_entries = palette_cache.RenderCache._entries
+
+        def logged_entries(self):
+            with open(scan_log, 'a') as f:
+                f.write(f"{os.getpid()}\n")
+            return real_entries(self)
+
+        def render(*options):
+            open(scan_log, 'w').close()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = palette_batch.main(["render", input_dir, "-o", os.path.join(tmp, "textures"),
+                                             "-j", "2", "--cache-dir", cache_dir, *options])
+            assert result == 0, "Render command failed"
+            with open(scan_log, 'r') as f:
+                return f.read().split()
+
+        palette_cache.RenderCache._entries = logged_entries
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        try:
+            cache_dir = os.path.join(tmp, "renders")
+            scans = render()
+            assert scans == [str(os.getpid())], f"Expected one scan in the parent, got {scans}"
+
+            # The size limit holds across workers, since the parent evicts
+            cache_dir = os.path.join(tmp, "small")
+            render("--cache-size", "0")
+            assert sum(size for _, size, _ in real_entries(palette_cache.RenderCache(cache_dir))) == 0, \
+                "Entries stored by workers should be evicted"
+        finally:
+            palette_cache.RenderCache._entries = real_entries
+            del os.environ['PALETTE_CACHE_DIR']
+
+    print("✓ Render cache scanned once per batch\n")
+
+
+def test_watch_command():
+    """Test that the watcher renders changed files once they settle"""
+    print("Testing watch mode...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        input_dir = os.path.join(tmp, "skins")
+        output_dir = os.path.join(tmp, "textures")
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        clock = [10 ** 18]
+
+        def write(name, palette_data):
+            """Write a palette file with a new modification time"""
+            path = os.path.join(input_dir, name)
+            with open(path, 'w') as f:
+                f.write(palette_data if isinstance(palette_data, str) else json.dumps(palette_data))
+            clock[0] += 10 ** 9
+            os.utime(path, ns=(clock[0], clock[0]))
+            return path
+
+        def rendered(results):
+            assert all(error is None for _, _, _, error in results), f"Renders failed: {results}"
+            return sorted(os.path.basename(path) for path, _, _, _ in results)
+
+        def check(name, palette_data):
+            with Image.open(os.path.join(output_dir, f"{name}.png")) as img:
+                assert img.tobytes() == render_palette(palette_data).tobytes(), f"{name}.png is out of date"
+
+        try:
+            write("skin0.json", random_palette(0))
+            write("skin1.json", random_palette(1))
+            save_palette_file(random_palette(2), compile_layout(random_palette(2)),
+                              os.path.join(input_dir, "sparse.palette"))
+            watcher = palette_batch.PaletteWatcher([input_dir], output_dir, debounce=0.3)
+
+            assert watcher.poll(0.0) == [], "New files should wait for the debounce"
+            assert rendered(watcher.poll(1.0)) == ["skin0.json", "skin1.json", "sparse.palette"]
+            check("skin0", random_palette(0))
+            check("sparse", random_palette(2))
+
+            # Saving the same contents again does not render
+            write("skin0.json", random_palette(0))
+            assert watcher.poll(2.0) == [] and watcher.poll(3.0) == []
+            assert watcher.skipped == 1
+
+            # Rapid writes are rendered once, with the last contents
+            write("skin1.json", random_palette(3))
+            assert watcher.poll(4.0) == []
+            write("skin1.json", random_palette(4))
+            assert watcher.poll(4.2) == [], "Writes within the debounce should wait for the last one"
+            assert rendered(watcher.poll(4.6)) == ["skin1.json"]
+            check("skin1", random_palette(4))
+
+            # A broken save is reported and leaves the previous texture in place
+            write("skin0.json", "{")
+            watcher.poll(6.0)
+            results = watcher.poll(6.5)
+            assert len(results) == 1 and results[0][3] is not None, "Broken files should report an error"
+            check("skin0", random_palette(0))
+            write("skin0.json", random_palette(5))
+            watcher.poll(7.0)
+            assert rendered(watcher.poll(7.5)) == ["skin0.json"]
+            check("skin0", random_palette(5))
+
+            assert sorted(os.listdir(output_dir)) == ["skin0.png", "skin1.png", "sparse.png"], \
+                "Temporary files left in the output directory"
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+
+    print("✓ Watch mode renders only changed files\n")
+
+
+def test_shades_command():
+    """Test regenerating shades across a directory of palette files"""
+    print("Testing shades command...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        for i in range(3):
+            with open(os.path.join(tmp, f"skin{i}.json"), 'w') as f:
+                json.dump(random_palette(i), f)
+
+        try:
+            result = palette_batch.main(["shades", tmp, "--chunk-size", "2"])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+        assert result == 0, "Shades command failed"
+
+        for i in range(3):
+            with open(os.path.join(tmp, f"skin{i}.json"), 'r') as f:
+                palette_data = json.load(f)
+            for item in palette_data:
+                for key, region in item[list(item.keys())[0]].items():
+                    if not key.startswith("Color ") or not region["Color"]:
+                        continue
+                    if "Shade" in region:
+                        assert region["Shade"]["Color"] == calculate_shade(region["Color"])
+                    if "Highlight" in region:
+                        assert region["Highlight"]["Color"] == calculate_highlight(region["Color"])
+
+    print("✓ Shades command working correctly\n")
+
+
+def test_extract_command():
+    """Test converting a directory of textures into palette files"""
+    print("Testing extract command...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['PALETTE_CACHE_DIR'] = os.path.join(tmp, "cache")
+        texture_dir = os.path.join(tmp, "textures")
+        output_dir = os.path.join(tmp, "skins")
+        os.makedirs(texture_dir)
+
+        expected = {}
+        table = compile_layout(random_palette(0))
+        rects = list(zip(table.x.tolist(), table.y.tolist(), table.width.tolist(), table.height.tolist()))
+        for i in range(3):
+            img = render_palette(random_palette(i))
+            if i == 1:
+                # A region painted black has no usable color
+                x, y, w, h = rects[0]
+                img.paste((0, 0, 0), (x, y, x + w, y + h))
+            img.save(os.path.join(texture_dir, f"skin{i}.png"))
+            expected[f"skin{i}"] = extract_dominant_colors(img, rects)
+        # Textures of another size are sampled at the scaled regions
+        small = img.resize((512, 512), Image.NEAREST)
+        small.save(os.path.join(texture_dir, "small.png"))
+        expected["small"] = extract_region_colors(small, rects, "dominant", atlas_size=1024)
+
+        report_path = os.path.join(tmp, "missing.json")
+        try:
+            result = palette_batch.main(["extract", texture_dir, "-o", output_dir, "-j", "2",
+                                         "--report", report_path])
+        finally:
+            del os.environ['PALETTE_CACHE_DIR']
+        assert result == 0
+
+        for name, colors in expected.items():
+            _, saved = load_palette(os.path.join(output_dir, f"{name}.json"), use_cache=False)
+            for row, color in enumerate(colors):
+                if color:
+                    assert saved.nodes[row]["Color"] == color, f"{name}: {saved.paths[row]} differs from the import"
+                else:
+                    assert saved.nodes[row]["Color"] == "", f"{name}: {saved.paths[row]} should keep the layout color"
+
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+        assert sorted(report) == sorted(os.path.join(texture_dir, f"{name}.png") for name in expected)
+        assert table.paths[0] in report[os.path.join(texture_dir, "skin1.png")]
+        assert table.paths[0] not in report[os.path.join(texture_dir, "skin0.png")]
+
+        # Other import modes are passed through to the workers
+        mean_dir = os.path.join(tmp, "mean")
+        texture = os.path.join(texture_dir, "skin2.png")
+        assert palette_batch.main(["extract", texture, "-o", mean_dir, "-j", "1", "--mode", "mean"]) == 0
+        _, saved = load_palette(os.path.join(mean_dir, "skin2.json"), use_cache=False)
+        with Image.open(texture) as img:
+            means = extract_region_colors(img, rects, "mean")
+        assert [node["Color"] for node in saved.nodes] == [color or "" for color in means]
+
+    print("✓ Extract command working correctly\n")
+
+
+def test_no_tkinter():
+    """Test that the batch tool does not import tkinter"""
+    print("Testing headless imports...")
+
+    code = "import sys, palette_batch; sys.exit('tkinter' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, "palette_batch imports tkinter"
+
+    # The render server is only loaded by the watch command
+    code = "import sys, palette_batch; sys.exit('palette_server' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, "palette_batch imports palette_server"
+
+    print("✓ No tkinter import on the batch path\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Batch Renderer - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_region_order()
+        test_render_command()
+        test_render_cache_scans()
+        test_watch_command()
+        test_shades_command()
+        test_extract_command()
+        test_no_tkinter()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
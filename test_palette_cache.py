@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Test script for the on-disk render cache
+Checks cache keys, hit and miss handling, linked entries and LRU eviction.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import time
+
+from palette_cache import RenderCache, render_key
+
+
+REGIONS = [(0, 0, 64, 64, (255, 0, 0)), (32, 32, 64, 64, (0, 0, 255)), (100, 0, 8, 8, (1, 2, 3))]
+
+
+def writer(content, calls):
+    """Make a write callback that records its calls"""
+    def write(path):
+        calls.append(path)
+        with open(path, 'wb') as f:
+            f.write(content)
+    return write
+
+
+def test_render_key():
+    """Test that keys change with everything a render depends on"""
+    print("Testing render keys...")
+
+    key = render_key(REGIONS, 512)
+    assert key == render_key(list(REGIONS), 512), "Equal renders should share a key"
+    assert key.endswith(".png")
+
+    recolored = REGIONS[:2] + [(100, 0, 8, 8, (1, 2, 4))]
+    reordered = [REGIONS[1], REGIONS[0], REGIONS[2]]
+    moved = REGIONS[:2] + [(101, 0, 8, 8, (1, 2, 3))]
+    others = [render_key(recolored, 512), render_key(reordered, 512), render_key(moved, 512),
+              render_key(REGIONS, 1024), render_key(REGIONS, 512, 'tga')]
+    assert len(set(others + [key])) == len(others) + 1, "Keys should differ for different renders"
+
+    print("✓ Keys cover colors, order, geometry, size and format\n")
+
+
+def test_hit_and_miss():
+    """Test that a stored render is copied out on the next request"""
+    print("Testing hits and misses...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(os.path.join(tmp, "renders"))
+        key = render_key(REGIONS, 512)
+        calls = []
+        first = os.path.join(tmp, "first.png")
+        second = os.path.join(tmp, "second.png")
+
+        assert not cache.output(key, first, writer(b"rendered", calls))
+        assert cache.output(key, second, writer(b"other", calls)), "Second output should hit"
+        assert len(calls) == 1, "A hit should not render"
+        with open(second, 'rb') as f:
+            assert f.read() == b"rendered"
+        assert not any(name.endswith('.tmp') for name in os.listdir(tmp)), "Temporary files left behind"
+
+        entry = cache.entry_path(key)
+        assert not os.stat(entry).st_mode & stat.S_IWUSR, "Entries should be read-only"
+        assert os.stat(second).st_ino != os.stat(entry).st_ino, "Copies should not share the entry"
+
+        # Outputs can be overwritten after they came from the cache
+        with open(second, 'wb') as f:
+            f.write(b"edited")
+        with open(entry, 'rb') as f:
+            assert f.read() == b"rendered"
+
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0}
+        assert "1 hits, 1 misses (50% hit rate)" in cache.summary()
+
+        # A failed render leaves no output and no entry
+        def fail(path):
+            raise RuntimeError("render failed")
+        other = render_key(REGIONS, 1024)
+        try:
+            cache.output(other, os.path.join(tmp, "failed.png"), fail)
+            assert False, "The render error should propagate"
+        except RuntimeError:
+            pass
+        assert not os.path.exists(os.path.join(tmp, "failed.png"))
+        assert not os.path.exists(cache.entry_path(other))
+
+    print("✓ Stored renders are reused\n")
+
+
+def test_linked_entries():
+    """Test that link mode hard-links outputs to the cache entries"""
+    print("Testing linked entries...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(os.path.join(tmp, "renders"), link=True)
+        key = render_key(REGIONS, 512)
+        output = os.path.join(tmp, "skin.png")
+
+        cache.output(key, output, writer(b"rendered", []))
+        assert cache.output(key, output, writer(b"other", []))
+        assert os.stat(output).st_ino == os.stat(cache.entry_path(key)).st_ino, \
+            "Outputs should be links to the entry"
+
+        # A new render replaces the link instead of writing through it
+        cache.output(render_key(REGIONS, 1024), output, writer(b"bigger", []))
+        with open(cache.entry_path(key), 'rb') as f:
+            assert f.read() == b"rendered", "Cached entry was overwritten"
+
+    print("✓ Linked outputs leave entries intact\n")
+
+
+def test_eviction():
+    """Test that the least recently used entries are evicted first"""
+    print("Testing LRU eviction...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(os.path.join(tmp, "renders"), max_bytes=3500)
+        keys = [render_key(REGIONS, 64 << i) for i in range(4)]
+        output = os.path.join(tmp, "skin.png")
+
+        now = time.time()
+        for i, key in enumerate(keys[:3]):
+            cache.output(key, output, writer(bytes(1000), []))
+            os.utime(cache.entry_path(key), (now - 100 + i, now - 100 + i))
+
+        # Using the oldest entry makes the second one the least recently used
+        assert cache.output(keys[0], output, writer(b"", []))
+        cache.output(keys[3], output, writer(bytes(1000), []))
+
+        kept = [os.path.exists(cache.entry_path(key)) for key in keys]
+        assert kept == [True, False, True, True], f"Unexpected entries after eviction: {kept}"
+        assert cache.evictions == 1
+        assert sum(size for _, size, _ in cache._entries()) <= 3500
+
+        # Read-only files cannot be deleted on Windows; eviction still works there
+        real_unlink = os.unlink
+
+        def windows_unlink(path):
+            if not os.stat(path).st_mode & stat.S_IWUSR:
+                raise PermissionError(13, "Access is denied", path)
+            real_unlink(path)
+
+        os.unlink = windows_unlink
+        try:
+            cache.output(render_key(REGIONS, 4096), output, writer(bytes(1000), []))
+        finally:
+            os.unlink = real_unlink
+        assert cache.evictions == 2, "Read-only entries should still be evicted"
+        assert sum(size for _, size, _ in cache._entries()) <= 3500
+
+        # Entries that cannot be deleted at all stay counted
+        def locked_unlink(path):
+            if path.startswith(cache.directory):
+                raise PermissionError(13, "Access is denied", path)
+            real_unlink(path)
+
+        os.unlink = locked_unlink
+        try:
+            cache.evict(0)
+        finally:
+            os.unlink = real_unlink
+        assert cache.evictions == 2 and cache._size == sum(size for _, size, _ in cache._entries())
+
+    print("✓ Least recently used entries evicted\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Render Cache - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_render_key()
+        test_hit_and_miss()
+        test_linked_entries()
+        test_eviction()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for shade and highlight derivation
+Checks that the batched array version matches the scalar colorsys functions.
+"""
+
+import json
+import sys
+import numpy as np
+
+from palette_colors import (
+    calculate_shade, calculate_highlight, derive_shades, derive_shade_colors, derive_table_shades
+)
+from palette_layout import compile_layout, UNSET_COLOR, INVALID_COLOR
+
+
+def test_matches_scalar():
+    """Test that batched derivation is bit-identical to the scalar functions"""
+    print("Testing batched derivation against colorsys...")
+
+    rng = np.random.RandomState(0)
+    colors = np.concatenate([
+        rng.randint(0, 1 << 24, 20000),
+        # Grays, primaries and colors where two channels tie for the maximum
+        [0x000000, 0xffffff, 0x808080, 0xff0000, 0x00ff00, 0x0000ff,
+         0xffff00, 0x00ffff, 0xff00ff, 0x010000, 0xfffffe, 0x7f7f80],
+    ])
+    shades, highlights = derive_shades(colors)
+
+    for color, shade, highlight in zip(colors.tolist(), shades.tolist(), highlights.tolist()):
+        hex_color = f"#{color:06x}"
+        assert f"#{shade:06x}" == calculate_shade(hex_color), f"Shade differs for {hex_color}"
+        assert f"#{highlight:06x}" == calculate_highlight(hex_color), f"Highlight differs for {hex_color}"
+
+    print(f"  {len(colors)} colors identical")
+    print("✓ Batched derivation matches the scalar functions\n")
+
+
+def test_invalid_colors():
+    """Test that unset and invalid colors derive black"""
+    print("Testing unset and invalid colors...")
+
+    shades, highlights = derive_shades(np.array([UNSET_COLOR, INVALID_COLOR]))
+    assert shades.tolist() == [0, 0] and highlights.tolist() == [0, 0]
+
+    shade_list, highlight_list = derive_shade_colors(["", "#fff", "#ff0000"])
+    assert shade_list == [calculate_shade(c) for c in ["", "#fff", "#ff0000"]]
+    assert highlight_list == [calculate_highlight(c) for c in ["", "#fff", "#ff0000"]]
+
+    print("✓ Unset and invalid colors handled\n")
+
+
+def test_table_shades():
+    """Test regenerating shades for several palettes at once"""
+    print("Testing palette shade regeneration...")
+
+    tables = []
+    for base in ["#ff0000", "#336699"]:
+        with open('SaveCharacterPalette.json', 'r') as f:
+            palette_data = json.load(f)
+        palette_data[0]["Torso"]["Color 1"]["Color"] = base
+        palette_data[0]["Torso"]["Color 2"]["Shade"]["Color"] = "#123456"  # Base unset
+        tables.append((palette_data, compile_layout(palette_data)))
+
+    updated = derive_table_shades([table for _, table in tables])
+    assert updated == 4, f"Expected 4 updated regions, got {updated}"
+
+    for (palette_data, table), base in zip(tables, ["#ff0000", "#336699"]):
+        color1 = palette_data[0]["Torso"]["Color 1"]
+        assert color1["Shade"]["Color"] == calculate_shade(base)
+        assert color1["Highlight"]["Color"] == calculate_highlight(base)
+        assert palette_data[0]["Torso"]["Color 2"]["Shade"]["Color"] == "#123456"
+        row = table.paths.index("0.Torso.Color 1.Shade")
+        assert table.color[row] == int(calculate_shade(base)[1:], 16)
+
+    print("✓ Palette shades regenerated\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Colors - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_matches_scalar()
+        test_invalid_colors()
+        test_table_shades()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
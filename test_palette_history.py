@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the color edit history
+Checks undo/redo order, transaction grouping and journal size.
+"""
+
+import sys
+
+from palette_history import EditHistory
+
+
+def apply(colors, transaction):
+    """Apply a transaction to a list of colors"""
+    for row, color in zip(transaction.regions, transaction.new):
+        colors[row] = color
+
+
+def test_undo_redo():
+    """Test that undo and redo walk the edits in order"""
+    print("Testing undo and redo...")
+
+    colors = ["#000000"] * 10
+    history = EditHistory()
+
+    def edit(label, changes):
+        history.record(label, [(row, colors[row], color) for row, color in changes.items()])
+        for row, color in changes.items():
+            colors[row] = color
+
+    edit("first", {1: "#ff0000"})
+    edit("group", {2: "#00ff00", 3: "#008800", 4: "#88ff88"})
+    assert history.can_undo and not history.can_redo
+
+    transaction = history.undo()
+    assert transaction.label == "group"
+    apply(colors, transaction)
+    assert colors[2:5] == ["#000000"] * 3 and colors[1] == "#ff0000"
+
+    apply(colors, history.undo())
+    assert colors == ["#000000"] * 10
+    assert history.undo() is None, "Nothing should be left to undo"
+
+    apply(colors, history.redo())
+    apply(colors, history.redo())
+    assert colors[1:5] == ["#ff0000", "#00ff00", "#008800", "#88ff88"]
+    assert history.redo() is None
+
+    # A new edit after an undo drops the redo stack
+    apply(colors, history.undo())
+    edit("other", {5: "#0000ff"})
+    assert not history.can_redo
+
+    print("✓ Undo and redo restore each edit\n")
+
+
+def test_journal_size():
+    """Test that only changed regions are journaled"""
+    print("Testing journal size...")
+
+    history = EditHistory(limit=3)
+    assert not history.record("no-op", [(0, "#112233", "#112233")]), "No-op edits should not be recorded"
+    assert not history.can_undo
+
+    history.record("partial", [(0, "#000000", "#111111"), (1, "#222222", "#222222")])
+    assert history.cells == 1, "Unchanged regions should not be journaled"
+
+    for i in range(10):
+        history.record(f"edit {i}", [(i, "#000000", "#ffffff"), (i + 1, "#000000", "#ffffff")])
+    assert history.cells == 6, "Only the newest transactions should be kept"
+    assert history.undo().label == "edit 9"
+
+    history.clear()
+    assert history.cells == 0 and not history.can_undo and not history.can_redo
+
+    print("✓ Journal holds only changed regions\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Edit History - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_undo_redo()
+        test_journal_size()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
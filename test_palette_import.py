@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Test script for the vectorized texture import
+Checks that the label-map extraction matches per-region Counter scans.
+"""
+
+import json
+import sys
+import time
+from collections import Counter
+import numpy as np
+from PIL import Image
+
+import palette_import
+import palette_trace
+from palette_import import IMPORT_MODES, extract_dominant_colors, extract_region_colors, scale_rects
+
+
+def load_template_rects(scale=1):
+    """Collect (x, y, width, height) for every color region in the template"""
+    with open('SaveCharacterPalette.json', 'r') as f:
+        palette_data = json.load(f)
+
+    rects = []
+
+    def walk(data):
+        if isinstance(data, list):
+            for item in data:
+                walk(item)
+        elif isinstance(data, dict):
+            has_position = all(k in data for k in ["Start X", "Start Y", "Width", "Height"])
+            if has_position and "Color" in data:
+                rects.append(tuple(int(data[k]) // scale
+                                   for k in ["Start X", "Start Y", "Width", "Height"]))
+            for key, value in data.items():
+                if key not in ["Start X", "Start Y", "Width", "Height", "Color"]:
+                    walk(value)
+
+    walk(palette_data)
+    return rects
+
+
+def extract_per_pixel(img, rects):
+    """Reference extraction using the original per-pixel Counter scan"""
+    pixels = img.load()
+    results = []
+    for x, y, w, h in rects:
+        region_colors = []
+        for py in range(y, min(y + h, img.size[1])):
+            for px in range(x, min(x + w, img.size[0])):
+                color = pixels[px, py]
+                hex_color = f"#{color[0]:02x}{color[1]:02x}{color[2]:02x}"
+                if hex_color not in ["#000000", "#ffffff"]:
+                    region_colors.append(hex_color)
+        results.append(Counter(region_colors).most_common(1)[0][0] if region_colors else None)
+    return results
+
+
+def random_texture(width, height, seed):
+    """Build a texture from a tiny palette so that ties are common"""
+    palette = np.array([
+        [0, 0, 0], [255, 255, 255], [10, 20, 30], [200, 100, 50], [1, 2, 3]
+    ], dtype=np.uint8)
+    rng = np.random.RandomState(seed)
+    return Image.fromarray(palette[rng.randint(0, len(palette), (height, width))])
+
+
+def test_matches_per_pixel():
+    """Test that extraction matches the per-pixel scan, ties included"""
+    print("Testing extraction against the per-pixel scan...")
+
+    # Template layout scaled down 8x to keep the reference scan fast
+    rects = load_template_rects(scale=8)
+    for width, height in [(128, 128), (100, 90), (140, 128)]:
+        img = random_texture(width, height, seed=width + height)
+        expected = extract_per_pixel(img, rects)
+        actual = extract_dominant_colors(img, rects)
+        print(f"  {width}x{height}: {sum(c is not None for c in actual)} regions with a color")
+        assert actual == expected, f"Extraction differs for a {width}x{height} texture"
+
+    print("✓ Extraction matches the per-pixel scan\n")
+
+
+def test_nested_regions():
+    """Test that nested regions each get their own dominant color"""
+    print("Testing nested regions...")
+
+    img = Image.new('RGB', (64, 64), color='black')
+    img.paste((255, 0, 0), (0, 0, 64, 64))
+    img.paste((0, 0, 255), (0, 0, 16, 16))
+    img.paste((255, 255, 255), (32, 32, 64, 64))
+
+    rects = [
+        (0, 0, 64, 64),    # Parent: mostly red
+        (0, 0, 16, 16),    # Child: all blue
+        (32, 32, 32, 32),  # Child: all white, so no usable color
+    ]
+    colors = extract_dominant_colors(img, rects)
+    print(f"  Colors: {colors}")
+    assert colors == ["#ff0000", "#0000ff", None]
+
+    print("✓ Nested regions handled correctly\n")
+
+
+def region_pixels(img, rect):
+    """Reference: the usable pixels of a region in row-major order"""
+    pixels = img.load()
+    x, y, w, h = rect
+    return [pixels[px, py]
+            for py in range(max(y, 0), min(y + h, img.size[1]))
+            for px in range(max(x, 0), min(x + w, img.size[0]))
+            if pixels[px, py] not in [(0, 0, 0), (255, 255, 255)]]
+
+
+def mean_per_pixel(colors):
+    """Reference: per-channel mean of a list of colors, rounding halves up"""
+    count = len(colors)
+    return "#" + "".join(f"{(2 * sum(c[i] for c in colors) + count) // (2 * count):02x}" for i in range(3))
+
+
+def test_statistic_modes():
+    """Test the mean, trimmed mean and quantized modes against per-pixel references"""
+    print("Testing mean, trimmed and quantized modes...")
+
+    rng = np.random.RandomState(5)
+    pixels = rng.randint(0, 256, (90, 100, 3)).astype(np.uint8)
+    pixels[rng.rand(90, 100) < 0.2] = 0
+    img = Image.fromarray(pixels)
+    rects = load_template_rects(scale=11) + [(-5, 80, 20, 20), (50, 50, 0, 10)]
+
+    expected = {'mean': [], 'trimmed': [], 'quantized': []}
+    for rect in rects:
+        colors = region_pixels(img, rect)
+        if not colors:
+            for results in expected.values():
+                results.append(None)
+            continue
+        expected['mean'].append(mean_per_pixel(colors))
+
+        cut = min(int(len(colors) * 0.1), (len(colors) - 1) // 2)
+        channels = [sorted(c[i] for c in colors)[cut:len(colors) - cut] for i in range(3)]
+        expected['trimmed'].append(mean_per_pixel(list(zip(*channels))))
+
+        buckets = [tuple(v // 16 for v in c) for c in colors]
+        best = Counter(buckets).most_common(1)[0][0]
+        expected['quantized'].append(mean_per_pixel([c for c, b in zip(colors, buckets) if b == best]))
+
+    for mode, results in expected.items():
+        assert extract_region_colors(img, rects, mode) == results, f"{mode} mode differs from the per-pixel scan"
+    assert extract_region_colors(img, rects, "dominant") == extract_dominant_colors(img, rects)
+
+    try:
+        extract_region_colors(img, rects, "median")
+        assert False, "Unknown modes should be rejected"
+    except ValueError:
+        pass
+
+    # Trims of half a channel or more, and tolerances below 1, are rejected
+    for mode, options in [("trimmed", {'trim': -0.2}), ("trimmed", {'trim': 0.5}),
+                          ("quantized", {'tolerance': 0}), ("quantized", {'tolerance': -4})]:
+        try:
+            extract_region_colors(img, rects, mode, **options)
+            assert False, f"{options} should be rejected"
+        except ValueError:
+            pass
+    assert extract_region_colors(img, rects, "trimmed", trim=0) == expected['mean']
+    assert extract_region_colors(img, rects, "quantized", tolerance=1) == extract_dominant_colors(img, rects)
+
+    print("✓ Statistic modes match the per-pixel scan\n")
+
+
+def test_noisy_texture():
+    """Test that the statistic modes recover flat colors from a noisy texture"""
+    print("Testing noisy textures...")
+
+    rng = np.random.RandomState(6)
+    base = np.zeros((64, 64, 3), dtype=np.int64)
+    base[:, :32] = (200, 120, 40)
+    base[:, 32:] = (30, 90, 160)
+    noisy = base + rng.randint(-6, 7, base.shape)
+    noisy[rng.rand(64, 64) < 0.02] = (250, 0, 250)  # Stray pixels
+    img = Image.fromarray(noisy.clip(0, 255).astype(np.uint8))
+    rects = [(0, 0, 32, 64), (32, 0, 32, 64)]
+
+    def distance(color, rgb):
+        return max(abs(int(color[1 + 2 * i:3 + 2 * i], 16) - rgb[i]) for i in range(3))
+
+    for mode in ["trimmed", "quantized"]:
+        colors = extract_region_colors(img, rects, mode)
+        print(f"  {mode:10} {colors}")
+        assert distance(colors[0], (200, 120, 40)) <= 4 and distance(colors[1], (30, 90, 160)) <= 4, \
+            f"{mode} mode should land near the flat colors"
+
+    print("✓ Noisy textures recovered\n")
+
+
+def test_banded_extraction():
+    """Test that images processed in bands give the same colors as in one piece"""
+    print("Testing banded extraction...")
+
+    rng = np.random.RandomState(7)
+    pixels = (rng.randint(0, 4, (90, 100, 3)) * 85).astype(np.uint8)
+    img = Image.fromarray(pixels)
+    rects = load_template_rects(scale=11) + [(-5, 80, 20, 20), (50, 50, 0, 10), (0, 0, 100, 90)]
+
+    whole = {mode: extract_region_colors(img, rects, mode) for mode in IMPORT_MODES}
+    band_pixels = palette_import.BAND_PIXELS
+    try:
+        palette_import.BAND_PIXELS = 100 * 7  # Bands of 7 rows, cutting through most regions
+        for mode in IMPORT_MODES:
+            assert extract_region_colors(img, rects, mode) == whole[mode], f"Banded {mode} mode differs"
+    finally:
+        palette_import.BAND_PIXELS = band_pixels
+
+    print("✓ Bands match the whole image\n")
+
+
+def test_scaled_texture():
+    """Test that textures of another size are sampled at the scaled regions"""
+    print("Testing textures of another size...")
+
+    assert scale_rects([(0, 0, 10, 10), (10, 0, 3, 3), (5, 5, 1, 1)], 20, 40, 10) == \
+        [(0, 0, 20, 5), (20, 0, 6, 1), (10, 2, 2, 1)]
+
+    rects = load_template_rects(scale=8)
+    atlas = random_texture(128, 128, seed=8)
+    expected = extract_region_colors(atlas, rects, "dominant")
+    for size in [(256, 256), (512, 384)]:
+        img = atlas.resize(size, Image.NEAREST)
+        assert extract_region_colors(img, rects, "dominant", atlas_size=128) == expected, \
+            f"A {size} texture should give the atlas colors"
+
+    print("✓ Scaled textures give the atlas colors\n")
+
+
+def test_extraction_trace():
+    """Test that the extract_region_colors span times the whole extraction"""
+    print("Testing the extraction span...")
+
+    img = random_texture(1024, 1024, 5)
+    rects = load_template_rects()
+    palette_trace.take_events()
+    palette_trace.enable()
+    try:
+        start = time.perf_counter()
+        extract_region_colors(img, rects, "trimmed")
+        elapsed = time.perf_counter() - start
+        events = [e for e in palette_trace.take_events() if e['name'] == "extract_region_colors"]
+    finally:
+        palette_trace.disable()
+
+    assert len(events) == 1, "One extraction should record one span"
+    assert events[0]['dur'] / 1e6 >= elapsed * 0.5, "The span should cover the extraction, not part of it"
+    print(f"  Span {events[0]['dur'] / 1000:.1f} ms of {elapsed * 1000:.1f} ms")
+
+    print("✓ Extraction span covers the extraction\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Texture Import - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_matches_per_pixel()
+        test_nested_regions()
+        test_statistic_modes()
+        test_noisy_texture()
+        test_banded_extraction()
+        test_scaled_texture()
+        test_extraction_trace()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
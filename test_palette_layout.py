@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Test script for the compiled palette layout and its binary cache
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import palette_layout
+from palette_layout import (
+    atomic_write, clear_layout_memo, parse_palette, compile_layout, load_palette, layout_key, pack_color,
+    read_layout_cache, write_layout_cache, iter_color_regions, layout_store_dir,
+    load_palette_file, save_palette_file, read_sparse_palette,
+    KIND_BASE, KIND_SHADE, KIND_HIGHLIGHT, UNSET_COLOR, INVALID_COLOR, CACHE_EXTENSION
+)
+
+
+def load_template():
+    """Load the default template"""
+    with open('SaveCharacterPalette.json', 'r') as f:
+        return json.load(f)
+
+
+def test_compiled_table():
+    """Test the columns of a compiled table"""
+    print("Testing compiled region table...")
+
+    table = compile_layout(load_template())
+    print(f"  {len(table)} regions, fingerprint {table.fingerprint[:12]}...")
+    assert len(table) == 645, f"Expected 645 regions, found {len(table)}"
+
+    torso = table.paths.index("0.Torso")
+    color1 = table.paths.index("0.Torso.Color 1")
+    shade = table.paths.index("0.Torso.Color 1.Shade")
+    highlight = table.paths.index("0.Torso.Color 1.Highlight")
+
+    assert table.names[shade] == "Torso - Color 1 - Shade"
+    assert (table.x[torso], table.y[torso], table.width[torso], table.height[torso]) == (0, 0, 64, 320)
+    assert table.parent[torso] == -1
+    assert table.parent[color1] == torso
+    assert table.parent[shade] == color1 and table.parent[highlight] == color1
+    assert table.kind[color1] == KIND_BASE
+    assert table.kind[shade] == KIND_SHADE
+    assert table.kind[highlight] == KIND_HIGHLIGHT
+    assert (table.color == UNSET_COLOR).all(), "Template colors should be unset"
+
+    # Clothing rows come first, in group order
+    groups = dict(table.group_rows())
+    assert table.paths[groups["Clothing"][0]] == "0.Torso"
+    assert sum(len(rows) for rows in groups.values()) == len(table)
+
+    print("✓ Compiled table is correct\n")
+
+
+def test_color_index():
+    """Test the (group, color id) index used for group recolors"""
+    print("Testing group color index...")
+
+    table = compile_layout(load_template())
+    index = table.color_index()
+
+    base, shade, highlight = index[("Clothing", "Color 1")]
+    base_paths = [table.paths[row] for row in base]
+    print(f"  Clothing Color 1: {len(base)} base, {len(shade)} shade, {len(highlight)} highlight rows")
+    assert "0.Torso.Color 1" in base_paths
+    assert all(path.endswith(".Color 1") for path in base_paths), "Color 1 matched another color"
+    assert all(table.paths[row].endswith(".Color 1.Shade") for row in shade)
+    assert all(table.paths[row].endswith(".Color 1.Highlight") for row in highlight)
+    assert all(table.group[row] == 0 for row in base + shade + highlight)
+
+    # "Hips" is a clothing item; the "Hip ... Attachment" items must not leak in
+    attachment_items = {int(table.item[row]) for rows in index[("Attachments", "Color 1")] for row in rows}
+    assert not attachment_items & {int(table.item[row]) for row in base}, "Groups overlap"
+
+    print("✓ Group color index is correct\n")
+
+
+def test_pack_color():
+    """Test packed color values"""
+    print("Testing pack_color...")
+
+    assert pack_color("#ff8000") == 0xff8000
+    assert pack_color("") == UNSET_COLOR
+    assert pack_color("#fff") == INVALID_COLOR
+
+    print("✓ pack_color working correctly\n")
+
+
+def test_cache_round_trip():
+    """Test that a warm load matches a cold load"""
+    print("Testing binary cache round trip...")
+
+    palette_data = load_template()
+    palette_data[0]["Torso"]["Color 1"]["Color"] = "#ff0000"
+    palette_data[1]["Hips"]["Color 2"]["Shade"]["Color"] = "#00aa00"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "skin.json")
+        with open(path, 'w') as f:
+            json.dump(palette_data, f, indent=2)
+
+        clear_layout_memo()
+        _, cold = load_palette(path, cache_dir=tmp)
+        with open(path, 'r') as f:
+            key = layout_key(f.read())
+        assert os.path.exists(os.path.join(tmp, key + CACHE_EXTENSION)), "Cache file was not written"
+
+        # Drop the in-process copy so the binary file is read
+        clear_layout_memo()
+        warm_data, warm = load_palette(path, cache_dir=tmp)
+
+        assert warm.fingerprint == cold.fingerprint
+        assert warm.paths == cold.paths and warm.names == cold.names
+        for name, column in cold.columns().items():
+            assert (getattr(warm, name) == column).all(), f"Column {name} differs"
+        assert (warm.color == cold.color).all(), "Colors differ"
+
+        # Rows point at the live dicts of the loaded data
+        row = warm.paths.index("0.Torso.Color 1")
+        assert warm.color[row] == 0xff0000
+        assert warm.nodes[row] is warm_data[0]["Torso"]["Color 1"]
+
+        # A file with different colors reuses the same layout key
+        palette_data[0]["Torso"]["Color 2"]["Color"] = "#123456"
+        other = os.path.join(tmp, "other.json")
+        with open(other, 'w') as f:
+            json.dump(palette_data, f, indent=2)
+        with open(other, 'r') as f:
+            assert layout_key(f.read()) == key
+
+        clear_layout_memo()
+        _, table = load_palette(other, cache_dir=tmp)
+        assert table.color[table.paths.index("0.Torso.Color 2")] == 0x123456
+
+    print("✓ Warm load matches cold load\n")
+
+
+def test_layout_memo_bound():
+    """Test that a process remembers only the most recently used layouts"""
+    print("Testing layout memo size...")
+
+    palette_data = load_template()
+    with tempfile.TemporaryDirectory() as tmp:
+        clear_layout_memo()
+        # Every formatting of the same layout is a different layout key
+        texts = [json.dumps(palette_data, indent=indent) for indent in range(palette_layout.LAYOUT_MEMO_ENTRIES + 4)]
+        tables = [parse_palette(text, tmp)[1] for text in texts]
+        assert len(palette_layout._layout_memo) == palette_layout.LAYOUT_MEMO_ENTRIES, \
+            "The memo should not grow past its limit"
+        assert len({table.fingerprint for table in tables}) == 1
+        assert layout_key(texts[0]) not in palette_layout._layout_memo, "The oldest layout should be forgotten"
+        assert layout_key(texts[-1]) in palette_layout._layout_memo
+        clear_layout_memo()
+
+    print("✓ Layout memo stays bounded\n")
+
+
+def test_atomic_write():
+    """Test that atomic writes leave the permissions a plain write would"""
+    print("Testing atomic writes...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, "plain.json")
+        atomic = os.path.join(tmp, "atomic.json")
+        with open(plain, 'wb') as f:
+            f.write(b"{}")
+        atomic_write(atomic, b"{}")
+        assert os.stat(atomic).st_mode == os.stat(plain).st_mode, "New files should get the umask's mode"
+
+        # A rewrite keeps the mode of the file it replaces
+        os.chmod(atomic, 0o640)
+        atomic_write(atomic, b"[]")
+        with open(atomic, 'rb') as f:
+            assert f.read() == b"[]"
+        if os.name == 'posix':
+            assert os.stat(atomic).st_mode & 0o777 == 0o640, "Rewrites should keep the file's mode"
+        assert sorted(os.listdir(tmp)) == ["atomic.json", "plain.json"], "Temporary files left behind"
+
+    print("✓ Atomic writes keep file permissions\n")
+
+
+def test_cache_file_format():
+    """Test writing and reading a cache file directly"""
+    print("Testing cache file format...")
+
+    table = compile_layout(load_template())
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "layout" + CACHE_EXTENSION)
+        write_layout_cache(table, path)
+        loaded = read_layout_cache(path)
+        print(f"  Cache file is {os.path.getsize(path)} bytes")
+        assert loaded.fingerprint == table.fingerprint
+        assert loaded.node_count == table.node_count
+        assert (loaded.node_slot == table.node_slot).all()
+    finally:
+        shutil.rmtree(tmp)
+
+    print("✓ Cache file format working correctly\n")
+
+
+def test_region_walk():
+    """Test the region walk on a small structure"""
+    print("Testing region walk...")
+
+    data = [{"Item": {"Start X": "0", "Start Y": "0", "Width": "4", "Height": "4", "Color": "",
+                      "Color 1": {"Start X": "0", "Start Y": "0", "Width": "2", "Height": "2",
+                                  "Color": "#010203"}}}]
+    regions = [(path, name, level) for path, name, level, _ in iter_color_regions(data)]
+    assert regions == [("0.Item", "Item", 1), ("0.Item.Color 1", "Item - Color 1", 2)], regions
+
+    print("✓ Region walk working correctly\n")
+
+
+def test_sparse_palette():
+    """Test saving and loading colors-only palette files"""
+    print("Testing sparse palette files...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        palette_data, table = load_palette('SaveCharacterPalette.json', cache_dir=tmp)
+        palette_data[0]["Torso"]["Color 1"]["Color"] = "#ff0000"
+        palette_data[0]["Torso"]["Color 1"]["Shade"]["Color"] = "#990000"
+        palette_data[6]["Leg Left"]["Color 3"]["Color"] = "#00ff80"
+
+        sparse_path = os.path.join(tmp, "skin.palette")
+        json_path = os.path.join(tmp, "skin.json")
+        save_palette_file(palette_data, table, sparse_path, cache_dir=tmp)
+        save_palette_file(palette_data, table, json_path, cache_dir=tmp)
+        print(f"  Sparse file is {os.path.getsize(sparse_path)} bytes, JSON is {os.path.getsize(json_path)} bytes")
+        assert os.path.getsize(sparse_path) < 200, "Sparse file should only hold the set colors"
+
+        with open(sparse_path, 'r') as f:
+            sparse = json.load(f)
+        assert sparse['layout'] == table.fingerprint
+        assert sparse['colors'] == [0xff0000, 0x990000, 0x00ff80]
+
+        loaded_data, loaded = load_palette_file(sparse_path, cache_dir=tmp)
+        with open(json_path, 'r') as f:
+            assert loaded_data == json.load(f), "Sparse file does not load back to the same palette"
+        assert loaded.color[loaded.paths.index("0.Torso.Color 1")] == 0xff0000
+        assert loaded.nodes[0] is not table.nodes[0], "Loads must not share nodes"
+
+        # Without a stored layout the shipped template is found by fingerprint
+        shutil.rmtree(layout_store_dir(tmp))
+        loaded_data, _ = read_sparse_palette(sparse_path, cache_dir=tmp)
+        assert loaded_data[0]["Torso"]["Color 1"]["Color"] == "#ff0000"
+
+        # A layout that cannot be found is an error
+        sparse['layout'] = "0" * 64
+        with open(sparse_path, 'w') as f:
+            json.dump(sparse, f)
+        try:
+            read_sparse_palette(sparse_path, cache_dir=tmp)
+            assert False, "Unknown layout should raise"
+        except ValueError:
+            pass
+
+    print("✓ Sparse palette files working correctly\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Layout - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_compiled_table()
+        test_color_index()
+        test_pack_color()
+        test_cache_round_trip()
+        test_layout_memo_bound()
+        test_atomic_write()
+        test_cache_file_format()
+        test_region_walk()
+        test_sparse_palette()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for the background preview scheduler
+Checks coalescing, stale result dropping and output parity without a GUI.
+"""
+
+import random
+import sys
+
+from palette_preview import PreviewScheduler
+from palette_render import PreviewCanvas
+
+
+def random_regions(seed, count=200):
+    """Build random overlapping regions on a 1024x1024 canvas"""
+    rng = random.Random(seed)
+    regions = []
+    for _ in range(count):
+        x, y = rng.randrange(0, 1000), rng.randrange(0, 1000)
+        w, h = rng.randrange(4, 200), rng.randrange(4, 200)
+        regions.append((x, y, w, h, (rng.randrange(256), rng.randrange(256), rng.randrange(256))))
+    return regions
+
+
+def apply_results(display, results):
+    """Apply scheduler results the way the editor does"""
+    for result in results:
+        assert result.error is None, f"Render failed: {result.error}"
+        if result.image is not None:
+            display = result.image.copy()
+        else:
+            for box, image in result.patches:
+                display.paste(image, box[:2])
+    return display
+
+
+def test_coalesced_updates():
+    """Test that a burst of edits becomes few renders with the right output"""
+    print("Testing coalesced updates...")
+
+    regions = random_regions(1)
+    scheduler = PreviewScheduler(frame_interval=0.2)
+    scheduler.render(regions)
+    assert scheduler.wait(10), "Initial render did not finish"
+    display = apply_results(None, scheduler.results())
+
+    rng = random.Random(2)
+    renders = scheduler.renders
+    for _ in range(50):
+        index = rng.randrange(len(regions))
+        rgb = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        regions[index] = regions[index][:4] + (rgb,)
+        scheduler.update({index: rgb})
+    assert scheduler.wait(10), "Updates did not finish"
+    display = apply_results(display, scheduler.results())
+
+    print(f"  50 edits took {scheduler.renders - renders} render(s)")
+    assert scheduler.renders - renders <= 2, "Edits were not coalesced"
+    assert not scheduler.busy
+
+    expected = PreviewCanvas()
+    expected.render(regions)
+    assert display.tobytes() == expected.display_image.tobytes(), "Patched preview differs from a full render"
+
+    print("✓ Edits coalesced into matching renders\n")
+
+
+def test_stale_results_dropped():
+    """Test that results older than the newest full image are dropped"""
+    print("Testing stale result dropping...")
+
+    scheduler = PreviewScheduler(frame_interval=0)
+    first, second = random_regions(3), random_regions(4)
+    scheduler.render(first)
+    scheduler.wait(10)
+    scheduler.update({0: (1, 2, 3)})
+    scheduler.wait(10)
+    scheduler.render(second)
+    scheduler.wait(10)
+
+    results = scheduler.results()
+    assert len(results) == 1 and results[0].image is not None, "Stale results were not dropped"
+
+    expected = PreviewCanvas()
+    expected.render(second)
+    assert results[0].image.tobytes() == expected.display_image.tobytes()
+
+    # A full render supersedes edits that are still pending
+    scheduler.frame_interval = 0.2
+    scheduler.update({0: (9, 9, 9)})
+    scheduler.render(first)
+    scheduler.wait(10)
+    expected.render(first)
+    display = apply_results(None, scheduler.results())
+    assert display.tobytes() == expected.display_image.tobytes()
+
+    print("✓ Stale results dropped\n")
+
+
+def test_render_error():
+    """Test that a failing render is reported instead of stopping the worker"""
+    print("Testing render errors...")
+
+    scheduler = PreviewScheduler(frame_interval=0)
+    scheduler.render(random_regions(5, count=10))
+    scheduler.wait(10)
+    scheduler.results()
+
+    scheduler.update({99: (0, 0, 0)})  # No such region
+    scheduler.wait(10)
+    results = scheduler.results()
+    assert len(results) == 1 and isinstance(results[0].error, IndexError)
+
+    # The worker keeps going
+    scheduler.render(random_regions(6, count=10))
+    assert scheduler.wait(10)
+    assert scheduler.results()[-1].image is not None
+
+    print("✓ Render errors reported\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Preview Scheduler - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_coalesced_updates()
+        test_stale_results_dropped()
+        test_render_error()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared palette render engine
+Checks that the rectangle-fill renderer matches the original per-pixel loop.
+"""
+
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import zlib
+from PIL import Image
+
+import palette_render
+from palette_render import (
+    CANVAS_SIZE, PREVIEW_SIZE, hex_to_rgb, render_regions, PreviewCanvas,
+    atlas_size, composite_regions, encode_composite_png, iter_bands, layout_grid, save_atlas, write_png_tiled
+)
+
+
+def load_template_regions():
+    """Collect (x, y, width, height) for every color region in the template"""
+    with open('SaveCharacterPalette.json', 'r') as f:
+        palette_data = json.load(f)
+
+    regions = []
+
+    def walk(data):
+        if isinstance(data, list):
+            for item in data:
+                walk(item)
+        elif isinstance(data, dict):
+            has_position = all(k in data for k in ["Start X", "Start Y", "Width", "Height"])
+            if has_position and "Color" in data:
+                regions.append((int(data["Start X"]), int(data["Start Y"]),
+                                int(data["Width"]), int(data["Height"])))
+            for key, value in data.items():
+                if key not in ["Start X", "Start Y", "Width", "Height", "Color"]:
+                    walk(value)
+
+    walk(palette_data)
+    return regions
+
+
+def render_per_pixel(regions, size=CANVAS_SIZE):
+    """Reference renderer using the original per-pixel loop"""
+    img = Image.new('RGB', (size, size), color='black')
+    pixels = img.load()
+    for x, y, w, h, rgb in regions:
+        for py in range(y, min(y + h, size)):
+            for px in range(x, min(x + w, size)):
+                pixels[px, py] = rgb
+    return img
+
+
+def test_hex_to_rgb():
+    """Test hex color parsing"""
+    print("Testing hex_to_rgb...")
+
+    assert hex_to_rgb("#ff8000") == (255, 128, 0)
+    assert hex_to_rgb("00FF00") == (0, 255, 0)
+
+    try:
+        hex_to_rgb("#fff")
+        assert False, "Short hex codes should be rejected"
+    except ValueError:
+        pass
+
+    print("✓ hex_to_rgb working correctly\n")
+
+
+def test_render_matches_per_pixel():
+    """Test that the renderer output is byte-for-byte identical to the per-pixel loop"""
+    print("Testing render output against the per-pixel loop...")
+
+    random.seed(1234)
+    regions = [
+        (x, y, w, h, hex_to_rgb(f"#{random.randrange(1 << 24):06x}"))
+        for x, y, w, h in load_template_regions()
+    ]
+    # A region that runs past the canvas edge must be clipped
+    regions.append((1000, 990, 64, 64, (12, 34, 56)))
+
+    expected = render_per_pixel(regions)
+    actual = render_regions(regions)
+
+    print(f"  Rendered {len(regions)} regions")
+    assert actual.size == (CANVAS_SIZE, CANVAS_SIZE)
+    assert actual.tobytes() == expected.tobytes(), "Render output differs from per-pixel loop"
+
+    print("✓ Render output is identical\n")
+
+
+def test_incremental_update_matches_full():
+    """Test that dirty-rectangle updates match a full render and thumbnail"""
+    print("Testing incremental preview updates...")
+
+    random.seed(99)
+
+    def random_rgb():
+        return (random.randrange(256), random.randrange(256), random.randrange(256))
+
+    regions = [(x, y, w, h, random_rgb()) for x, y, w, h in load_template_regions()]
+    # An off-grid region keeps the layout on the general resampling path
+    regions.append((1001, 990, 64, 64, random_rgb()))
+    canvas = PreviewCanvas()
+    canvas.render(regions)
+    assert canvas.cell == 1
+
+    for step in range(40):
+        # Mix single-cell edits with group-sized batches
+        changes = {random.randrange(len(regions)): random_rgb()
+                   for _ in range(random.choice([1, 1, 3, 15]))}
+        boxes = canvas.update(changes)
+        visible = any(canvas.composite.region_rects(index) for index in changes)
+        assert bool(boxes) == visible, "Only changes to visible regions should patch the thumbnail"
+        for index, rgb in changes.items():
+            regions[index] = regions[index][:4] + (rgb,)
+
+    expected = render_regions(regions)
+    expected_display = expected.copy()
+    expected_display.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.LANCZOS)
+
+    assert canvas.image.tobytes() == expected.tobytes(), "Canvas differs from a full render"
+    assert canvas.display_image.tobytes() == expected_display.tobytes(), \
+        "Thumbnail differs from a full downscale"
+
+    # A single 32x32 cell only touches a small part of the thumbnail
+    index = next(i for i, r in enumerate(regions) if r[2:4] == (32, 32))
+    boxes = canvas.update({index: (1, 2, 3)})
+    patched = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+    print(f"  Single cell edit patched {patched} of {PREVIEW_SIZE * PREVIEW_SIZE} thumbnail pixels")
+    assert patched < PREVIEW_SIZE * PREVIEW_SIZE // 4
+
+    print("✓ Incremental updates match a full render\n")
+
+
+def test_composite():
+    """Test that the visible rectangles paint every pixel exactly once"""
+    print("Testing the overdraw-free compositor...")
+
+    random.seed(5)
+
+    def random_rgb():
+        return (random.randrange(256), random.randrange(256), random.randrange(256))
+
+    regions = [(x, y, w, h, random_rgb()) for x, y, w, h in load_template_regions()]
+    # Overlapping, clipped and empty regions on top of the nested template
+    for _ in range(60):
+        regions.append((random.randrange(1000), random.randrange(1000),
+                        random.randrange(200), random.randrange(200), random_rgb()))
+    assert render_regions(regions).tobytes() == render_per_pixel(regions).tobytes()
+
+    # The per-pixel reference wraps negative coordinates, so they are only checked here
+    regions.append((-20, -20, 40, 40, (1, 2, 3)))
+    composite = composite_regions(regions, CANVAS_SIZE)
+    coverage = Image.new('L', (CANVAS_SIZE, CANVAS_SIZE))
+    painted = Image.new('L', (CANVAS_SIZE, CANVAS_SIZE))
+    for x, y, w, h, _ in regions:
+        coverage.paste(1, (max(x, 0), max(y, 0), min(x + w, CANVAS_SIZE), min(y + h, CANVAS_SIZE)))
+    for x, y, w, h, _ in composite.visible_regions(regions):
+        assert w > 0 and h > 0
+        painted.paste(1, (x, y, x + w, y + h))
+    visible_area = int(sum(w * h for _, _, w, h, _ in composite.visible_regions(regions)))
+    region_area = sum(max(min(x + w, CANVAS_SIZE) - max(x, 0), 0) * max(min(y + h, CANVAS_SIZE) - max(y, 0), 0)
+                      for x, y, w, h, _ in regions)
+    print(f"  {len(composite)} visible rectangles, {visible_area} of {region_area} painted pixels")
+    assert painted.tobytes() == coverage.tobytes(), "Visible rectangles should cover exactly the painted pixels"
+    assert visible_area == sum(coverage.histogram()[1:]), "Visible rectangles should not overlap"
+
+    # Regions that are fully painted over own nothing
+    parent = (0, 0, 64, 64, (1, 1, 1))
+    children = [(0, 0, 64, 32, (2, 2, 2)), (0, 32, 64, 32, (3, 3, 3))]
+    composite = composite_regions([parent] + children, CANVAS_SIZE)
+    assert composite.region_rects(0) == []
+    assert composite.region_rects(1) == [[0, 0, 64, 32]]
+    assert composite_regions([], CANVAS_SIZE).render([]).getextrema() == ((0, 0),) * 3
+
+    print("✓ Every pixel is painted once\n")
+
+
+def test_composite_png():
+    """Test that PNGs encoded from row runs decode to the full render"""
+    print("Testing composite PNG encoding...")
+
+    random.seed(11)
+    regions = [
+        (x, y, w, h, hex_to_rgb(f"#{random.randrange(1 << 24):06x}"))
+        for x, y, w, h in load_template_regions()
+    ]
+    for layout in [regions, regions + [(1000, 990, 64, 64, (12, 34, 56)), (5, 7, 1, 1, (9, 9, 9))]]:
+        png = encode_composite_png(composite_regions(layout, CANVAS_SIZE), layout)
+        with Image.open(io.BytesIO(png)) as img:
+            assert img.mode == 'RGB' and img.tobytes() == render_regions(layout).tobytes(), \
+                "Encoded PNG differs from the full render"
+        # zlib checks the spliced stream's checksum
+        idat = png[png.index(b'IDAT') + 4:png.index(b'IEND') - 8]
+        assert len(zlib.decompress(idat)) == CANVAS_SIZE * (CANVAS_SIZE * 3 + 1)
+        print(f"  {len(layout)} regions: {len(png)} bytes")
+
+    print("✓ Composite PNGs decode to the full render\n")
+
+
+def test_indexed_png():
+    """Test that indexed PNGs decode to the same pixels as RGB ones"""
+    print("Testing indexed PNG export...")
+
+    random.seed(13)
+    shades = [(random.randrange(256), random.randrange(256), random.randrange(256)) for _ in range(40)]
+    regions = [(x, y, w, h, random.choice(shades)) for x, y, w, h in load_template_regions()]
+    # Off-grid, partly outside and uncovered areas too
+    odd = regions + [(1000, 990, 64, 64, (12, 34, 56)), (-5, 7, 20, 3, (9, 9, 9))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "atlas.png")
+        sizes = {}
+        for layout in [regions, odd, [(10, 10, 100, 50, (255, 0, 0))], []]:
+            expected = render_regions(layout).tobytes()
+            for level in (1, 9):
+                assert save_atlas(layout, path, CANVAS_SIZE, indexed=True, compress_level=level)
+                with Image.open(path) as img:
+                    assert img.mode == 'P', f"Expected an indexed PNG, got {img.mode}"
+                    assert len(img.getpalette()) // 3 <= 256
+                    assert img.convert('RGB').tobytes() == expected, "Indexed PNG differs from the RGB render"
+                sizes[len(layout), level] = os.path.getsize(path)
+        assert sizes[len(regions), 9] <= sizes[len(regions), 1], "Level 9 should not be larger than level 1"
+        print(f"  Template: {sizes[len(regions), 1]} bytes at level 1, {sizes[len(regions), 9]} at level 9")
+
+        # Layouts too fine to keep a cell grid are filled rectangle by rectangle
+        saved = palette_render.OWNER_CELLS
+        palette_render.OWNER_CELLS = 64
+        palette_render.resolve_layout.cache_clear()
+        try:
+            assert composite_regions(odd, CANVAS_SIZE).cells is None
+            assert save_atlas(odd, path, CANVAS_SIZE, indexed=True)
+            with Image.open(path) as img:
+                assert img.mode == 'P' and img.convert('RGB').tobytes() == render_regions(odd).tobytes()
+        finally:
+            palette_render.OWNER_CELLS = saved
+            palette_render.resolve_layout.cache_clear()
+
+        # More colors than a palette holds fall back to RGB
+        many = [(x, y, w, h, (i % 256, i // 256, 7)) for i, (x, y, w, h) in enumerate(load_template_regions())]
+        assert not save_atlas(many, path, CANVAS_SIZE, indexed=True)
+        with Image.open(path) as img:
+            assert img.mode == 'RGB' and img.tobytes() == render_regions(many).tobytes()
+
+    print("✓ Indexed PNGs match the RGB render\n")
+
+
+def test_grid_render():
+    """Test the one-pixel-per-cell path for grid-aligned layouts"""
+    print("Testing grid-aligned rendering...")
+
+    random.seed(7)
+
+    def random_rgb():
+        return (random.randrange(256), random.randrange(256), random.randrange(256))
+
+    regions = [(x, y, w, h, random_rgb()) for x, y, w, h in load_template_regions()]
+    assert layout_grid(regions, CANVAS_SIZE) == 32, "The template is laid out on a 32 pixel grid"
+    assert layout_grid(regions + [(8, 0, 8, 8, (0, 0, 0))], CANVAS_SIZE) == 8
+    assert layout_grid(regions + [(1001, 990, 64, 64, (0, 0, 0))], CANVAS_SIZE) == 1
+
+    # Export image is identical to filling every pixel
+    assert render_regions(regions).tobytes() == render_per_pixel(regions).tobytes()
+    bands = list(iter_bands(regions, CANVAS_SIZE, 100))
+    assert all(band.height % 32 == 0 for _, band in bands[:-1]), "Bands should end on cell edges"
+    stacked = Image.new('RGB', (CANVAS_SIZE, CANVAS_SIZE))
+    for top, band in bands:
+        stacked.paste(band, (0, top))
+    assert stacked.tobytes() == render_per_pixel(regions).tobytes()
+
+    # The thumbnail shows every cell as an equal block of pixels
+    canvas = PreviewCanvas()
+    canvas.render(regions)
+    scale = PREVIEW_SIZE // 32
+    assert canvas.display_image.size == (32 * scale, 32 * scale)
+    cells = canvas.image.resize((32, 32), Image.Resampling.NEAREST)
+    assert canvas.display_image.tobytes() == cells.resize(canvas.display_image.size, Image.Resampling.NEAREST).tobytes()
+
+    for step in range(40):
+        changes = {random.randrange(len(regions)): random_rgb()
+                   for _ in range(random.choice([1, 1, 3, 15]))}
+        canvas.update(changes)
+        for index, rgb in changes.items():
+            regions[index] = regions[index][:4] + (rgb,)
+    assert canvas.image.tobytes() == render_per_pixel(regions).tobytes(), "Canvas differs from a full render"
+    fresh = PreviewCanvas()
+    fresh.render(regions)
+    assert canvas.display_image.tobytes() == fresh.display_image.tobytes(), "Thumbnail differs from a full render"
+
+    # A single cell edit patches exactly one block of the thumbnail
+    index = next(i for i, r in enumerate(regions) if r[2:4] == (32, 32))
+    x, y = regions[index][0] // 32 * scale, regions[index][1] // 32 * scale
+    assert canvas.update({index: (1, 2, 3)}) == [(x, y, x + scale, y + scale)]
+
+    print("✓ Grid-aligned layouts render exactly\n")
+
+
+def test_atlas_size():
+    """Test that the atlas size follows the extent of the layout"""
+    print("Testing atlas size...")
+
+    regions = [(x, y, w, h, (0, 0, 0)) for x, y, w, h in load_template_regions()]
+    assert atlas_size(regions) == CANVAS_SIZE, "The template must stay 1024x1024"
+    assert atlas_size([]) == CANVAS_SIZE
+    assert atlas_size(regions + [(0, 1500, 10, 10, (0, 0, 0))]) == 2048
+    assert atlas_size([(x * 8, y * 8, w * 8, h * 8, rgb) for x, y, w, h, rgb in regions]) == 8192
+
+    print("✓ Atlas size is correct\n")
+
+
+def test_tiled_render():
+    """Test that band-by-band PNG output decodes to the same pixels as a full render"""
+    print("Testing tiled render...")
+
+    random.seed(99)
+    regions = [
+        (x, y, w, h, hex_to_rgb(f"#{random.randrange(1 << 24):06x}"))
+        for x, y, w, h in load_template_regions()
+    ]
+    regions.append((1000, 990, 64, 64, (12, 34, 56)))
+
+    # Bands must stack up to the full render
+    expected = render_regions(regions)
+    stacked = Image.new('RGB', expected.size)
+    for top, band in iter_bands(regions, CANVAS_SIZE, 100):
+        stacked.paste(band, (0, top))
+    assert stacked.tobytes() == expected.tobytes(), "Stacked bands differ from the full render"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in [1, 4]:
+            size = CANVAS_SIZE * scale
+            scaled = [(x * scale, y * scale, w * scale, h * scale, rgb) for x, y, w, h, rgb in regions]
+            path = os.path.join(tmp, f"atlas{size}.png")
+            # Small bands so that many band boundaries fall inside regions
+            write_png_tiled(scaled, size, path, band_bytes=size * 3 * 37)
+
+            with Image.open(path) as img:
+                print(f"  {size}x{size}: {os.path.getsize(path)} bytes")
+                assert img.size == (size, size) and img.mode == 'RGB'
+                assert img.tobytes() == render_regions(scaled, size).tobytes(), \
+                    f"Tiled {size}x{size} output differs from the full render"
+
+    print("✓ Tiled render matches the full render\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Render Engine - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_hex_to_rgb()
+        test_render_matches_per_pixel()
+        test_incremental_update_matches_full()
+        test_composite()
+        test_composite_png()
+        test_indexed_png()
+        test_grid_render()
+        test_atlas_size()
+        test_tiled_render()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
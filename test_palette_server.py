@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Test script for the local render service
+Checks that served PNGs match the batch renderer, the response cache, and
+both the TCP and Unix socket listeners. Everything runs in-process.
+"""
+
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from PIL import Image
+
+from palette_layout import TEMPLATE_PATH, load_palette, write_sparse_palette
+from palette_render import render_palette
+import palette_server
+from palette_server import HAVE_UNIX_SOCKETS, RenderService, TCPRenderServer, request_render
+
+
+def random_palette(seed):
+    """Load the template with random colors in every region"""
+    with open(TEMPLATE_PATH, 'r') as f:
+        palette_data = json.load(f)
+    rng = random.Random(seed)
+
+    def fill(data):
+        if isinstance(data, list):
+            for item in data:
+                fill(item)
+        elif isinstance(data, dict):
+            if "Color" in data:
+                data["Color"] = f"#{rng.randrange(1 << 24):06x}"
+            for value in data.values():
+                fill(value)
+
+    fill(palette_data)
+    return palette_data
+
+
+def decode(png):
+    """Decode PNG bytes into an RGB image"""
+    img = Image.open(io.BytesIO(png))
+    img.load()
+    return img
+
+
+def start(server):
+    """Serve requests on a background thread"""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_render_service():
+    """Test that the service renders both payload kinds like the batch renderer"""
+    print("Testing the render service...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = RenderService(cache_entries=2, cache_dir=tmp)
+        palettes = [random_palette(seed) for seed in range(3)]
+        payloads = [json.dumps(palette).encode('utf-8') for palette in palettes]
+
+        for palette, payload in zip(palettes, payloads):
+            png, hit = service.render(payload)
+            assert not hit
+            assert decode(png).tobytes() == render_palette(palette).tobytes(), "Served PNG differs from a render"
+
+        # Only the two newest renders are kept
+        assert service.render(payloads[2])[1] and service.render(payloads[1])[1]
+        assert not service.render(payloads[0])[1], "The oldest render should have been evicted"
+        assert service.stats()['entries'] == 2
+
+        # A colors-only payload with the same colors hits the same cache entry
+        json_path = os.path.join(tmp, "skin.json")
+        sparse_path = os.path.join(tmp, "skin.palette")
+        with open(json_path, 'w') as f:
+            json.dump(palettes[0], f)
+        palette_data, table = load_palette(json_path, tmp)
+        write_sparse_palette(palette_data, table, sparse_path, tmp)
+        with open(sparse_path, 'rb') as f:
+            png, hit = service.render(f.read())
+        assert hit, "Equal color assignments should share a cache entry"
+        assert decode(png).tobytes() == render_palette(palettes[0]).tobytes()
+
+        for bad in [b"", b"not json", b'{"format": "other"}', b'[1, 2]',
+                    b'{"format": "palette-colors", "version": 1}',
+                    json.dumps({'format': 'palette-colors', 'version': 1, 'layout': table.fingerprint,
+                                'rows': [10 ** 6], 'colors': [0]}).encode('utf-8')]:
+            try:
+                service.render(bad)
+                assert False, f"Payload {bad[:20]!r} should be rejected"
+            except ValueError:
+                pass
+
+    print("✓ Render service matches the batch renderer\n")
+
+
+def test_http_server():
+    """Test rendering over HTTP on a TCP port and a Unix socket"""
+    print("Testing the HTTP listeners...")
+
+    service = RenderService()
+    payload = json.dumps(random_palette(7)).encode('utf-8')
+    expected = render_palette(random_palette(7)).tobytes()
+
+    server = TCPRenderServer(service, ("127.0.0.1", 0))
+    start(server)
+    try:
+        connection = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+        assert decode(request_render(connection, payload)).tobytes() == expected
+
+        # Repeated renders reuse the connection and the cached PNG
+        times = []
+        for _ in range(20):
+            begin = time.perf_counter()
+            request_render(connection, payload)
+            times.append(time.perf_counter() - begin)
+        times.sort()
+        print(f"  Cached request: {times[len(times) // 2] * 1000:.2f} ms median")
+
+        connection.request('GET', '/stats')
+        stats = json.loads(connection.getresponse().read())
+        assert stats['hits'] == 20 and stats['misses'] == 1
+
+        try:
+            request_render(connection, b"[1, 2")
+            assert False, "Bad payloads should fail"
+        except ValueError as e:
+            assert "400" in str(e)
+        connection.close()
+
+        # Bad or missing body lengths are refused instead of dropping the connection
+        for length, status in [(None, 411), ("abc", 400), ("-5", 400)]:
+            connection = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+            connection.putrequest('POST', '/render', skip_accept_encoding=True)
+            if length is not None:
+                connection.putheader('Content-Length', length)
+            connection.endheaders()
+            response = connection.getresponse()
+            response.read()
+            assert response.status == status, f"Content-Length {length!r} gave {response.status}"
+            connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if not HAVE_UNIX_SOCKETS:
+        print("✓ HTTP listener working (no Unix sockets here)\n")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "palette.sock")
+        server = palette_server.UnixRenderServer(service, path)
+        start(server)
+        try:
+            connection = palette_server.UnixHTTPConnection(path)
+            assert decode(request_render(connection, payload)).tobytes() == expected
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert not os.path.exists(path), "The socket file should be removed on close"
+
+    print("✓ HTTP listeners working\n")
+
+
+def test_no_unix_sockets():
+    """Test that the server and batch tool import where Unix sockets are missing"""
+    print("Testing platforms without Unix sockets...")
+
+    script = (
+        "import socket\n"
+        "if hasattr(socket, 'AF_UNIX'):\n"
+        "    del socket.AF_UNIX\n"
+        "import palette_batch, palette_server\n"
+        "assert not palette_server.HAVE_UNIX_SOCKETS\n"
+        "raise SystemExit(palette_server.main(['--socket', 'palette.sock']))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 1, f"Expected a clean --socket error: {result.stderr}"
+    assert "not supported" in result.stdout
+
+    print("✓ Imports without Unix sockets\n")
+
+
+def test_render_latency():
+    """Test that uncached renders of the template take milliseconds"""
+    print("Testing render latency...")
+
+    service = RenderService(cache_entries=0)
+    service.preload(TEMPLATE_PATH)
+    payloads = [json.dumps(random_palette(seed)).encode('utf-8') for seed in range(10)]
+    service.render(payloads[0])
+
+    times = []
+    for payload in payloads:
+        begin = time.perf_counter()
+        assert not service.render(payload)[1]
+        times.append(time.perf_counter() - begin)
+    times.sort()
+    median = times[len(times) // 2]
+    print(f"  Uncached template render: {median * 1000:.2f} ms median")
+    assert median < 0.05, "Uncached renders should not take a full image encode"
+
+    print("✓ Renders are fast\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Render Server - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_render_service()
+        test_http_server()
+        test_no_unix_sockets()
+        test_render_latency()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
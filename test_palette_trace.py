@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the timing trace
+Checks span recording, the disabled fast path and Chrome trace output.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import palette_trace
+from palette_trace import span, traced
+
+
+def test_disabled():
+    """Test that nothing is recorded while tracing is off"""
+    print("Testing disabled tracing...")
+
+    palette_trace.disable()
+    with span("idle"):
+        pass
+    assert palette_trace.take_events() == []
+    assert palette_trace.last_duration("idle") is None
+
+    os.environ[palette_trace.TRACE_ENV] = "0"
+    try:
+        assert not palette_trace.enable_from_env(), "PALETTE_TRACE=0 should keep tracing off"
+    finally:
+        del os.environ[palette_trace.TRACE_ENV]
+
+    print("✓ Disabled tracing records nothing\n")
+
+
+def test_spans():
+    """Test that spans and traced functions are recorded with their durations"""
+    print("Testing spans...")
+
+    @traced("work")
+    def work(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    palette_trace.enable()
+    try:
+        with span("outer", file="skin.json"):
+            assert work(0.01) == 0.01
+        thread = threading.Thread(target=work, args=(0,))
+        thread.start()
+        thread.join()
+
+        assert palette_trace.last_duration("work") < 0.01, "last_duration should hold the newest run"
+        assert palette_trace.last_duration("outer") >= 0.01
+        events = palette_trace.take_events()
+    finally:
+        palette_trace.disable()
+
+    assert [e['name'] for e in events] == ["work", "outer", "work"]
+    outer = events[1]
+    assert outer['ph'] == 'X' and outer['args'] == {"file": "skin.json"}
+    assert outer['ts'] <= events[0]['ts'] and events[0]['ts'] + events[0]['dur'] <= outer['ts'] + outer['dur'], \
+        "Nested spans should lie inside their parent"
+    assert events[2]['tid'] != events[0]['tid'], "Spans should record their thread"
+
+    print("✓ Spans recorded\n")
+
+
+def test_write_trace():
+    """Test the Chrome trace file format"""
+    print("Testing trace output...")
+
+    palette_trace.enable()
+    try:
+        with span("load"):
+            pass
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            assert palette_trace.write_trace(path) == 1
+            with open(path, 'r') as f:
+                trace = json.load(f)
+    finally:
+        palette_trace.disable()
+
+    assert trace['displayTimeUnit'] == 'ms'
+    event, = trace['traceEvents']
+    assert set(event) == {'name', 'ph', 'ts', 'dur', 'pid', 'tid'}
+    assert event['pid'] == os.getpid()
+
+    print("✓ Trace written in Chrome trace format\n")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Palette Timing Trace - Test Suite")
+    print("=" * 60 + "\n")
+
+    try:
+        test_disabled()
+        test_spans()
+        test_write_trace()
+
+        print("=" * 60)
+        print("All tests passed! ✓")
+        print("=" * 60)
+        return 0
+
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())